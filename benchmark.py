@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+
+'''
+Benchmarks for the Arduino Data Logger report and monitor.
+
+Runs the hot paths on synthetic data, generated as fake logs and
+fake sensors, and prints the results as JSON (one object per
+measurement), so that runs can be compared over time:
+
+ * ``parse``: log parsing and ingest, in rows/s
+ * ``table``: HTML table rendering, per page size
+ * ``chart``: chart rendering (downsampling and matplotlib), per
+   number of rows
+ * ``monitor``: monitor frame times (refresh and full redraw), per
+   number of sensors and history size; offscreen, no display needed
+'''
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import timeit
+
+from datalogger.csvlog import LogFile
+from datalogger.dataset import SensorData
+from datalogger.fakedata import generate_fake_log, DATA_LOGGING_TICK
+
+SUITES = ('parse', 'table', 'chart', 'monitor')
+
+
+def _int_list(text):
+    return [int(x) for x in text.split(',')]
+
+
+def best_time(func, repeat):
+    """Best wall time of ``repeat`` calls of ``func``, in seconds."""
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def write_fake_log(path, rows, digital=5, analog=7):
+    """Write a fake log file of ``rows`` records."""
+    columns, records = generate_fake_log(
+        digital=digital, analog=analog, period=rows * DATA_LOGGING_TICK)
+    with open(path, 'w') as fileobj:
+        fileobj.write(','.join(name for name, ctype in columns) + '\n')
+        for record in records:
+            fileobj.write('%s,%s\n' % (
+                record[0].strftime('%Y-%m-%d %H:%M:%S'),
+                ','.join(str(int(v)) for v in record[1:])))
+
+
+def load_log(path):
+    log = LogFile(path)
+    log.read_header()
+    return SensorData.from_records(log.columns, log.read_new())
+
+
+def bench_parse(workdir, rows_list, repeat):
+    for rows in rows_list:
+        path = os.path.join(workdir, 'parse-%d.csv' % rows)
+        write_fake_log(path, rows)
+        seconds = best_time(lambda: load_log(path), repeat)
+        yield dict(rows=rows, seconds=seconds, rows_per_second=rows / seconds,
+                   bytes=os.path.getsize(path))
+
+
+def bench_table(workdir, page_sizes, repeat):
+    from datalogger.report import render_table_html
+    path = os.path.join(workdir, 'table.csv')
+    write_fake_log(path, max(page_sizes))
+    data = load_log(path)
+    for per_page in page_sizes:
+        seconds = best_time(
+            lambda: render_table_html(data, 0, per_page), repeat)
+        yield dict(rows=per_page, seconds=seconds)
+
+
+def bench_chart(workdir, rows_list, repeat):
+    from datalogger.report import chart_series, render_chart
+    for rows in rows_list:
+        path = os.path.join(workdir, 'chart-%d.csv' % rows)
+        write_fake_log(path, rows)
+        data = load_log(path)
+        series_seconds = best_time(
+            lambda: chart_series(data, 0, rows), repeat)
+        series = chart_series(data, 0, rows)
+        render_seconds = best_time(lambda: render_chart(*series), repeat)
+        yield dict(rows=rows, series_seconds=series_seconds,
+                   render_seconds=render_seconds,
+                   seconds=series_seconds + render_seconds)
+
+
+def bench_monitor(sensors_list, history_list, repeat, frames=50):
+    import pygame
+    from datalogger.fakedata import loop_sin
+    from datalogger.monitor import Monitor
+    from datalogger.sensors import AnalogSensorBase
+
+    pygame.font.init()
+    for count in sensors_list:
+        for history in history_list:
+            sensors = [
+                ('s%02d' % i, AnalogSensorBase(
+                    label='Sensor %d' % i, color=[0xff, 0xff, 0x00],
+                    history_size=history, value_generator=loop_sin(20 + i)))
+                for i in range(count)]
+            for sensor_id, sensor in sensors:
+                for i in range(history):
+                    sensor.read()
+            monitor = Monitor(pygame.Surface((1024, 800)), sensors)
+            monitor.show_fps_label = False
+            clock = [0]
+
+            def refresh():
+                ## Every frame reads the sensors and scrolls the charts
+                for i in range(frames):
+                    clock[0] += monitor.refresh_time + 1
+                    monitor.draw(clock[0])
+
+            def redraw():
+                monitor.invalidate()
+                monitor.draw(clock[0])
+
+            redraw()
+            yield dict(
+                sensors=count, history=history,
+                frame_seconds=best_time(refresh, repeat) / frames,
+                redraw_seconds=best_time(redraw, repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        'suites', nargs='*', default=SUITES, metavar='SUITE',
+        help="Benchmarks to run, among %s (default: all)" % ', '.join(SUITES))
+    parser.add_argument(
+        '--rows', type=_int_list, default=[1000, 10000, 100000],
+        help="Log sizes for parse and chart (default: 1000,10000,100000)")
+    parser.add_argument(
+        '--page-sizes', type=_int_list, default=[100, 1000],
+        help="Table sizes (default: 100,1000)")
+    parser.add_argument(
+        '--sensors', type=_int_list, default=[5, 16, 64],
+        help="Monitor sensor counts (default: 5,16,64)")
+    parser.add_argument(
+        '--history', type=_int_list, default=[500, 5000],
+        help="Monitor history sizes (default: 500,5000)")
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help="Runs of each measurement; the best is kept "
+             "(default: %(default)s)")
+    parser.add_argument(
+        '--output', metavar='FILE',
+        help="Write the results to this file (default: standard output)")
+    args = parser.parse_args()
+    for suite in args.suites:
+        if suite not in SUITES:
+            parser.error("Unknown benchmark: %s" % suite)
+
+    workdir = tempfile.mkdtemp(prefix='datalogger-bench-')
+    try:
+        runs = dict(
+            parse=lambda: bench_parse(workdir, args.rows, args.repeat),
+            table=lambda: bench_table(workdir, args.page_sizes, args.repeat),
+            chart=lambda: bench_chart(workdir, args.rows, args.repeat),
+            monitor=lambda: bench_monitor(args.sensors, args.history,
+                                          args.repeat))
+        results = []
+        for suite in args.suites:
+            for result in runs[suite]():
+                result['benchmark'] = suite
+                results.append(result)
+                sys.stderr.write('%s\n' % json.dumps(result, sort_keys=True))
+    finally:
+        shutil.rmtree(workdir)
+
+    report = dict(
+        python=platform.python_version(),
+        platform=platform.platform(),
+        results=results)
+    if args.output:
+        with open(args.output, 'w') as fileobj:
+            json.dump(report, fileobj, indent=2, sort_keys=True)
+    else:
+        print(json.dumps(report, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+
+'''
+Convert an Arduino Data Logger CSV log to the binary log format
+(see datalogger/binlog.py), which the report reads without parsing.
+'''
+
+import argparse
+import os
+import sys
+
+from datalogger.binlog import convert_csv, EXTENSION
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('csv', help="CSV log file")
+    parser.add_argument(
+        'output', nargs='?',
+        help="Binary log file (default: the CSV file name, with the "
+             "%s extension)" % EXTENSION)
+    args = parser.parse_args()
+
+    output = args.output or os.path.splitext(args.csv)[0] + EXTENSION
+    if not output.endswith(EXTENSION):
+        parser.error("The binary log name must end with %s" % EXTENSION)
+    if os.path.exists(output):
+        parser.error("%s already exists" % output)
+    log = convert_csv(args.csv, output)
+    sys.stderr.write("%s: %d records\n" % (output, len(log)))
+
+
+if __name__ == '__main__':
+    main()
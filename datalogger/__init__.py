@@ -0,0 +1,4 @@
+"""
+Support library for the Arduino Data Logger report generator
+(``view-data.py``) and realtime monitor (``realtime-monitor.py``).
+"""
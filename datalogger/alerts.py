@@ -0,0 +1,193 @@
+"""
+Threshold alerts on sensor values, for the realtime monitor.
+
+A rule compares a value of a sensor with a threshold, and raises an
+alert of a given level while it holds::
+
+    <stat> [<window>] <op> <threshold>
+
+where ``stat`` is ``value`` (the latest value) or one of the rolling
+statistics of the sensor, ``min``, ``max``, ``mean``, ``stddev`` or
+``rate`` (per second), over ``window`` seconds (default: the first
+window of the sensor, see
+:py:class:`~datalogger.sensors.AnalogSensorBase`), e.g.
+``mean 60 > 80`` or ``rate < -2``.
+
+:py:class:`AlertEngine` checks the rules of each sensor, gives the
+color of its value, and reports the changes of alert level as
+:py:class:`AlertEvent`, e.g. to an :py:class:`AlertLog`.
+"""
+
+import collections
+import datetime
+import operator
+
+LEVELS = ('warning', 'critical')  # By increasing severity
+LEVEL_COLORS = {
+    None: [0xff, 0xff, 0xff],
+    'warning': [0xff, 0xcc, 0x00],
+    'critical': [0xff, 0x33, 0x33],
+}
+STATS = ('value', 'min', 'max', 'mean', 'stddev', 'rate')
+
+_OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+}
+
+AlertEvent = collections.namedtuple(
+    'AlertEvent', 'time sensor_id level previous rule value')
+
+
+class AlertRule(object):
+    """Raise ``level`` while ``stat`` (over ``window`` seconds)
+    compares to ``threshold`` as ``op`` says.
+
+    Once raised, the alert only ends when the value is past the
+    threshold by ``hysteresis``, so that a value hovering around the
+    threshold does not raise it over and over.
+    """
+
+    window = None
+    hysteresis = 0.0
+
+    def __init__(self, level, stat, op, threshold, window=None,
+                 hysteresis=None):
+        if level not in LEVELS:
+            raise ValueError("Unknown alert level: %r" % level)
+        if stat not in STATS:
+            raise ValueError("Unknown statistic: %r" % stat)
+        if op not in _OPERATORS:
+            raise ValueError("Unknown comparison: %r" % op)
+        self.level = level
+        self.stat = stat
+        self.op = op
+        self.threshold = threshold
+        if window is not None:
+            self.window = window
+        if hysteresis is not None:
+            self.hysteresis = hysteresis
+
+    @classmethod
+    def parse(cls, level, text, hysteresis=None):
+        """Parse a rule from its ``<stat> [<window>] <op> <threshold>``
+        text.
+        """
+        words = text.split()
+        if len(words) == 3:
+            stat, op, threshold = words
+            window = None
+        elif len(words) == 4:
+            stat, window, op, threshold = words
+            window = float(window)
+        else:
+            raise ValueError("Invalid alert rule: %r" % text)
+        return cls(level, stat, op, float(threshold), window, hysteresis)
+
+    def __str__(self):
+        return ' '.join(
+            [self.stat] +
+            (['%g' % self.window] if self.window is not None else []) +
+            [self.op, '%g' % self.threshold])
+
+    def value(self, sensor):
+        """Return the value of the statistic for ``sensor``, or None
+        if there is none yet.
+        """
+        if self.stat == 'value':
+            last = sensor.values_history.last()
+            return None if last is None else last[1]
+        if self.window is None:
+            if not sensor.stats:
+                return None
+            stats = next(iter(sensor.stats.values()))
+        else:
+            stats = sensor.add_stats(self.window)
+        return getattr(stats, self.stat)
+
+    def holds(self, value, active=False):
+        """Whether the rule holds for ``value``; if ``active`` (the
+        alert is already raised), the hysteresis applies.
+        """
+        if value is None:
+            return False
+        threshold = self.threshold
+        if active:
+            ## Lower thresholds for '>', higher ones for '<'
+            if self.op.startswith('>'):
+                threshold -= self.hysteresis
+            else:
+                threshold += self.hysteresis
+        return _OPERATORS[self.op](value, threshold)
+
+
+class AlertEngine(object):
+    """Alert rules of ``sensors`` (a list of ``(sensor_id, sensor)``),
+    from ``rules``, a dict of ``{sensor_id: [AlertRule, ...]}``.
+
+    Changes of alert level are passed to ``on_event``, if given, as
+    :py:class:`AlertEvent`.
+    """
+
+    def __init__(self, sensors, rules, on_event=None):
+        self.rules = dict(rules)
+        self.on_event = on_event
+        self.levels = {}
+        self._active = {}
+        for sensor_id, sensor in sensors:
+            for rule in self.rules.get(sensor_id, ()):
+                ## Statistics over the window are kept from now on
+                if rule.window is not None:
+                    sensor.add_stats(rule.window)
+
+    def check(self, sensor_id, sensor):
+        """Check the rules of a sensor, after it has been read.
+        Returns its alert level: None, or one of :py:data:`LEVELS`.
+        """
+        rules = self.rules.get(sensor_id)
+        if not rules:
+            return None
+        level = None
+        trigger = None
+        for rule in rules:
+            active = self._active.get((sensor_id, rule))
+            value = rule.value(sensor)
+            holds = rule.holds(value, active)
+            self._active[sensor_id, rule] = holds
+            if holds and (level is None or
+                          LEVELS.index(rule.level) > LEVELS.index(level)):
+                level, trigger = rule.level, (rule, value)
+
+        previous = self.levels.get(sensor_id)
+        if level != previous:
+            self.levels[sensor_id] = level
+            if self.on_event is not None:
+                rule, value = trigger or (None, None)
+                self.on_event(AlertEvent(
+                    datetime.datetime.now(), sensor_id, level, previous,
+                    rule, value))
+        return level
+
+    def color(self, sensor_id):
+        """Color of the value of a sensor, for its alert level."""
+        return LEVEL_COLORS[self.levels.get(sensor_id)]
+
+
+class AlertLog(object):
+    """Append alert events to the file at ``path``, one CSV line
+    each: ``date,sensor,level,previous level,rule,value``, with
+    ``ok`` as the level when no alert is raised.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, event):
+        with open(self.path, 'a') as fileobj:
+            fileobj.write('%s,%s,%s,%s,%s,%s\n' % (
+                event.time.strftime('%Y-%m-%d %H:%M:%S'), event.sensor_id,
+                event.level or 'ok', event.previous or 'ok',
+                event.rule or '',
+                '%.2f' % event.value if event.value is not None else ''))
@@ -0,0 +1,355 @@
+"""
+Compact binary log format, append-only, with a sparse time index.
+
+A binary log holds the same data as a CSV log, without the cost of
+parsing text: records are fixed-width, so the file is read through
+:py:mod:`mmap` as a NumPy structured array, and a time window is
+just a slice of it. The file starts with a header::
+
+    b'DLOGBIN1', header size (uint32, little endian), JSON header
+
+padded so that records start at a multiple of 16 bytes. The JSON
+header lists the ``columns`` (as in
+:py:attr:`datalogger.dataset.SensorData.columns`) and a ``created``
+timestamp. Each record then holds:
+
+ * the sample time, in seconds (``int64``, as ``datetime64[s]``)
+ * the digital sensors, as packed bits (one byte per 8 sensors)
+ * the analog sensors, ``uint16`` each
+
+Every :py:data:`INDEX_INTERVAL` records, the time and number of the
+record are added to the index, in a ``.idx`` file next to the log:
+a time lookup is a binary search in the index, then in a single
+block of records.
+"""
+
+import itertools
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+from datalogger.csvlog import LogFile, COLUMN_DATE, COLUMN_DIGITAL, \
+    COLUMN_ANALOG
+from datalogger.dataset import SensorData
+
+MAGIC = b'DLOGBIN1'
+EXTENSION = '.dlb'
+INDEX_INTERVAL = 1024  # records
+_HEADER_ALIGN = 16
+_INDEX_DTYPE = np.dtype([('time', '<i8'), ('record', '<i8')])
+
+
+def record_dtype(columns):
+    """NumPy dtype of the records of a log with ``columns``."""
+    digital = sum(1 for name, ctype in columns if ctype == COLUMN_DIGITAL)
+    analog = sum(1 for name, ctype in columns if ctype == COLUMN_ANALOG)
+    return np.dtype([
+        ('time', '<i8'),
+        ('digital', 'u1', ((digital + 7) // 8,)),
+        ('analog', '<u2', (analog,)),
+    ])
+
+
+def is_binary_log(path):
+    """Whether ``path`` is a binary log (from its extension)."""
+    return path.endswith(EXTENSION)
+
+
+class BinaryLog(object):
+    """Binary log file at ``path``, opened for reading and
+    appending. Use :py:meth:`create` for a new one.
+    """
+
+    path = None
+    columns = None
+    created = None
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as fileobj:
+            magic, size = struct.unpack('<8sI', fileobj.read(12))
+            if magic != MAGIC:
+                raise ValueError("Not a binary log: %s" % path)
+            header = json.loads(fileobj.read(size).decode('utf-8'))
+        self.columns = [tuple(column) for column in header['columns']]
+        self.created = header['created']
+        self.dtype = record_dtype(self.columns)
+        self.data_offset = -(-(12 + size) // _HEADER_ALIGN) * _HEADER_ALIGN
+        self._map = None
+        self._records = None
+        self._index = None
+
+    @classmethod
+    def create(cls, path, columns):
+        """Create an empty binary log for ``columns``; only the date,
+        digital and analog columns are kept.
+        """
+        columns = [(name, ctype) for name, ctype in columns
+                   if ctype in (COLUMN_DATE, COLUMN_DIGITAL, COLUMN_ANALOG)]
+        header = json.dumps(dict(columns=columns, created=time.time()))
+        header = header.encode('utf-8')
+        size = len(header)
+        padding = -(12 + size) % _HEADER_ALIGN
+        with open(path, 'wb') as fileobj:
+            fileobj.write(struct.pack('<8sI', MAGIC, size + padding))
+            fileobj.write(header + b' ' * padding)
+        with open(path + '.idx', 'wb'):
+            pass
+        return cls(path)
+
+    @property
+    def index_path(self):
+        return self.path + '.idx'
+
+    ### --- Reading
+
+    def _refresh(self):
+        ## (Re)map the file if it grew since it was last mapped; a
+        ## partially written last record is ignored.
+        size = os.path.getsize(self.path)
+        count = (size - self.data_offset) // self.dtype.itemsize
+        if self._records is not None and len(self._records) == count:
+            return
+        self.close()
+        if count:
+            with open(self.path, 'rb') as fileobj:
+                self._map = mmap.mmap(fileobj.fileno(), 0,
+                                      access=mmap.ACCESS_READ)
+            self._records = np.frombuffer(
+                self._map, dtype=self.dtype, count=count,
+                offset=self.data_offset)
+        else:
+            self._records = np.zeros(0, dtype=self.dtype)
+        self._index = self._read_index(count)
+
+    def _read_index(self, count):
+        expected = -(-count // INDEX_INTERVAL)
+        try:
+            index = np.fromfile(self.index_path, dtype=_INDEX_DTYPE)
+        except (IOError, OSError):
+            index = np.zeros(0, dtype=_INDEX_DTYPE)
+        if len(index) < expected:
+            ## Missing or incomplete (e.g. interrupted append):
+            ## rebuilt from the records, which is cheap
+            index = np.zeros(expected, dtype=_INDEX_DTYPE)
+            index['record'] = np.arange(expected) * INDEX_INTERVAL
+            index['time'] = self._records['time'][::INDEX_INTERVAL]
+            with open(self.index_path, 'wb') as fileobj:
+                index.tofile(fileobj)
+        return index[:expected]
+
+    def close(self):
+        ## The map is not closed explicitly: datasets returned
+        ## earlier may still be views of it. It is unmapped once
+        ## they are gone.
+        self._records = self._index = self._map = None
+
+    def __len__(self):
+        self._refresh()
+        return len(self._records)
+
+    @property
+    def records(self):
+        """All the records, as a read-only structured array backed
+        by the file: nothing is copied until used.
+        """
+        self._refresh()
+        return self._records
+
+    def find(self, when, side='left'):
+        """Return the number of the first record at or after time
+        ``when`` (or after it, for ``side='right'``).
+        """
+        self._refresh()
+        when = np.datetime64(when, 's').astype(np.int64)
+        index = self._index
+        block = int(np.searchsorted(index['time'], when, side)) - 1
+        if block < 0:
+            return 0
+        lo = int(index['record'][block])
+        hi = int(index['record'][block + 1]) if block + 1 < len(index) \
+            else len(self._records)
+        return lo + int(np.searchsorted(
+            self._records['time'][lo:hi], when, side))
+
+    def window(self, start=None, end=None):
+        """Return the ``(first, last)`` record numbers covering
+        ``start <= time < end``, found through the index.
+        """
+        lo = 0 if start is None else self.find(start)
+        hi = len(self) if end is None else self.find(end)
+        return lo, max(lo, hi)
+
+    def dataset(self, start=0, stop=None):
+        """Return records ``start`` to ``stop`` as a
+        :py:class:`~datalogger.dataset.SensorData`. Timestamps and
+        analog values are views of the file; digital bits, packed
+        per record here, are repacked per sensor.
+        """
+        records = self.records[start:stop]
+        return BinaryLogData(
+            self, start,
+            self.columns,
+            records['time'].view('datetime64[s]'),
+            self.digital_bits(start, stop),
+            records['analog'].T)
+
+    @property
+    def digital_count(self):
+        return sum(1 for name, ctype in self.columns
+                   if ctype == COLUMN_DIGITAL)
+
+    def digital_bits(self, start=0, stop=None):
+        """Return the digital bits of records ``start`` to ``stop``,
+        packed per sensor instead of per record, as in
+        :py:class:`~datalogger.dataset.SensorData`.
+        """
+        records = self.records[start:stop]
+        digital = np.unpackbits(
+            records['digital'], axis=1)[:, :self.digital_count]
+        return np.packbits(digital.T, axis=1) \
+            .reshape(self.digital_count, -(-len(records) // 8))
+
+    ### --- Writing
+
+    def append(self, dataset):
+        """Append the samples of ``dataset`` (a
+        :py:class:`~datalogger.dataset.SensorData` with the same
+        columns), which must not be older than the last record.
+        """
+        if list(dataset.columns) != list(self.columns):
+            raise ValueError("Cannot append data with different columns")
+        count = len(self)
+        records = np.zeros(len(dataset), dtype=self.dtype)
+        records['time'] = dataset.timestamps.astype('datetime64[s]') \
+            .astype(np.int64)
+        if dataset.digital_count:
+            records['digital'] = np.packbits(np.array(
+                [dataset.digital(i) for i in range(dataset.digital_count)],
+                dtype=bool).T, axis=1)
+        records['analog'] = dataset.analog.T
+
+        ## Records first, then the index: an index entry never points
+        ## past the records (and a short index is rebuilt).
+        with open(self.path, 'ab') as fileobj:
+            fileobj.seek(0, os.SEEK_END)
+            expected = self.data_offset + count * self.dtype.itemsize
+            if fileobj.tell() != expected:
+                fileobj.truncate(expected)  # Drop a partial record
+            records.tofile(fileobj)
+        first = -(-count // INDEX_INTERVAL) * INDEX_INTERVAL
+        numbers = np.arange(first, count + len(records), INDEX_INTERVAL)
+        if len(numbers):
+            index = np.zeros(len(numbers), dtype=_INDEX_DTYPE)
+            index['record'] = numbers
+            index['time'] = records['time'][numbers - count]
+            with open(self.index_path, 'ab') as fileobj:
+                index.tofile(fileobj)
+        self.close()
+
+
+class BinaryLogData(SensorData):
+    """Dataset of records of a :py:class:`BinaryLog`, from record
+    ``offset``: time windows are found through the log index.
+    """
+
+    def __init__(self, log, offset, *args):
+        SensorData.__init__(self, *args)
+        self._log = log
+        self._offset = offset
+
+    def window(self, start=None, end=None):
+        lo, hi = self._log.window(start, end)
+        size = len(self)
+        return (min(size, max(0, lo - self._offset)),
+                min(size, max(0, hi - self._offset)))
+
+
+def convert_csv(csv_path, path, chunk_size=65536):
+    """Convert the CSV log at ``csv_path`` to a new binary log at
+    ``path``, ``chunk_size`` records at a time. Returns the
+    :py:class:`BinaryLog`.
+    """
+    log = LogFile(csv_path)
+    if log.read_header() is None:
+        raise ValueError("Log file has no header: %s" % csv_path)
+    records = log.read_new()
+    binlog = None
+    while True:
+        chunk = SensorData.from_records(
+            log.columns, itertools.islice(records, chunk_size))
+        if binlog is None:
+            binlog = BinaryLog.create(path, chunk.columns)
+        if not len(chunk):
+            return binlog
+        binlog.append(chunk)
+
+
+class _DigitalBits(object):
+    ## Digital bits of a log, packed per sensor, decoded as records
+    ## are appended: each record is decoded once (along with those
+    ## sharing its last byte). Datasets get views of the buffer,
+    ## which grows by doubling.
+
+    def __init__(self, sensors):
+        self.count = 0
+        self._bits = np.zeros((sensors, 0), dtype=np.uint8)
+
+    def extend(self, log, count):
+        """Decode the records up to ``count``; return the bits."""
+        start = self.count - self.count % 8  # Redo the last byte
+        size = -(-count // 8)
+        if size > self._bits.shape[1]:
+            bits = np.zeros((self._bits.shape[0],
+                             max(size, 2 * self._bits.shape[1])),
+                            dtype=np.uint8)
+            bits[:, :self._bits.shape[1]] = self._bits
+            self._bits = bits
+        self._bits[:, start // 8:size] = log.digital_bits(start, count)
+        self.count = count
+        return self._bits[:, :size]
+
+
+class BinaryLogLoader(object):
+    """Loader for a binary log, with the same interface as
+    :py:class:`datalogger.cache.DatasetLoader`: there is nothing to
+    parse nor cache, the dataset is a view of the file. As the log
+    grows, only the digital bits of the new records are decoded.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._log = None
+        self._inode = None
+        self._digital = None
+        self._dataset = None
+
+    def load(self):
+        """Return the up-to-date ``(dataset, generation)``."""
+        with self._lock:
+            stat = os.stat(self.path)
+            if self._log is None or \
+                    (stat.st_dev, stat.st_ino) != self._inode:
+                ## First load, or another log at the same path
+                self._log = BinaryLog(self.path)
+                self._inode = (stat.st_dev, stat.st_ino)
+                self._digital = _DigitalBits(self._log.digital_count)
+                self._dataset = None
+            count = len(self._log)
+            if self._dataset is None or len(self._dataset) != count:
+                records = self._log.records
+                self._dataset = BinaryLogData(
+                    self._log, 0,
+                    self._log.columns,
+                    records['time'].view('datetime64[s]'),
+                    self._digital.extend(self._log, count),
+                    records['analog'].T)
+            ## The log is append-only: its generation is its creation
+            return self._dataset, '%x-%x' % (
+                stat.st_ino, int(self._log.created * 1000))
@@ -0,0 +1,374 @@
+"""
+On-disk caches for the report generator.
+
+ * :py:class:`RenderCache`: LRU cache of rendered report parts
+   (e.g. chart images), shared between CGI processes through the
+   filesystem.
+ * :py:func:`load_dataset`: parsed copy of a log file, extended
+   with just the newly appended records when the log grows.
+ * :py:class:`IncrementalCache`: base class for data derived from
+   the parsed log (e.g. its rollups), updated the same way.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+from datalogger.csvlog import LogFile, COLUMN_DATE
+from datalogger.dataset import SensorData
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'datalogger-cache')
+
+_TMP_PREFIX = '.tmp-'
+
+
+def cache_key(*parts):
+    """Build a cache key out of any number of values."""
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+def ensure_dir(path):
+    """Create directory ``path`` unless it exists (maybe created
+    concurrently by another process).
+    """
+    if not os.path.isdir(path):
+        try:
+            os.makedirs(path)
+        except OSError:
+            if not os.path.isdir(path):
+                raise
+
+
+def write_atomic(path, write):
+    """Write the file at ``path``, by calling ``write`` with a file
+    object: the data is written to a temporary file, then renamed in
+    place, so that concurrent readers never see a partially written
+    file.
+    """
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=_TMP_PREFIX, dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as fileobj:
+            write(fileobj)
+        os.rename(tmp_path, path)
+    except BaseException:
+        ## Interrupted too: the temporary file must not be left behind
+        os.unlink(tmp_path)
+        raise
+
+
+class RenderCache(object):
+    """LRU cache of rendered data, stored as files in ``directory``.
+
+    Entries are touched when read, so the file modification time
+    tracks the last use; once more than ``max_entries`` are stored,
+    the least recently used ones are removed.
+
+    Within a process, concurrent :py:meth:`get_or_render` calls for
+    the same key share a single render.
+    """
+
+    directory = None
+    max_entries = 64
+
+    def __init__(self, directory, max_entries=64):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._rendering = {}
+        self._rendering_lock = threading.Lock()
+        ensure_dir(directory)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        """Return the data stored for ``key``, or None."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as fileobj:
+                data = fileobj.read()
+            os.utime(path, None)
+        except (IOError, OSError):
+            return None
+        return data
+
+    def put(self, key, data):
+        """Store ``data`` (a byte string) for ``key``."""
+        write_atomic(self._path(key), lambda f: f.write(data))
+        self.evict()
+
+    def get_or_render(self, key, render):
+        """Return the data stored for ``key``; if missing, call
+        ``render()`` to produce it and store the result.
+        """
+        data = self.get(key)
+        if data is not None:
+            return data
+        with self._rendering_lock:
+            lock = self._rendering.setdefault(key, threading.Lock())
+        with lock:
+            data = self.get(key)
+            if data is None:
+                data = render()
+                self.put(key, data)
+        with self._rendering_lock:
+            self._rendering.pop(key, None)
+        return data
+
+    def evict(self):
+        """Remove the least recently used entries, if too many."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.startswith(_TMP_PREFIX):
+                continue  # Being written
+            path = self._path(name)
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except OSError:
+                pass  # Removed meanwhile
+        entries.sort()
+        for mtime, path in entries[:max(0, len(entries) - self.max_entries)]:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+
+def _load(path, cache_dir):
+    ## Load the dataset for `path`, updating the on-disk copy;
+    ## returns the dataset and the cache metadata.
+    data_dir = os.path.join(cache_dir, 'data')
+    ensure_dir(data_dir)
+    cache_path = os.path.join(data_dir, cache_key(os.path.abspath(path)))
+    stat = os.stat(path)
+
+    dataset, meta = None, None
+    try:
+        with open(cache_path + '.npz', 'rb') as fileobj:
+            dataset = SensorData.load(fileobj)
+            fileobj.seek(0)
+            meta = _unpack_meta(np.load(fileobj)['meta'])
+    except (IOError, OSError, ValueError, KeyError):
+        dataset = None
+
+    if dataset is not None and _same_file(meta, stat) and \
+            [meta['size'], meta['mtime']] == [stat.st_size, stat.st_mtime]:
+        return dataset, meta
+
+    if dataset is None or not _same_file(meta, stat) or \
+            stat.st_size < meta['offset'] or meta['columns'] is None:
+        ## Nothing usable in cache (or another file, e.g. rotated,
+        ## even if larger, or one without its header yet): parse the
+        ## whole file
+        dataset, log = _parse(path)
+        generation = _generation(stat)
+    else:
+        ## Parse just the tail
+        generation = meta['generation']
+        log = LogFile(path, offset=meta['offset'],
+                      columns=_columns(meta))
+        dataset = dataset.concatenate(
+            SensorData.from_records(log.columns, log.read_new()))
+
+    meta = dict(generation=generation, offset=log.offset, columns=log.columns,
+                file=[stat.st_dev, stat.st_ino],
+                size=stat.st_size, mtime=stat.st_mtime)
+    ## The metadata is saved along with the dataset, in the same file:
+    ## concurrent processes never pair the dataset of one with the
+    ## metadata of another.
+    write_atomic(cache_path + '.npz', lambda fileobj: dataset.save(
+        fileobj, meta=_pack_meta(meta)))
+    return dataset, meta
+
+
+def _pack_meta(meta):
+    ## Metadata, as JSON, stored as an array of an .npz file
+    return np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8)
+
+
+def _unpack_meta(array):
+    return json.loads(array.tobytes().decode('utf-8'))
+
+
+def _parse(path):
+    log = LogFile(path)
+    if log.read_header() is None:
+        ## Just created by the logger: no samples yet
+        return SensorData.from_records([('date', COLUMN_DATE)], []), log
+    return SensorData.from_records(log.columns, log.read_new()), log
+
+
+def _columns(meta):
+    ## Columns of the log, as read from its header (None if none yet)
+    if meta['columns'] is None:
+        return None
+    return [tuple(column) for column in meta['columns']]
+
+
+def _same_file(meta, stat):
+    ## Whether the log is still the file the cached copy was parsed from
+    return meta.get('file') == [stat.st_dev, stat.st_ino]
+
+
+def _generation(stat):
+    return '%x-%x' % (stat.st_ino, int(stat.st_mtime * 1000))
+
+
+def load_dataset(path, cache_dir=DEFAULT_CACHE_DIR):
+    """Load the log file at ``path`` as a
+    :py:class:`~datalogger.dataset.SensorData`.
+
+    The parsed data is kept in ``cache_dir``, along with the size
+    and modification time of the log: when they are unchanged the
+    cached copy is used as is, and when the log has grown only the
+    appended records are parsed. If the log got smaller, or was
+    replaced by another file (whatever its size), it is parsed again
+    from scratch.
+
+    Returns a ``(dataset, generation)`` tuple: ``generation``
+    changes only when the log is parsed from scratch, so that
+    ``(generation, first, last)`` identifies the rows ``first``
+    to ``last`` across appends.
+    """
+    dataset, meta = _load(path, cache_dir)
+    return dataset, meta['generation']
+
+
+class DatasetLoader(object):
+    """Keeps the dataset of a log file in memory, for long-running
+    processes: as the log grows, the appended records are parsed
+    and added to the in-memory copy, without going through the
+    on-disk cache again.
+    """
+
+    path = None
+    cache_dir = None
+
+    def __init__(self, path, cache_dir=DEFAULT_CACHE_DIR):
+        self.path = path
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._dataset = None
+        self._meta = None
+        self._log = None
+
+    def load(self):
+        """Return the up-to-date ``(dataset, generation)``, as
+        :py:func:`load_dataset` does.
+        """
+        with self._lock:
+            stat = os.stat(self.path)
+            meta = self._meta
+            if meta is None or not _same_file(meta, stat) or \
+                    stat.st_size < self._log.offset or \
+                    self._log.columns is None:
+                ## First load, a replaced or truncated log, or one
+                ## without its header yet: start over, with a log
+                ## reader for the current file
+                self._dataset, meta = _load(self.path, self.cache_dir)
+                self._log = LogFile(self.path, offset=meta['offset'],
+                                    columns=_columns(meta))
+            elif [meta['size'], meta['mtime']] != \
+                    [stat.st_size, stat.st_mtime]:
+                self._dataset = self._dataset.concatenate(
+                    SensorData.from_records(
+                        self._log.columns, self._log.read_new()))
+                meta = dict(meta, offset=self._log.offset,
+                            size=stat.st_size, mtime=stat.st_mtime)
+            self._meta = meta
+            return self._dataset, meta['generation']
+
+
+class IncrementalCache(object):
+    """Data derived from the dataset of the log file at ``path`` (e.g.
+    its rollups), kept in memory and in ``cache_dir``.
+
+    As the log grows, the data is updated with just the appended
+    samples (:py:meth:`update`); when the log is parsed from scratch
+    (its generation changes, see :py:func:`load_dataset`) it is
+    computed again (:py:meth:`compute`). It is saved along with its
+    generation in a single ``.npz`` file, so that concurrent
+    processes never pair the data of one with the generation of
+    another.
+
+    Subclasses set :py:attr:`suffix` (of the file name) and implement
+    :py:meth:`compute`, :py:meth:`update`, :py:meth:`rows`, and
+    :py:meth:`to_arrays` / :py:meth:`from_arrays` to store the data.
+    """
+
+    suffix = None
+
+    def __init__(self, path, cache_dir):
+        self._path = os.path.join(
+            cache_dir, 'data',
+            cache_key(os.path.abspath(path)) + self.suffix + '.npz')
+        self._lock = threading.Lock()
+        self._value = None
+        self._generation = None
+        self._loaded = False
+
+    def get(self, data, generation):
+        """Return the data derived from ``data`` (the dataset of the
+        log, of ``generation``), up to date.
+        """
+        with self._lock:
+            if not self._loaded:
+                self._read()
+                self._loaded = True
+            value = self._value
+            if value is not None and self._generation == generation \
+                    and self.rows(value) == len(data):
+                return value
+
+            if value is None or self._generation != generation \
+                    or self.rows(value) > len(data):
+                value = self.compute(data)
+            else:
+                value = self.update(value, data)
+            self._value, self._generation = value, generation
+            self._write()
+            return value
+
+    def compute(self, data):
+        """Compute the derived data of the whole of ``data``."""
+        raise NotImplementedError
+
+    def update(self, value, data):
+        """Return ``value`` updated with the samples of ``data`` it
+        does not cover yet.
+        """
+        raise NotImplementedError
+
+    def rows(self, value):
+        """Number of samples the derived data covers."""
+        raise NotImplementedError
+
+    def to_arrays(self, value):
+        """Return the derived data as a dict of arrays."""
+        raise NotImplementedError
+
+    def from_arrays(self, stored):
+        """Return the derived data from the arrays of
+        :py:meth:`to_arrays` (a dict-like object).
+        """
+        raise NotImplementedError
+
+    def _read(self):
+        try:
+            with open(self._path, 'rb') as fileobj:
+                stored = np.load(fileobj)
+                meta = _unpack_meta(stored['meta'])
+                value = self.from_arrays(stored)
+        except (IOError, OSError, ValueError, KeyError):
+            return
+        self._value, self._generation = value, meta['generation']
+
+    def _write(self):
+        ensure_dir(os.path.dirname(self._path))
+        arrays = self.to_arrays(self._value)
+        arrays['meta'] = _pack_meta(dict(generation=self._generation))
+        write_atomic(self._path, lambda fileobj: np.savez(fileobj, **arrays))
@@ -0,0 +1,459 @@
+"""
+Collector for many data loggers at once.
+
+A single process accepts the line protocol (see
+:py:class:`datalogger.sensors.SerialReader`) of any number of
+loggers, from:
+
+ * connections to TCP or UNIX sockets: a stream may start with a
+   ``#logger NAME`` line, naming its logger; otherwise the logger is
+   named after the connection, ``HOST:PORT`` (``unix-N`` for the Nth
+   connection to a UNIX socket), so that loggers never share a log
+ * serial ports, ptys or FIFOs, each with its own logger name
+
+Records are tagged by logger, and appended in batches, every
+``flush_interval`` seconds, to one binary log per logger (see
+:py:mod:`datalogger.binlog`), ``<storage>/<logger>.dlb``; if the
+sensors of a logger change, its previous log is kept aside.
+
+The lines are also passed on, as they come, to the monitors
+connected to the monitor sockets. A monitor sends the name of a
+logger and a newline, then receives its last header line and all
+its lines from then on: the line protocol of that logger, as if it
+were read from its serial port.
+
+Everything runs in a single thread, around :py:func:`select.poll`
+(:py:func:`select.select` where there is no ``poll()``): there is
+neither a process nor a thread per logger.
+"""
+
+import datetime
+import errno
+import math
+import os
+import re
+import select
+import socket
+import sys
+import time
+
+from datalogger.binlog import BinaryLog, EXTENSION
+from datalogger.csvlog import parse_header, record_parser, is_header_row, \
+    COLUMN_DATE
+from datalogger.dataset import SensorData
+from datalogger.sensors import open_device, parse_address
+
+_re_unsafe = re.compile(r'[^A-Za-z0-9_.-]')
+
+
+def _error_code(e):
+    ## select.error has no errno attribute on Python 2
+    code = getattr(e, 'errno', None)
+    return code if code is not None else (e.args[0] if e.args else None)
+
+
+def _wait(readers, writers, timeout):
+    ## Return the (readable, writable) file descriptors. poll() takes
+    ## any of them, where select() fails past FD_SETSIZE (1024): with
+    ## loggers and monitors together, that is not so many.
+    if not hasattr(select, 'poll'):
+        readable, writable, _ = select.select(readers, writers, [], timeout)
+        return readable, writable
+    events = dict((fd, select.POLLIN) for fd in readers)
+    for fd in writers:
+        events[fd] = events.get(fd, 0) | select.POLLOUT
+    poller = select.poll()
+    for fd, mask in events.items():
+        poller.register(fd, mask)
+    readable, writable = [], []
+    for fd, mask in poller.poll(int(math.ceil(timeout * 1000))):
+        ## Hang-ups and errors show when reading, as with select()
+        if mask & (select.POLLIN | select.POLLHUP | select.POLLERR |
+                   select.POLLNVAL):
+            readable.append(fd)
+        if mask & select.POLLOUT:
+            writable.append(fd)
+    return readable, writable
+
+
+class LoggerStore(object):
+    """Records of one logger, appended to the binary log at ``path``
+    in batches: :py:meth:`add` only keeps them, until :py:meth:`flush`.
+    """
+
+    path = None
+
+    def __init__(self, path):
+        self.path = path
+        self.pending = []  # (columns, records), oldest first
+        self._log = None
+
+    def add(self, columns, record):
+        if not self.pending or self.pending[-1][0] != columns:
+            self.pending.append((columns, []))
+        self.pending[-1][1].append(record)
+
+    def flush(self):
+        """Append the pending records to the log; returns how many.
+        Records are only dropped once written: if writing fails, they
+        are still pending for the next call.
+        """
+        count = 0
+        while self.pending:
+            columns, records = self.pending[0]
+            data = SensorData.from_records(columns, records)
+            self._open(data.columns).append(data)
+            self.pending.pop(0)
+            count += len(records)
+        return count
+
+    def _open(self, columns):
+        log = self._log
+        if log is None and os.path.exists(self.path):
+            log = BinaryLog(self.path)
+        if log is not None and list(log.columns) != list(columns):
+            ## Other sensors: a new log, the old one is kept aside
+            base = self._aside_path(log)
+            os.rename(log.index_path, base + EXTENSION + '.idx')
+            os.rename(self.path, base + EXTENSION)
+            log = None
+        if log is None:
+            log = BinaryLog.create(self.path, columns)
+        self._log = log
+        return log
+
+    def _aside_path(self, log):
+        ## Named after its creation time, never overwriting another
+        base = '%s-%s' % (os.path.splitext(self.path)[0], time.strftime(
+            '%Y%m%d-%H%M%S', time.localtime(log.created)))
+        path, number = base, 1
+        while os.path.exists(path + EXTENSION) or \
+                os.path.exists(path + EXTENSION + '.idx'):
+            number += 1
+            path = '%s-%d' % (base, number)
+        return path
+
+
+class _Stream(object):
+    ## A logger's line protocol, from a socket or a device
+    columns = None
+    store_columns = None
+    parse = None
+    add_date = False
+
+    def __init__(self, fd, name, sock=None, device=None):
+        self.fd = fd
+        self.name = name
+        self.sock = sock
+        self.device = device
+        self.buf = b''
+
+    def read(self):
+        if self.sock is not None:
+            return self.sock.recv(65536)
+        return os.read(self.fd, 65536)
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+        else:
+            os.close(self.fd)
+
+
+class _Monitor(object):
+    ## A monitor, subscribed to a logger once it has sent its name
+    logger = None
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.fd = sock.fileno()
+        self.buf = b''
+        self.out = bytearray()
+
+
+class _Device(object):
+    fd = None
+    retry = 0
+
+    def __init__(self, name, path, baudrate):
+        self.name = name
+        self.path = path
+        self.baudrate = baudrate
+
+
+class Collector(object):
+    """Collect the line protocol of many loggers, store it in
+    ``storage_dir`` and pass it on to monitors. Add sources with
+    :py:meth:`listen` and :py:meth:`add_device`, then :py:meth:`run`.
+    """
+
+    flush_interval = 5.0  # seconds
+    reopen_delay = 1.0  # seconds
+    ## A monitor so slow that this much output is pending is dropped
+    max_monitor_buffer = 1 << 20
+
+    def __init__(self, storage_dir, flush_interval=None):
+        self.storage_dir = storage_dir
+        if flush_interval is not None:
+            self.flush_interval = flush_interval
+        if not os.path.isdir(storage_dir):
+            os.makedirs(storage_dir)
+        self.stores = {}  # logger: LoggerStore
+        self.headers = {}  # logger: last header line
+        self._listeners = {}  # fd: (socket, for monitors)
+        self._streams = {}  # fd: _Stream
+        self._monitors = {}  # fd: _Monitor
+        self._devices = []
+        self._unix_paths = []
+        self._next_flush = time.time() + self.flush_interval
+        self._running = False
+        self._unix_connections = 0
+
+    ### --- Sources
+
+    def listen(self, address, monitors=False):
+        """Accept loggers (or, if ``monitors``, monitors) on socket
+        ``address``: ``tcp:HOST:PORT`` or ``unix:PATH``.
+        """
+        parsed = parse_address(address)
+        if parsed is None:
+            raise ValueError("Invalid socket address: %r" % address)
+        family, sockaddr = parsed
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_UNIX:
+            if os.path.exists(sockaddr):
+                os.remove(sockaddr)  # Left by a previous run
+            self._unix_paths.append(sockaddr)
+        else:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(sockaddr)
+        sock.listen(16)
+        sock.setblocking(False)
+        self._listeners[sock.fileno()] = (sock, monitors)
+        return sock
+
+    def add_device(self, name, path, baudrate=9600):
+        """Read logger ``name`` from a serial port (or pty, FIFO) at
+        ``path``, reopened whenever it goes away.
+        """
+        self._devices.append(_Device(name, path, baudrate))
+
+    def _open_devices(self, now):
+        for device in self._devices:
+            if device.fd is not None or device.retry > now:
+                continue
+            try:
+                device.fd = open_device(device.path, device.baudrate)
+            except OSError:
+                device.retry = now + self.reopen_delay
+                continue
+            self._streams[device.fd] = _Stream(
+                device.fd, device.name, device=device)
+
+    def _accept(self, sock, monitors):
+        try:
+            conn, peer = sock.accept()
+        except socket.error as e:
+            if _error_code(e) in (errno.EAGAIN, errno.EWOULDBLOCK,
+                                  errno.EINTR):
+                return
+            raise
+        conn.setblocking(False)
+        if monitors:
+            self._monitors[conn.fileno()] = _Monitor(conn)
+        else:
+            if isinstance(peer, tuple):
+                name = '%s:%d' % peer[:2]
+            else:
+                self._unix_connections += 1
+                name = 'unix-%d' % self._unix_connections
+            self._streams[conn.fileno()] = _Stream(
+                conn.fileno(), name, sock=conn)
+
+    ### --- Loggers
+
+    def _read_stream(self, stream):
+        try:
+            data = stream.read()
+        except (OSError, socket.error) as e:
+            if _error_code(e) in (errno.EAGAIN, errno.EWOULDBLOCK,
+                                  errno.EINTR):
+                return
+            data = b''
+        if not data:
+            ## Closed: a last line may lack its newline. A device is
+            ## opened again later.
+            self._feed_line(stream, stream.buf.strip())
+            stream.buf = b''
+            del self._streams[stream.fd]
+            stream.close()
+            if stream.device is not None:
+                stream.device.fd = None
+                stream.device.retry = time.time() + self.reopen_delay
+            return
+        lines = (stream.buf + data).split(b'\n')
+        stream.buf = lines.pop()
+        for line in lines:
+            self._feed_line(stream, line.strip())
+
+    def _feed_line(self, stream, line):
+        if not line:
+            return
+        if line.startswith(b'#'):
+            words = line[1:].split()
+            if len(words) == 2 and words[0] == b'logger':
+                stream.name = words[1].decode('ascii', 'replace')
+            return
+        row = line.decode('ascii', 'replace').split(',')
+        if is_header_row(row):
+            stream.columns = parse_header(row)
+            stream.parse = record_parser(stream.columns)
+            ## Without dates, records are dated on reception
+            stream.add_date = not any(
+                ctype == COLUMN_DATE for name, ctype in stream.columns)
+            stream.store_columns = \
+                [('date', COLUMN_DATE)] + stream.columns \
+                if stream.add_date else stream.columns
+            self.headers[stream.name] = line
+            self._forward(stream.name, line)
+            return
+        if stream.columns is None or len(row) != len(stream.columns):
+            return
+        try:
+            record = stream.parse(row)
+        except ValueError:
+            return
+        if stream.add_date:
+            record = (datetime.datetime.now().replace(microsecond=0),) + \
+                record
+        self.store(stream.name).add(stream.store_columns, record)
+        self._forward(stream.name, line)
+
+    def store(self, logger):
+        """Return the :py:class:`LoggerStore` of ``logger``."""
+        if logger not in self.stores:
+            self.stores[logger] = LoggerStore(os.path.join(
+                self.storage_dir, _re_unsafe.sub('_', logger) + EXTENSION))
+        return self.stores[logger]
+
+    def flush(self):
+        """Append the pending records of all the loggers to their
+        logs; returns how many were written.
+        """
+        return sum(store.flush() for store in self.stores.values())
+
+    def _flush_stores(self):
+        ## A logger that cannot be stored (e.g. disk full) keeps its
+        ## records until the next flush, without stopping the others
+        for logger, store in list(self.stores.items()):
+            try:
+                store.flush()
+            except (IOError, OSError) as e:
+                sys.stderr.write("Cannot store logger %s: %s\n" % (logger, e))
+
+    ### --- Monitors
+
+    def _read_monitor(self, monitor):
+        try:
+            data = monitor.sock.recv(4096)
+        except socket.error as e:
+            if _error_code(e) in (errno.EAGAIN, errno.EWOULDBLOCK,
+                                  errno.EINTR):
+                return
+            data = b''
+        if not data:
+            self._drop_monitor(monitor)
+            return
+        if monitor.logger is not None:
+            return  # Nothing more is expected
+        monitor.buf += data
+        if b'\n' in monitor.buf:
+            monitor.logger = monitor.buf.split(b'\n', 1)[0].strip() \
+                .decode('ascii', 'replace')
+            header = self.headers.get(monitor.logger)
+            if header is not None:
+                monitor.out += header + b'\n'
+
+    def _forward(self, logger, line):
+        for monitor in list(self._monitors.values()):
+            if monitor.logger != logger:
+                continue
+            monitor.out += line + b'\n'
+            if len(monitor.out) > self.max_monitor_buffer:
+                self._drop_monitor(monitor)
+
+    def _write_monitor(self, monitor):
+        try:
+            sent = monitor.sock.send(monitor.out)
+        except socket.error as e:
+            if _error_code(e) in (errno.EAGAIN, errno.EWOULDBLOCK,
+                                  errno.EINTR):
+                return
+            self._drop_monitor(monitor)
+            return
+        del monitor.out[:sent]
+
+    def _drop_monitor(self, monitor):
+        self._monitors.pop(monitor.fd, None)
+        monitor.sock.close()
+
+    ### --- Main loop
+
+    def step(self, timeout):
+        """Wait up to ``timeout`` seconds for data, and handle it."""
+        now = time.time()
+        self._open_devices(now)
+        readers = list(self._listeners) + list(self._streams) + \
+            list(self._monitors)
+        writers = [fd for fd, monitor in self._monitors.items()
+                   if monitor.out]
+        try:
+            readable, writable = _wait(readers, writers, timeout)
+        except (select.error, OSError) as e:
+            if _error_code(e) == errno.EINTR:
+                return
+            raise
+
+        for fd in readable:
+            if fd in self._listeners:
+                self._accept(*self._listeners[fd])
+            elif fd in self._streams:
+                self._read_stream(self._streams[fd])
+            elif fd in self._monitors:
+                self._read_monitor(self._monitors[fd])
+        for fd in writable:
+            if fd in self._monitors:
+                self._write_monitor(self._monitors[fd])
+
+        if time.time() >= self._next_flush:
+            self._flush_stores()
+            self._next_flush = time.time() + self.flush_interval
+
+    def run(self):
+        """Collect until :py:meth:`stop` is called (or interrupted);
+        pending records are flushed on the way out.
+        """
+        self._running = True
+        try:
+            while self._running:
+                timeout = max(0.0, self._next_flush - time.time())
+                if self._devices:
+                    timeout = min(timeout, self.reopen_delay)
+                self.step(timeout)
+        finally:
+            self.flush()
+
+    def stop(self):
+        self._running = False
+
+    def close(self):
+        for stream in list(self._streams.values()):
+            stream.close()
+        for monitor in list(self._monitors.values()):
+            monitor.sock.close()
+        for sock, monitors in self._listeners.values():
+            sock.close()
+        for path in self._unix_paths:
+            if os.path.exists(path):
+                os.remove(path)
+        self._streams, self._monitors, self._listeners = {}, {}, {}
@@ -0,0 +1,72 @@
+"""
+Colour scale for analog sensor readings.
+
+Analog readings are 10-bit values, so a scale has just 1024 possible
+colours: they are computed once into a :py:class:`Palette` and then
+looked up, either one at a time or for whole columns at once.
+"""
+
+import colorsys
+
+import numpy as np
+
+ANALOG_SIZE = 1024
+
+HUE_BLUE = 240 / 360.0
+HUE_MAGENTA = 300 / 360.0
+HUE_RED = 0 / 360.0
+
+
+def scale_color(fraction, hue_cold, hue_hot):
+    """Compute the colour for ``fraction`` (``0.0`` .. ``1.0``) on a
+    scale going from ``hue_cold`` to ``hue_hot``, as a ``(r, g, b)``
+    tuple of floats in ``0.0`` .. ``1.0``.
+    """
+    hue = hue_cold + (hue_hot - hue_cold) * fraction
+    rgb = colorsys.hsv_to_rgb(hue, 1.0, 1.0)
+    h, l, s = colorsys.rgb_to_hls(*rgb)
+    return colorsys.hls_to_rgb(h, min(1.0, l * 1.5), 1)
+
+
+class Palette(object):
+    """Precomputed colour scale, one entry per analog reading.
+
+    ``rgb`` holds ``(r, g, b)`` tuples of ints, as used by pygame;
+    ``hex`` holds ``#RRGGBB`` strings, as used in HTML.
+    """
+
+    size = ANALOG_SIZE
+    rgb = None
+    hex = None
+
+    def __init__(self, hue_cold=HUE_BLUE, hue_hot=HUE_RED, size=ANALOG_SIZE):
+        self.size = size
+        colors = np.array([
+            scale_color(i / float(size), hue_cold, hue_hot)
+            for i in range(size)])
+        self.rgb_array = (colors * 255).astype(np.uint8)
+        self.rgb = [tuple(int(c) for c in color) for color in self.rgb_array]
+        self.hex = ['#%02X%02X%02X' % color for color in self.rgb]
+        self.hex_array = np.array(self.hex)
+
+    def index(self, fraction):
+        """Return the palette index for ``fraction`` of the scale."""
+        return max(0, min(self.size - 1, int(fraction * self.size)))
+
+    def rgb_for(self, fraction):
+        return self.rgb[self.index(fraction)]
+
+    def hex_for(self, fraction):
+        return self.hex[self.index(fraction)]
+
+    def lookup_hex(self, readings):
+        """Vectorised lookup: return an array of ``#RRGGBB`` strings
+        for an array of raw readings.
+        """
+        return self.hex_array[np.clip(readings, 0, self.size - 1)]
+
+    def lookup_rgb(self, readings):
+        """Vectorised lookup: return a ``(len(readings), 3)``
+        ``uint8`` array of colours for an array of raw readings.
+        """
+        return self.rgb_array[np.clip(readings, 0, self.size - 1)]
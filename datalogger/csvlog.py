@@ -0,0 +1,247 @@
+"""
+Reader for the CSV log files written by the Arduino Data Logger.
+
+The first line of a log file is a header naming the columns; the
+type of each column is taken from its name:
+
+ * ``date``, ``time`` or ``timestamp``: the sample time, either as
+   ``YYYY-MM-DD HH:MM:SS`` or as a unix timestamp
+ * ``D<n>``: digital pin ``n`` (``0`` / ``1``)
+ * ``A<n>``: analog pin ``n`` (10-bit reading, ``0`` .. ``1023``)
+
+Any other column is kept as a plain string.
+
+Records are produced by generators, one at a time, so a log file
+is never loaded in memory as a whole.
+"""
+
+import csv
+import datetime
+import os
+import re
+
+COLUMN_DATE = 'date'
+COLUMN_DIGITAL = 'digital'
+COLUMN_ANALOG = 'analog'
+COLUMN_UNKNOWN = 'unknown'
+
+_re_digital = re.compile(r'^(D|digital)\s*\d+$', re.IGNORECASE)
+_re_analog = re.compile(r'^(A|analog)\s*\d+$', re.IGNORECASE)
+
+
+def column_type(name):
+    """Guess the type of a column from its header name."""
+    name = name.strip()
+    if name.lower() in ('date', 'time', 'timestamp'):
+        return COLUMN_DATE
+    if _re_digital.match(name):
+        return COLUMN_DIGITAL
+    if _re_analog.match(name):
+        return COLUMN_ANALOG
+    return COLUMN_UNKNOWN
+
+
+def parse_date(text):
+    """Parse a timestamp, as written by the logger."""
+    text = text.strip()
+    if text.isdigit():
+        return datetime.datetime.fromtimestamp(int(text))
+    if len(text) == 19:
+        ## Fast path for "YYYY-MM-DD HH:MM:SS": strptime() is
+        ## several times slower than slicing.
+        try:
+            return datetime.datetime(
+                int(text[0:4]), int(text[5:7]), int(text[8:10]),
+                int(text[11:13]), int(text[14:16]), int(text[17:19]))
+        except ValueError:
+            pass
+    return datetime.datetime.strptime(text, "%Y-%m-%d %H:%M:%S")
+
+
+def _parse_digital(text):
+    return text.strip() not in ('', '0', 'LOW', 'low')
+
+
+def _parse_analog(text):
+    return int(text)
+
+
+def _parse_unknown(text):
+    return text
+
+
+_PARSERS = {
+    COLUMN_DATE: parse_date,
+    COLUMN_DIGITAL: _parse_digital,
+    COLUMN_ANALOG: _parse_analog,
+    COLUMN_UNKNOWN: _parse_unknown,
+}
+
+
+def parse_header(row):
+    """Parse a header row into a list of ``(name, type)`` tuples."""
+    return [(name.strip(), column_type(name)) for name in row]
+
+
+def is_header_row(row):
+    """Whether ``row`` (a list of fields) is a header rather than a
+    record: records always hold numbers, headers don't.
+    """
+    return not any(cell.strip().isdigit() for cell in row)
+
+
+def record_parser(columns):
+    """Return a function converting a list of CSV fields
+    into a record tuple, following the given ``columns``.
+    """
+    parsers = [_PARSERS[ctype] for name, ctype in columns]
+
+    def parse(row):
+        return tuple(p(f) for p, f in zip(parsers, row))
+    return parse
+
+
+def read_log(fileobj):
+    """Read a log file from an open file object.
+
+    Returns a ``(columns, records)`` tuple, where ``columns`` is the
+    list of ``(name, type)`` tuples from the header and ``records``
+    is a generator of record tuples. Blank and malformed lines are
+    skipped.
+    """
+    reader = csv.reader(fileobj)
+    for row in reader:
+        if row:
+            break
+    else:
+        return [], iter(())
+    columns = parse_header(row)
+    return columns, _iter_records(reader, columns)
+
+
+def _iter_records(reader, columns):
+    parse = record_parser(columns)
+    ncols = len(columns)
+    for row in reader:
+        if len(row) != ncols:
+            continue
+        try:
+            yield parse(row)
+        except ValueError:
+            continue
+
+
+def filter_by_time(records, start=None, end=None, date_column=0):
+    """Filter records by time, keeping ``start <= date < end``.
+
+    Records are expected to be in chronological order, as written
+    by the logger: iteration stops at the first record past ``end``.
+    """
+    for record in records:
+        date = record[date_column]
+        if start is not None and date < start:
+            continue
+        if end is not None and date >= end:
+            break
+        yield record
+
+
+## Log files are read as bytes, to follow offsets exactly; fields are
+## parsed as text, which the csv module requires on Python 3
+if bytes is str:  # Python 2: bytes are text already
+    def _decode(line):
+        return line
+else:
+    def _decode(line):
+        return line.decode('ascii', 'replace')
+
+
+class LogFile(object):
+    """A log file that keeps being appended to by the logger.
+
+    The file is read incrementally: :py:meth:`read_new` only parses
+    the records appended since the previous call, starting from
+    :py:attr:`offset`. A last line still being written (without
+    its newline) is left for the next call.
+    """
+
+    path = None
+    columns = None
+    offset = 0
+
+    def __init__(self, path, columns=None, offset=0):
+        self.path = path
+        self.columns = columns
+        self.offset = offset
+
+    def read_header(self):
+        """Read the header line, unless already known.
+        Returns :py:attr:`columns`, or None if the file has no
+        header yet.
+        """
+        if self.columns is None:
+            with open(self.path, 'rb') as fileobj:
+                fileobj.seek(self.offset)
+                for line in self._complete_lines(fileobj):
+                    row = next(csv.reader([_decode(line)]))
+                    if row:
+                        self.columns = parse_header(row)
+                        break
+        return self.columns
+
+    def read_new(self):
+        """Yield the records appended since the last call."""
+        if self.read_header() is None:
+            return
+        with open(self.path, 'rb') as fileobj:
+            fileobj.seek(self.offset)
+            parse = record_parser(self.columns)
+            ncols = len(self.columns)
+            for line in self._complete_lines(fileobj):
+                row = _decode(line).rstrip('\r\n').split(',')
+                if len(row) != ncols:
+                    continue
+                try:
+                    record = parse(row)
+                except ValueError:
+                    continue
+                yield record
+
+    def seek_last(self, count, block_size=65536):
+        """Move :py:attr:`offset` forward to the start of the last
+        ``count`` complete lines, so that :py:meth:`read_new` only
+        reads those. The file is scanned backwards from its end, one
+        block at a time: the rest of it is never read.
+        """
+        if self.read_header() is None:
+            return
+        with open(self.path, 'rb') as fileobj:
+            fileobj.seek(0, os.SEEK_END)
+            pos = fileobj.tell()
+            ## The (count + 1)th newline from the end ends the line
+            ## before the first one wanted; the last line may be
+            ## incomplete, without a newline.
+            newlines = count + 1
+            while pos > self.offset:
+                size = min(block_size, pos - self.offset)
+                pos -= size
+                fileobj.seek(pos)
+                block = fileobj.read(size)
+                end = len(block)
+                while True:
+                    end = block.rfind(b'\n', 0, end)
+                    if end < 0:
+                        break
+                    newlines -= 1
+                    if not newlines:
+                        self.offset = pos + end + 1
+                        return
+
+    def _complete_lines(self, fileobj):
+        ## Plain readline() instead of iterating the file: the
+        ## offset must follow exactly what has been consumed.
+        for line in iter(fileobj.readline, b''):
+            if not line.endswith(b'\n'):
+                break
+            self.offset += len(line)
+            yield line
@@ -0,0 +1,222 @@
+"""
+Columnar, NumPy-backed storage for logged sensor data.
+
+Instead of one Python list per record, each kind of column is kept
+in a compact array:
+
+ * timestamps: ``datetime64[s]``
+ * digital sensors: bits packed with :py:func:`numpy.packbits`,
+   one row of bytes per sensor
+ * analog sensors: ``uint16``, one row per sensor
+
+so that a whole column (or a time window of it) is a plain slice.
+"""
+
+import numpy as np
+
+from datalogger.csvlog import COLUMN_DATE, COLUMN_DIGITAL, COLUMN_ANALOG
+
+
+class SensorData(object):
+    """Columnar sensor dataset.
+
+    ``timestamps`` holds the sample times, ``analog`` is a
+    ``(sensors, samples)`` ``uint16`` array and digital values are
+    read back with :py:meth:`digital`.
+
+    ``columns`` lists the ``(name, type)`` of the stored columns,
+    in the order they had in the source; columns of unknown type
+    are not stored.
+    """
+
+    columns = None
+    timestamps = None
+    analog = None
+    _digital_packed = None
+
+    def __init__(self, columns, timestamps, digital_packed, analog):
+        self.columns = list(columns)
+        self.timestamps = timestamps
+        self._digital_packed = digital_packed
+        self.analog = analog
+
+        ## Position of each column inside its own array
+        self._column_index = []
+        _counters = {COLUMN_DIGITAL: 0, COLUMN_ANALOG: 0}
+        for name, ctype in self.columns:
+            if ctype == COLUMN_DATE:
+                self._column_index.append((ctype, None))
+            else:
+                self._column_index.append((ctype, _counters[ctype]))
+                _counters[ctype] += 1
+
+    @classmethod
+    def from_records(cls, columns, records, chunk_size=4096):
+        """Build a dataset from a ``columns`` description and an
+        iterable of records, as returned by
+        :py:func:`datalogger.csvlog.read_log`.
+
+        Records are consumed ``chunk_size`` at a time, so only one
+        chunk is ever held as Python objects.
+        """
+        if chunk_size % 8:
+            raise ValueError("chunk_size must be a multiple of 8")
+
+        stored = [(cid, name, ctype) for cid, (name, ctype)
+                  in enumerate(columns)
+                  if ctype in (COLUMN_DATE, COLUMN_DIGITAL, COLUMN_ANALOG)]
+        date_cids = [cid for cid, name, ctype in stored
+                     if ctype == COLUMN_DATE]
+        if len(date_cids) != 1:
+            raise ValueError("Exactly one date column is required")
+        date_cid = date_cids[0]
+        digital_cids = [cid for cid, name, ctype in stored
+                        if ctype == COLUMN_DIGITAL]
+        analog_cids = [cid for cid, name, ctype in stored
+                       if ctype == COLUMN_ANALOG]
+
+        ts_chunks, dig_chunks, ana_chunks = [], [], []
+
+        def flush(chunk):
+            ts_chunks.append(np.array(
+                [r[date_cid] for r in chunk], dtype='datetime64[s]'))
+            dig_chunks.append(np.packbits(np.array(
+                [[r[cid] for r in chunk] for cid in digital_cids],
+                dtype=bool).reshape(len(digital_cids), len(chunk)), axis=1))
+            ana_chunks.append(np.array(
+                [[r[cid] for r in chunk] for cid in analog_cids],
+                dtype=np.uint16).reshape(len(analog_cids), len(chunk)))
+
+        chunk = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) == chunk_size:
+                flush(chunk)
+                chunk = []
+        if chunk or not ts_chunks:
+            flush(chunk)
+
+        return cls(
+            [(name, ctype) for cid, name, ctype in stored],
+            np.concatenate(ts_chunks),
+            np.concatenate(dig_chunks, axis=1),
+            np.concatenate(ana_chunks, axis=1))
+
+    @classmethod
+    def load(cls, fileobj):
+        """Load a dataset saved with :py:meth:`save`."""
+        stored = np.load(fileobj)
+        return cls(
+            zip(stored['names'].tolist(), stored['types'].tolist()),
+            stored['timestamps'], stored['digital'], stored['analog'])
+
+    def save(self, fileobj, **extra):
+        """Save the dataset, in NumPy ``.npz`` format, along with the
+        ``extra`` arrays (which :py:meth:`load` ignores).
+        """
+        np.savez(fileobj, **dict(
+            extra,
+            names=np.array([name for name, ctype in self.columns]),
+            types=np.array([ctype for name, ctype in self.columns]),
+            timestamps=self.timestamps,
+            digital=self._digital_packed,
+            analog=self.analog))
+
+    def concatenate(self, other):
+        """Return a new dataset with the samples of ``other``
+        (which must have the same columns) appended.
+        """
+        if list(other.columns) != list(self.columns):
+            raise ValueError("Cannot concatenate datasets with "
+                             "different columns")
+
+        ## Packed bits can only be joined at a byte boundary:
+        ## repack the trailing bits of self together with other.
+        aligned = len(self) - len(self) % 8
+        ## (Shapes are explicit: without digital sensors, there is no
+        ## telling the length of an empty array of rows.)
+        tail = np.concatenate((
+            np.array([self.digital(i, aligned) for i
+                      in range(self.digital_count)], dtype=bool)
+            .reshape(self.digital_count, len(self) - aligned),
+            np.array([other.digital(i) for i
+                      in range(other.digital_count)], dtype=bool)
+            .reshape(other.digital_count, len(other))),
+            axis=1)
+        return SensorData(
+            self.columns,
+            np.concatenate((self.timestamps, other.timestamps)),
+            np.concatenate((self._digital_packed[:, :aligned // 8],
+                            np.packbits(tail, axis=1)), axis=1),
+            np.concatenate((self.analog, other.analog), axis=1))
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @property
+    def digital_count(self):
+        return self._digital_packed.shape[0]
+
+    @property
+    def analog_count(self):
+        return self.analog.shape[0]
+
+    def digital(self, sensor, start=0, stop=None):
+        """Return the values of digital ``sensor`` for samples
+        ``start`` to ``stop``, as a bool array.
+        """
+        start, stop, _ = slice(start, stop).indices(len(self))
+        if stop <= start:
+            return np.zeros(0, dtype=bool)
+        offset = start % 8
+        packed = self._digital_packed[sensor, start // 8:(stop + 7) // 8]
+        return np.unpackbits(packed)[offset:offset + stop - start] \
+            .astype(bool)
+
+    def window(self, start=None, end=None):
+        """Return the ``(first, last)`` sample indexes covering
+        ``start <= timestamp < end``, found by binary search.
+        """
+        lo = 0 if start is None else int(np.searchsorted(
+            self.timestamps, np.datetime64(start, 's'), 'left'))
+        hi = len(self) if end is None else int(np.searchsorted(
+            self.timestamps, np.datetime64(end, 's'), 'left'))
+        return lo, max(lo, hi)
+
+    def column(self, cid, start=0, stop=None):
+        """Return a slice of column ``cid``, numbered as in
+        :py:attr:`columns`.
+        """
+        ctype, idx = self._column_index[cid]
+        if ctype == COLUMN_DATE:
+            return self.timestamps[start:stop]
+        elif ctype == COLUMN_DIGITAL:
+            return self.digital(idx, start, stop)
+        return self.analog[idx, start:stop]
+
+    def analog_summary(self, start=0, stop=None):
+        """Return ``(min, max, mean)`` arrays, one item per analog
+        sensor, over samples ``start`` to ``stop``.
+        """
+        values = self.analog[:, start:stop]
+        if values.shape[1] == 0:
+            empty = np.zeros(self.analog_count)
+            return empty, empty, empty
+        return values.min(axis=1), values.max(axis=1), values.mean(axis=1)
+
+    def iter_records(self, start=0, stop=None, chunk_size=4096):
+        """Yield records as tuples, in the same format as
+        :py:func:`datalogger.csvlog.read_log` (timestamps as
+        :py:class:`datetime.datetime`).
+        """
+        start, stop, _ = slice(start, stop).indices(len(self))
+        for lo in range(start, stop, chunk_size):
+            hi = min(stop, lo + chunk_size)
+            columns = []
+            for cid in range(len(self.columns)):
+                values = self.column(cid, lo, hi)
+                if self._column_index[cid][0] == COLUMN_DATE:
+                    values = values.astype(object)
+                columns.append(values.tolist())
+            for record in zip(*columns):
+                yield record
@@ -0,0 +1,69 @@
+"""
+Downsampling of sensor series before plotting.
+
+A chart can't show more than a few points per pixel column, so long
+series are split into buckets and only the minimum and maximum
+sample of each bucket are kept: the shape of the line, spikes
+included, is preserved while the number of points to draw is
+bounded by the chart width.
+"""
+
+import numpy as np
+
+
+def minmax_indexes(values, buckets):
+    """Return the sorted indexes of the samples to keep in order to
+    plot ``values`` using ``buckets`` buckets: the first and last
+    sample, plus the minimum and maximum of each bucket.
+
+    Series short enough already are returned whole.
+    """
+    values = np.asarray(values)
+    size = len(values)
+    if buckets < 1 or size <= 2 * buckets:
+        return np.arange(size)
+
+    bucket_size = -(-size // buckets)  # ceil
+    padded = np.pad(values, (0, bucket_size * buckets - size), 'edge')
+    padded = padded.reshape(buckets, bucket_size)
+    offsets = np.arange(buckets) * bucket_size
+
+    ## Padding repeats the last value *after* it, so argmin/argmax
+    ## (which return the first occurrence) never pick a padded item.
+    indexes = np.concatenate((
+        [0, size - 1],
+        offsets + padded.argmin(axis=1),
+        offsets + padded.argmax(axis=1)))
+    return np.unique(np.minimum(indexes, size - 1))
+
+
+def downsample_minmax(x, y, buckets):
+    """Downsample the ``(x, y)`` series, keeping the minimum and
+    maximum of each of ``buckets`` buckets.
+    Returns the downsampled ``(x, y)``.
+    """
+    indexes = minmax_indexes(y, buckets)
+    if len(indexes) == len(y):
+        return x, y
+    return np.asarray(x)[indexes], np.asarray(y)[indexes]
+
+
+def downsample_minmax_shared(x, ys, buckets):
+    """Downsample several series sharing the same ``x`` (the rows of
+    ``ys``), keeping a common ``x`` for all of them: each of (at
+    most) ``buckets`` buckets becomes two points at the ``x`` of its
+    first sample, the minimum then the maximum of each series.
+    Returns the downsampled ``(x, ys)``.
+    """
+    ys = np.asarray(ys)
+    size = ys.shape[1]
+    if buckets < 1 or size <= 2 * buckets:
+        return x, ys
+
+    bucket_size = -(-size // buckets)  # ceil
+    count = -(-size // bucket_size)
+    padded = np.pad(ys, ((0, 0), (0, bucket_size * count - size)), 'edge')
+    padded = padded.reshape(ys.shape[0], count, bucket_size)
+    lows_highs = np.stack((padded.min(axis=2), padded.max(axis=2)), axis=2)
+    return (np.repeat(np.asarray(x)[::bucket_size], 2),
+            lows_highs.reshape(ys.shape[0], 2 * count))
@@ -0,0 +1,82 @@
+"""
+Fake data generation, used when there is no log file to show
+(and as a synthetic load source).
+"""
+
+import datetime
+import math
+from random import randint, choice
+
+from datalogger.csvlog import COLUMN_DATE, COLUMN_DIGITAL, COLUMN_ANALOG
+
+## Generate a record every `DATA_LOGGING_TICK` seconds,
+## for the last `DATA_LOGGING_PERIOD` seconds.
+DATA_LOGGING_PERIOD = 5 * 3600  # seconds
+DATA_LOGGING_TICK = 30  # seconds
+ANALOG_MAX = 1024
+
+
+def slrgen(start=None, mindelta=0, maxdelta=5, minval=0, maxval=1000):
+    """Generator of slightly random numbers.
+    Distance between numbers is +- a random number between
+    `mindelta` and `maxdelta`.
+    """
+    s = int(start) if start is not None else randint(minval, maxval)
+    while True:
+        yield s
+        s += choice([1, -1]) * randint(mindelta, maxdelta)
+        if maxval is not None:
+            s = min(maxval, s)
+        if minval is not None:
+            s = max(minval, s)
+
+
+def loop_const_gen(vals=None):
+    if vals is None:
+        vals = [randint(0, 100) for i in range(15)]
+    while True:
+        for v in vals:
+            yield v
+
+
+def loop_sin(steps):
+    while True:
+        for s in range(steps):
+            yield 50 + (math.sin(math.pi * 2 * (s * 1.0 / steps)) * 50)
+
+
+def loop_randint(min, max):
+    while True:
+        yield randint(min, max)
+
+
+def generate_fake_log(digital=5, analog=7, period=DATA_LOGGING_PERIOD,
+                      tick=DATA_LOGGING_TICK, now=None):
+    """Generate fake log data, in the same format returned
+    by :py:func:`datalogger.csvlog.read_log`.
+    """
+    if now is None:
+        now = datetime.datetime.now()
+    columns = (
+        [('date', COLUMN_DATE)]
+        + [('D%d' % i, COLUMN_DIGITAL) for i in range(digital)]
+        + [('A%d' % i, COLUMN_ANALOG) for i in range(analog)])
+
+    ## Used to generate data
+    sensors_digital = [slrgen(minval=0, maxval=1) for x in range(digital)]
+    sensors_analog = [slrgen(minval=0, maxval=ANALOG_MAX - 1, maxdelta=20)
+                      for x in range(analog)]
+
+    def records():
+        ## For each reading time, read a random value from a fake sensor
+        for delta in reversed(range(period // tick)):
+            yield tuple(
+                ## Timestamp
+                [now - datetime.timedelta(seconds=delta * tick)]
+
+                ## Digital sensors
+                + [bool(next(x)) for x in sensors_digital]
+
+                ## Analog sensors
+                + [int(next(x)) for x in sensors_analog])
+    return columns, records()
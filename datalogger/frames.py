@@ -0,0 +1,144 @@
+"""
+Frame writers for the headless monitor
+(see :py:func:`datalogger.monitor.run_headless`).
+
+ * :py:class:`PngWriter`: numbered PNG files
+ * :py:class:`MjpegWriter`: a Motion JPEG file (concatenated JPEG
+   frames, as read by e.g. ``ffmpeg -f mjpeg``)
+ * :py:class:`MjpegServer`: a live MJPEG stream over HTTP
+   (``multipart/x-mixed-replace``), for any number of viewers; each
+   frame is encoded once, whatever the number of viewers.
+"""
+
+import io
+import os
+import socket
+import tempfile
+import threading
+
+import pygame
+
+BOUNDARY = 'frame'
+
+
+def encode_image(surface, extension='jpg'):
+    """Encode ``surface`` as an image file, returned as bytes."""
+    buf = io.BytesIO()
+    try:
+        pygame.image.save(surface, buf, 'frame.' + extension)
+    except TypeError:  # pygame < 2 only saves to named files
+        fd, path = tempfile.mkstemp(suffix='.' + extension)
+        os.close(fd)
+        try:
+            pygame.image.save(surface, path)
+            with open(path, 'rb') as fileobj:
+                return fileobj.read()
+        finally:
+            os.unlink(path)
+    return buf.getvalue()
+
+
+class PngWriter(object):
+    """Write each frame to a PNG file, named from ``pattern`` and
+    the frame number (e.g. ``frames/%06d.png``).
+    """
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.count = 0
+
+    def write(self, surface):
+        pygame.image.save(surface, self.pattern % self.count)
+        self.count += 1
+
+    def close(self):
+        pass
+
+
+class MjpegWriter(object):
+    """Append each frame, as a JPEG image, to the file at ``path``."""
+
+    def __init__(self, path):
+        self.fileobj = open(path, 'wb')
+
+    def write(self, surface):
+        self.fileobj.write(encode_image(surface))
+        self.fileobj.flush()
+
+    def close(self):
+        self.fileobj.close()
+
+
+class MjpegServer(object):
+    """Serve the frames as a Motion JPEG stream, over HTTP, on
+    ``(host, port)``. Viewers connect with a browser (or
+    ``<img src="...">``) and get the frames written after they
+    connected; slow viewers skip frames instead of slowing down
+    the others.
+    """
+
+    def __init__(self, host='localhost', port=8001):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen(5)
+        self.address = self.sock.getsockname()
+        self._frame = None
+        self._frame_number = 0
+        self._condition = threading.Condition()
+        self._closed = False
+        thread = threading.Thread(target=self._accept, name='MjpegServer')
+        thread.daemon = True
+        thread.start()
+
+    def write(self, surface):
+        frame = encode_image(surface)
+        with self._condition:
+            self._frame = frame
+            self._frame_number += 1
+            self._condition.notify_all()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self.sock.close()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, addr = self.sock.accept()
+            except socket.error:
+                return  # Closed
+            thread = threading.Thread(
+                target=self._stream, args=(conn,),
+                name='MjpegServer(%s:%s)' % addr[:2])
+            thread.daemon = True
+            thread.start()
+
+    def _stream(self, conn):
+        try:
+            conn.recv(4096)  # The request: whatever it is, stream
+            conn.sendall((
+                'HTTP/1.0 200 OK\r\n'
+                'Cache-Control: no-cache\r\n'
+                'Content-Type: multipart/x-mixed-replace; boundary=%s\r\n'
+                '\r\n' % BOUNDARY).encode('ascii'))
+            sent = 0
+            while True:
+                with self._condition:
+                    while self._frame_number == sent and not self._closed:
+                        self._condition.wait(1.0)
+                    if self._closed:
+                        return
+                    frame, sent = self._frame, self._frame_number
+                conn.sendall((
+                    '--%s\r\n'
+                    'Content-Type: image/jpeg\r\n'
+                    'Content-Length: %d\r\n'
+                    '\r\n' % (BOUNDARY, len(frame))).encode('ascii')
+                    + frame + b'\r\n')
+        except socket.error:
+            pass  # Viewer gone
+        finally:
+            conn.close()
@@ -0,0 +1,81 @@
+"""
+Fixed-size sample history, for the realtime monitor.
+"""
+
+import time
+
+import numpy as np
+
+## Monotonic clock, where available (Python 3.3+); wall clock otherwise
+monotonic = getattr(time, 'monotonic', time.time)
+
+
+class RingBuffer(object):
+    """Preallocated ring buffer of ``(time, value)`` samples.
+
+    Times and values are kept in two separate NumPy arrays. Each
+    sample is written twice, ``capacity`` items apart, so that the
+    last ``n`` samples are always contiguous in memory and can be
+    returned as views instead of copies.
+    """
+
+    capacity = 0
+
+    def __init__(self, capacity, dtype=np.float64):
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._times = np.zeros(2 * capacity, dtype=np.float64)
+        self._values = np.zeros(2 * capacity, dtype=dtype)
+        self._head = 0  # Where the next sample goes, in 0..capacity-1
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, time, value):
+        """Add a sample, dropping the oldest one if full."""
+        head = self._head
+        self._times[head] = self._times[head + self.capacity] = time
+        self._values[head] = self._values[head + self.capacity] = value
+        self._head = (head + 1) % self.capacity
+        self._size = min(self.capacity, self._size + 1)
+
+    def extend(self, times, values):
+        """Add a batch of samples."""
+        times = np.asarray(times, dtype=np.float64)[-self.capacity:]
+        values = np.asarray(values)[-self.capacity:]
+        count = len(times)
+        ## At most two slices per copy: up to the end of the first
+        ## half, then from its start.
+        first = min(count, self.capacity - self._head)
+        for src, dst in ((slice(0, first), self._head),
+                         (slice(first, count), 0)):
+            size = src.stop - src.start
+            if not size:
+                continue
+            for buf, data in ((self._times, times), (self._values, values)):
+                buf[dst:dst + size] = data[src]
+                buf[dst + self.capacity:dst + self.capacity + size] = data[src]
+        self._head = (self._head + count) % self.capacity
+        self._size = min(self.capacity, self._size + count)
+
+    def get(self, size=0):
+        """Return the last ``size`` samples (all of them if ``size``
+        is 0), oldest first, as a ``(times, values)`` tuple of
+        read-only array views.
+        """
+        if size <= 0 or size > self._size:
+            size = self._size
+        end = self._head + self.capacity
+        times = self._times[end - size:end]
+        values = self._values[end - size:end]
+        times.flags.writeable = values.flags.writeable = False
+        return times, values
+
+    def last(self):
+        """Return the latest ``(time, value)``, or None if empty."""
+        if not self._size:
+            return None
+        pos = self._head + self.capacity - 1
+        return self._times[pos], self._values[pos]
@@ -0,0 +1,57 @@
+"""
+Screen layout of the realtime monitor.
+
+Sensors are shown in a grid of cells, each with a chart and a value
+box. When they don't all fit at a readable size, they are split
+into pages.
+"""
+
+import pygame
+
+PADDING = 15
+VALUE_BOX_WIDTH = 180
+MIN_ROW_HEIGHT = 70
+MIN_CELL_WIDTH = 420
+
+
+def grid_layout(count, size, columns=None, padding=PADDING,
+                value_box_width=VALUE_BOX_WIDTH,
+                min_row_height=MIN_ROW_HEIGHT,
+                min_cell_width=MIN_CELL_WIDTH):
+    """Compute the layout of ``count`` sensors on a screen of
+    ``size``. Returns a list of pages, each a list of ``(chart
+    rect, value box rect)`` tuples, one per sensor in order.
+
+    Sensors fill columns top to bottom; ``columns`` defaults to as
+    many as are needed, and fit the screen width.
+    """
+    width, height = size
+    max_rows = max(1, (height - padding) // (min_row_height + padding))
+    max_columns = max(1, (width - padding) // (min_cell_width + padding))
+    if columns is None:
+        columns = min(max_columns, -(-count // max_rows))  # Ceiling
+    columns = max(1, columns)
+    rows = min(max_rows, -(-count // columns)) or 1
+    per_page = rows * columns
+
+    ## At least a pixel each, however small the screen: charts are
+    ## drawn on surfaces of these sizes
+    row_height = max(1, (height - padding) // rows - padding)
+    cell_width = max(1, (width - padding) // columns - padding)
+    box_width = max(1, min(value_box_width, cell_width // 3))
+    chart_width = max(1, cell_width - box_width - padding)
+
+    cells = []
+    for column in range(columns):
+        left = padding + column * (cell_width + padding)
+        for row in range(rows):
+            top = padding + row * (row_height + padding)
+            cells.append((
+                pygame.Rect(left, top, chart_width, row_height),
+                pygame.Rect(left + cell_width - box_width, top,
+                            box_width, row_height)))
+
+    pages = []
+    for start in range(0, max(count, 1), per_page):
+        pages.append(cells[:min(per_page, count - start)])
+    return pages
@@ -0,0 +1,447 @@
+"""
+Realtime monitor dashboard.
+
+:py:class:`Monitor` draws the dashboard on any pygame surface: the
+display, in :py:func:`run_window`, or a plain offscreen surface, in
+:py:func:`run_headless`, which needs no display at all and hands the
+frames to a writer from :py:mod:`datalogger.frames`.
+"""
+
+import os
+import time
+
+import pygame
+
+from datalogger.fakedata import slrgen, loop_const_gen, loop_sin, \
+    loop_randint
+from datalogger.history import monotonic
+from datalogger.layout import grid_layout, VALUE_BOX_WIDTH
+from datalogger.profiling import FrameProfiler, FRAME, PERCENTILES
+from datalogger.sensors import AnalogSensorBase
+from datalogger.stripchart import StripChart
+from datalogger.textcache import TextCache
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FONTS_DIR = os.path.join(ROOT_DIR, 'fonts')
+
+CAPTION = "Arduino Sensor Monitor"
+DEFAULT_SIZE = (1024, 800)
+WINDOW_FLAGS = pygame.RESIZABLE | pygame.DOUBLEBUF
+DEFAULT_PROFILE_DUMP = 'monitor-profile.json'
+
+
+def font(name, size):
+    return pygame.font.Font(
+        os.path.join(FONTS_DIR, name), size)
+
+
+def demo_sensors():
+    """Sensors showing fake data, as a list of ``(sensor_id,
+    sensor)``.
+    """
+    return [
+        ('s1', AnalogSensorBase(
+            label='Sensor ONE',
+            color=[0xff, 0x00, 0x00],
+            value_generator=slrgen(start=None, maxdelta=5, minval=0,
+                                   maxval=100))),
+        ('s2', AnalogSensorBase(
+            label='Sensor TWO',
+            color=[0xff, 0xff, 0x00],
+            value_generator=loop_const_gen())),
+        ('s3', AnalogSensorBase(
+            label='Sensor THREE',
+            color=[0x00, 0xff, 0x00],
+            value_generator=loop_sin(20))),
+        ('s4', AnalogSensorBase(
+            label='Sensor FOUR',
+            color=[0x88, 0x88, 0xff],
+            value_generator=loop_const_gen(
+                [5, 10, 12, 20, 50, 80, 70, 30, 20, 15, 10, 9, 8, 4]))),
+        ('s5', AnalogSensorBase(
+            label='Sensor FIVE',
+            color=[0xff, 0x00, 0xff],
+            value_generator=loop_randint(0, 100))),
+    ]
+
+
+class Monitor(object):
+    """Dashboard of ``sensors`` (a list of ``(sensor_id, sensor)``
+    in display order), drawn on ``surface``.
+
+    Sensors are read every ``refresh_time`` milliseconds; each
+    :py:meth:`draw` only draws what changed since the previous one,
+    and returns the changed regions.
+
+    Value boxes show the rolling statistics of their sensor, when
+    they are large enough; values are colored by their alert level,
+    from ``alerts`` (an :py:class:`~datalogger.alerts.AlertEngine`).
+    """
+
+    refresh_time = 100  # milliseconds
+    show_fps_label = True
+    show_profile = False
+    profile_refresh_time = 500  # milliseconds
+
+    def __init__(self, surface, sensors, columns=None, alerts=None):
+        self.surface = surface
+        self.sensors = sensors
+        self.columns = columns
+        self.alerts = alerts
+        self.caption = CAPTION
+
+        ## Rendered text is cached: labels are rendered once, and
+        ## values are drawn from the cached glyphs of their characters.
+        self.text_sensor_value_large = TextCache(
+            font('orbitron-bold.ttf', 40))
+        self.text_sensor_value_small = TextCache(
+            font('orbitron-bold.ttf', 22))
+        self.text_sensor_label = TextCache(font('orbitron-light.ttf', 14))
+        self.text_small = TextCache(font('orbitron-light.ttf', 12))
+
+        ## Per-sensor offscreen charts, and the layout they are drawn
+        ## with: both are computed once, and again only when the
+        ## surface is resized or the page changes.
+        self.charts = {}
+        self.pages = None
+        self.page = 0
+        self._visible = []  # (id, sensor, chart rect, value rect)
+        self._text_sensor_value = self.text_sensor_value_large
+        self._show_stats = False
+
+        self._last_refresh = None
+        self._fps_label_text = None
+        self._fps_label_rect = None
+
+        ## Frame timings: sensor reads, text and charts are timed
+        ## here, the rest by the caller (see run_window()).
+        self.profiler = FrameProfiler()
+        self._profile_rect = None
+        self._profile_updated = None
+        self._profile_lines = []
+
+    def invalidate(self):
+        """Redraw everything on the next :py:meth:`draw`: frames,
+        and charts from the sensors history.
+        """
+        self.pages = None
+
+    def resize(self, surface):
+        """Draw on a new ``surface`` (e.g. after a resize)."""
+        self.surface = surface
+        self.invalidate()
+
+    def toggle_profile(self):
+        """Show or hide the frame timings overlay."""
+        self.show_profile = not self.show_profile
+        if not self.show_profile:
+            self.invalidate()  # Redraw what was under the overlay
+        self._profile_updated = self._profile_rect = None
+
+    def change_page(self, step):
+        if self.pages and len(self.pages) > 1:
+            self.page = (self.page + step) % len(self.pages)
+            self.invalidate()
+
+    def _layout(self):
+        self.pages = grid_layout(
+            len(self.sensors), self.surface.get_size(), self.columns)
+        self.page = min(self.page, len(self.pages) - 1)
+        self._visible = [
+            (sensor_id, sensor, chart_rect, value_rect)
+            for (sensor_id, sensor), (chart_rect, value_rect) in zip(
+                self.sensors[self.page * len(self.pages[0]):],
+                self.pages[self.page])]
+        value_box = self.pages[0][0][1] if self.pages[0] else None
+        if value_box and (value_box.width >= VALUE_BOX_WIDTH and
+                          value_box.height >= 100):
+            self._text_sensor_value = self.text_sensor_value_large
+        else:
+            self._text_sensor_value = self.text_sensor_value_small
+        ## Statistics go between the label and the value, if they fit
+        self._show_stats = bool(value_box) and value_box.height >= (
+            30 + 3 * self.text_small.font.get_linesize() +
+            self._text_sensor_value.font.get_linesize())
+        self.caption = CAPTION if len(self.pages) == 1 else \
+            "%s (page %d/%d)" % (CAPTION, self.page + 1, len(self.pages))
+
+        self.surface.fill([0x00, 0x00, 0x00])
+        for sensor_id, sensor, chart_rect, value_rect in self._visible:
+            pygame.draw.rect(self.surface, sensor.color, chart_rect, 1)
+            inner = chart_rect.inflate(-2, -2)
+            if sensor_id in self.charts:
+                self.charts[sensor_id].resize(inner.size)
+            else:
+                self.charts[sensor_id] = StripChart(inner.size)
+            chart = self.charts[sensor_id]
+            chart.render(sensor.get_history(chart.capacity)[1])
+            self.surface.blit(chart.surface, inner)
+
+    def draw(self, now, fps=None):
+        """Draw a frame at time ``now`` (in milliseconds): reads the
+        sensors if it is time to. Returns the list of changed rects,
+        or None if the whole surface changed.
+        """
+        full_redraw = self.pages is None
+        dirty_rects = []
+        if full_redraw:
+            start = monotonic()
+            self._layout()
+            self._last_refresh = None
+            self.profiler.add('charts', monotonic() - start)
+
+        if self._last_refresh is None or \
+                self._last_refresh + self.refresh_time < now:
+            self._refresh(dirty_rects)
+            self._last_refresh = now
+
+        if self.show_fps_label and fps is not None:
+            start = monotonic()
+            self._draw_fps_label(fps, dirty_rects, full_redraw)
+            self.profiler.add('text', monotonic() - start)
+        if self.show_profile:
+            self._draw_profile(now, dirty_rects, full_redraw)
+        return None if full_redraw else dirty_rects
+
+    def _refresh(self, dirty_rects):
+        ## Sensors on other pages are read too, to keep their history
+        start = monotonic()
+        values = dict(
+            (sensor_id, sensor.read()) for sensor_id, sensor in self.sensors)
+        if self.alerts is not None:
+            for sensor_id, sensor in self.sensors:
+                self.alerts.check(sensor_id, sensor)
+        self.profiler.add('sensors', monotonic() - start)
+
+        surface = self.surface
+        text_time = charts_time = 0.0
+        for sensor_id, sensor, chart_rect, value_rect in self._visible:
+            sensor_value = values[sensor_id]
+            start = monotonic()
+
+            ## Rectangle containing the numeric sensor value
+            pygame.draw.rect(surface, [0x00, 0x00, 0x00], value_rect, 0)
+            pygame.draw.rect(surface, sensor.color, value_rect, 1)
+
+            ## Text color changes when an alert is raised
+            if self.alerts is not None:
+                text_color = self.alerts.color(sensor_id)
+            else:
+                text_color = [0xff, 0xff, 0xff]
+
+            self._text_sensor_value.blit_glyphs(
+                surface, "%.1f%%" % sensor_value, text_color,
+                bottom=value_rect.bottom, right=value_rect.right - 10)
+
+            label = self.text_sensor_label.render(sensor.label, sensor.color)
+            label_rect = label.get_rect()
+            label_rect.top = value_rect.top + 10
+            label_rect.centerx = value_rect.centerx
+            surface.blit(label, label_rect)
+            if self._show_stats and sensor.stats:
+                self._draw_stats(next(iter(sensor.stats.values())),
+                                 value_rect, label_rect.bottom + 4)
+            dirty_rects.append(value_rect)
+            text_done = monotonic()
+            text_time += text_done - start
+
+            ## Scroll the chart by one step, and copy it in place,
+            ## inside its frame. Every pixel of the chart moved: its
+            ## whole area is dirty, not just the newest column (as it
+            ## was when a cursor swept over a fixed chart).
+            chart = self.charts[sensor_id]
+            chart.push(sensor_value)
+            dirty_rects.append(surface.blit(
+                chart.surface, chart_rect.inflate(-2, -2)))
+            charts_time += monotonic() - text_done
+
+        self.profiler.add('text', text_time)
+        self.profiler.add('charts', charts_time)
+
+    def _draw_stats(self, stats, value_rect, top):
+        if not len(stats):
+            return
+        text = self.text_small
+        line_height = text.font.get_linesize()
+        for i, line in enumerate([
+                "min %.1f  max %.1f" % (stats.min, stats.max),
+                "avg %.1f  sd %.1f" % (stats.mean, stats.stddev),
+                "%+.2f/s (%gs)" % (stats.rate, stats.window)]):
+            text.blit_glyphs(self.surface, line, [0xaa, 0xaa, 0xaa],
+                             centerx=value_rect.centerx,
+                             top=top + i * line_height)
+
+    def _draw_fps_label(self, fps, dirty_rects, full_redraw):
+        if fps >= 40:
+            color = [0x00, 0xff, 0x00]
+        elif fps >= 25:
+            color = [0xff, 0xff, 0x00]
+        else:
+            color = [0xff, 0x00, 0x00]
+
+        ## Redraw the label only when its text changes
+        text = "%d FPS" % fps
+        if text == self._fps_label_text and not full_redraw:
+            return
+        self._fps_label_text = text
+        label = self.text_small.render(text, color)
+        rect = label.get_rect()
+        rect.bottomleft = 0, self.surface.get_height()
+        rect.width = max(40, rect.width)
+        if self._fps_label_rect is not None and not full_redraw:
+            self.surface.fill([0, 0, 0], self._fps_label_rect)
+            dirty_rects.append(self._fps_label_rect)
+        self.surface.fill([0, 0, 0], rect)
+        self.surface.blit(label, rect)
+        dirty_rects.append(rect)
+        self._fps_label_rect = rect
+
+    def _draw_profile(self, now, dirty_rects, full_redraw):
+        ## The overlay is drawn over the charts: draw it again when
+        ## they were drawn over it, and update it twice a second.
+        rect = self._profile_rect
+        outdated = self._profile_updated is None or \
+            self._profile_updated + self.profile_refresh_time < now
+        if not (outdated or full_redraw or
+                (rect is not None and rect.collidelist(dirty_rects) >= 0)):
+            return
+        if outdated:
+            self._profile_updated = now
+            percentiles = self.profiler.percentiles()
+            self._profile_lines = [
+                ["ms"] + ["p%d" % p for p in PERCENTILES]] + [
+                [name] + ["%.1f" % value for value in percentiles[name]]
+                for name in self.profiler.phases + (FRAME,)
+                if name in percentiles]
+
+        start = monotonic()
+        text = self.text_small
+        line_height = text.font.get_linesize()
+        ## A table: phase names left-aligned, numbers right-aligned
+        widths = [max(text.size(cell)[0] for cell in column) + 10
+                  for column in zip(*self._profile_lines)]
+        ## The overlay only grows, so that it always covers what it
+        ## was drawn over before.
+        width = max(sum(widths) + 10, rect.width if rect is not None else 0)
+        rect = pygame.Rect(0, 0, width,
+                           line_height * len(self._profile_lines) + 10)
+        rect.topright = self.surface.get_width() - 5, 5
+        self.surface.fill([0x20, 0x20, 0x20], rect)
+        for i, line in enumerate(self._profile_lines):
+            top = rect.top + 5 + i * line_height
+            text.blit_glyphs(self.surface, line[0], [0xff, 0xff, 0xff],
+                             left=rect.left + 10, top=top)
+            right = rect.right - 10 - sum(widths[1:])
+            for cell, cell_width in zip(line[1:], widths[1:]):
+                right += cell_width
+                text.blit_glyphs(self.surface, cell, [0xff, 0xff, 0xff],
+                                 right=right, top=top)
+        dirty_rects.append(rect)
+        self._profile_rect = rect
+        self.profiler.add('text', monotonic() - start)
+
+
+def run_window(sensors, columns=None, size=DEFAULT_SIZE, max_fps=50,
+               profile_dump=None, alerts=None):
+    """Show the monitor in a window, until it is closed.
+
+    F3 shows the frame timings, F4 writes them to ``profile_dump``
+    (default: :py:data:`DEFAULT_PROFILE_DUMP`); they are also
+    written there on exit, if set.
+    """
+    pygame.init()
+    screen = pygame.display.set_mode(size, WINDOW_FLAGS)
+    monitor = Monitor(screen, sensors, columns, alerts)
+    profiler = monitor.profiler
+    clock = pygame.time.Clock()
+    caption = None
+
+    keep_running = True
+    while keep_running:
+        profiler.start_frame()
+        start = monotonic()
+
+        ## Process events
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                keep_running = False
+            elif event.type == pygame.VIDEORESIZE:
+                monitor.resize(pygame.display.set_mode(
+                    event.size, WINDOW_FLAGS))
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    keep_running = False
+                elif event.key == pygame.K_F5:
+                    ## Should flash
+                    screen.fill([0xff, 0xff, 0xff])
+                    pygame.display.flip()
+                    pygame.time.delay(10)
+                    monitor.invalidate()
+                elif event.key == pygame.K_PAGEDOWN:
+                    monitor.change_page(1)
+                elif event.key == pygame.K_PAGEUP:
+                    monitor.change_page(-1)
+                elif event.key == pygame.K_F3:
+                    monitor.toggle_profile()
+                elif event.key == pygame.K_F4:
+                    profiler.dump(profile_dump or DEFAULT_PROFILE_DUMP)
+        profiler.add('events', monotonic() - start)
+
+        dirty_rects = monitor.draw(pygame.time.get_ticks(), clock.get_fps())
+        if monitor.caption != caption:
+            caption = monitor.caption
+            pygame.display.set_caption(caption)
+
+        ## Push changes to the screen; when nothing changed, don't
+        ## touch the display at all and just wait for the next frame.
+        start = monotonic()
+        if dirty_rects is None:
+            pygame.display.flip()
+        elif dirty_rects:
+            pygame.display.update(dirty_rects)
+        profiler.add('flip', monotonic() - start)
+        profiler.end_frame()
+
+        ## Wait a bit..
+        clock.tick(max_fps)
+
+    if profile_dump:
+        profiler.dump(profile_dump)
+    pygame.quit()
+
+
+def run_headless(sensors, writer, columns=None, size=DEFAULT_SIZE,
+                 fps=10, frames=None, profile_dump=None, alerts=None):
+    """Render the monitor offscreen, without any display, passing
+    ``fps`` frames per second to ``writer`` (see
+    :py:mod:`datalogger.frames`), until interrupted or ``frames``
+    have been written. Writing a frame counts as the ``flip`` phase
+    of the timings, written to ``profile_dump`` at the end if set.
+    """
+    pygame.font.init()
+    monitor = Monitor(pygame.Surface(size), sensors, columns, alerts)
+    monitor.show_fps_label = False
+    profiler = monitor.profiler
+    start = monotonic()
+    count = 0
+    try:
+        while frames is None or count < frames:
+            profiler.start_frame()
+            monitor.draw(int((monotonic() - start) * 1000))
+            write_start = monotonic()
+            writer.write(monitor.surface)
+            profiler.add('flip', monotonic() - write_start)
+            profiler.end_frame()
+            count += 1
+            ## Keep to the frame rate, without drifting
+            delay = start + count * 1.0 / fps - monotonic()
+            if delay > 0:
+                time.sleep(delay)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        writer.close()
+        if profile_dump:
+            profiler.dump(profile_dump)
+        pygame.quit()
+    return count
@@ -0,0 +1,84 @@
+"""
+Per-phase frame timings, for the realtime monitor.
+
+Each frame is split into phases (see :py:data:`PHASES`); the time
+spent in each one is kept for the last ``window`` frames, to compute
+rolling percentiles, show them (see
+:py:meth:`datalogger.monitor.Monitor._draw_profile`) or dump them to
+a file.
+"""
+
+import json
+
+import numpy as np
+
+from datalogger.history import RingBuffer, monotonic
+
+## Frame phases, in order
+PHASES = ('events', 'sensors', 'text', 'charts', 'flip')
+FRAME = 'frame'  # Sum of all phases
+
+PERCENTILES = (50, 90, 99)
+
+
+class FrameProfiler(object):
+    """Collect per-phase frame timings. In a frame::
+
+        profiler.start_frame()
+        start = timer()
+        ...
+        profiler.add('events', timer() - start)
+        ...
+        profiler.end_frame()
+
+    where ``timer`` is :py:data:`datalogger.history.monotonic`.
+    Phases may be added to several times per frame.
+    """
+
+    def __init__(self, phases=PHASES, window=300):
+        self.phases = tuple(phases)
+        self.window = window
+        self.frames = 0
+        self._history = dict(
+            (name, RingBuffer(window)) for name in self.phases + (FRAME,))
+        self._current = dict.fromkeys(self.phases, 0.0)
+
+    def start_frame(self):
+        for name in self.phases:
+            self._current[name] = 0.0
+
+    def add(self, phase, seconds):
+        self._current[phase] += seconds
+
+    def end_frame(self):
+        now = monotonic()
+        for name in self.phases:
+            self._history[name].append(now, self._current[name])
+        self._history[FRAME].append(now, sum(self._current.values()))
+        self.frames += 1
+
+    def percentiles(self, percentiles=PERCENTILES):
+        """Return the rolling percentiles of each phase (and of the
+        whole frame), in milliseconds: a dict of ``{phase: [p, ...]}``.
+        Empty before the first frame.
+        """
+        if not self.frames:
+            return {}
+        return dict(
+            (name, (np.percentile(history.get()[1], percentiles) * 1000)
+             .tolist())
+            for name, history in self._history.items())
+
+    def dump(self, path):
+        """Write the percentiles, and the timings of the last frames
+        (in milliseconds), to ``path`` as JSON.
+        """
+        data = dict(
+            frames=self.frames,
+            percentiles=list(PERCENTILES),
+            phases=self.percentiles(),
+            samples=dict(
+                (name, (history.get()[1] * 1000).tolist())
+                for name, history in self._history.items()))
+        with open(path, 'w') as fileobj:
+            json.dump(data, fileobj, indent=2, sort_keys=True)
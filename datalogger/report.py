@@ -0,0 +1,699 @@
+"""
+Report generator for the Arduino Data Logger, as a WSGI application.
+
+The report is served from a single URL; the query string selects
+what to return:
+
+ * ``?from=...&to=...&page=...&per_page=...``: the HTML report,
+   with the data table showing just one page of the time window
+   (``to`` excluded), and the digital sensors drawn as bars of their
+   state spans over the rows of that page (see
+   :py:func:`iter_digital_html`); it is streamed, the head first,
+   then the table rows a few at a time
+ * ``?chart=png&from=...&to=...``: the chart image for a time
+   window, with ``ETag`` / ``Last-Modified`` headers so that an
+   unchanged chart is answered with ``304 Not Modified``
+ * ``?data=json&from=...&to=...&points=...&since=...``: the analog
+   series of a time window as JSON, downsampled to about ``points``
+   points (see :py:func:`json_series`), for the chart drawn by the
+   browser (``js/chart.js``); with ``since`` (a unix time), only the
+   samples after it
+
+so the browser caches the chart on its own, and a table-only
+refresh never pays for a matplotlib render. The page draws the
+chart client side from the JSON data, which it can pan and zoom
+without asking the server for every frame; the PNG chart is only
+used without JavaScript.
+"""
+
+import datetime
+import email.utils
+import io
+import json
+import os
+from xml.sax.saxutils import escape
+
+try:
+    from urllib import urlencode
+    from urlparse import parse_qs
+except ImportError:  # Python 3
+    from urllib.parse import urlencode, parse_qs
+
+import numpy as np
+
+from datalogger.binlog import BinaryLogLoader, is_binary_log
+from datalogger.cache import RenderCache, DatasetLoader, cache_key, \
+    DEFAULT_CACHE_DIR
+from datalogger.colors import Palette, HUE_BLUE, HUE_RED
+from datalogger.csvlog import filter_by_time, \
+    COLUMN_DATE, COLUMN_DIGITAL, COLUMN_ANALOG
+from datalogger.dataset import SensorData
+from datalogger.downsample import downsample_minmax, \
+    downsample_minmax_shared
+from datalogger.fakedata import generate_fake_log, ANALOG_MAX
+from datalogger.rollup import RollupCache, RESOLUTIONS, pick_resolution, \
+    rollup_window
+from datalogger.transitions import Transitions, TransitionCache
+
+DEFAULT_DATA_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data.csv')
+
+CHART_SIZE = (20, 10)  # inches
+CHART_DPI = 90
+
+## No more than a couple of points per horizontal pixel are visible:
+## keep the min/max of one bucket per pixel column.
+CHART_BUCKETS = CHART_SIZE[0] * CHART_DPI
+
+## Long time windows are charted from rollups: the coarsest ones still
+## giving this many buckets (see datalogger.rollup.pick_resolution)
+CHART_MIN_ROLLUP_BUCKETS = CHART_BUCKETS // 4
+
+## Points in the JSON series, by default and at most
+JSON_POINTS = 2 * CHART_BUCKETS
+JSON_MAX_POINTS = 20000
+
+## Colour scale for analog values: one precomputed entry per reading
+ANALOG_PALETTE = Palette(hue_cold=HUE_BLUE, hue_hot=HUE_RED)
+
+## Digital sensors are drawn from their transitions, one bar per
+## sensor; past this many spans in the time window, as the duty cycle
+## of as many time buckets instead, which is all that can be seen
+DIGITAL_MAX_SPANS = CHART_BUCKETS // 2
+
+_digital_cells = np.array([
+    '<img src="img/lightbulb_off.png" alt="LOW" />',
+    '<img src="img/lightbulb.png" alt="HIGH" />'])
+
+## The page is sent in pieces, as soon as each one is ready: the head
+## first, then the pager and table rows, TABLE_CHUNK_ROWS at a time
+TABLE_CHUNK_ROWS = 100
+
+PAGE_HEAD_TEMPLATE = """\
+<!DOCTYPE html>
+<html><head>
+    <title>Arduino data logger</title>
+<style type='text/css'>
+.data-table{border-collapse:collapse;font-family:monospace;box-shadow:#888 2px 2px 2px;}
+.data-table,.data-table td{border:solid 1px #888;padding:2px 5px;}
+.data-table th {text-align:center;background:#ddd;}
+.data-table td.field-analog-value {text-align:right;}
+.sensor-label-analog {color:#f00;}
+.sensor-label-digital {color:#00f;}
+tr.even td {background:#fff;}
+tr.odd td {background:#eee;}
+.pager {margin:10px 0;font-family:sans-serif;}
+.pager a, .pager span {margin-right:8px;}
+.pager span {color:#888;}
+.chart {width:100%%;height:450px;position:relative;cursor:move;}
+.digital {margin:10px 0;font-family:sans-serif;}
+.digital-row {position:relative;height:20px;margin:2px 0;}
+.digital-row span {position:absolute;top:2px;
+                    white-space:nowrap;overflow:hidden;}
+.digital-label {left:0;width:140px;}
+.digital-summary {right:0;width:200px;font-size:smaller;color:#444;}
+.digital-track {position:absolute;left:150px;right:210px;top:2px;bottom:2px;
+                background:#eee;border:solid 1px #888;}
+.digital-track div {position:absolute;top:0;bottom:0;background:#00f;}
+</style>
+</head><body>
+    <h1>Arduino data logger</h1>
+    %(data_plot_html)s
+    %(data_window_form_html)s
+"""
+
+PAGE_FOOTER = """
+</body></html>
+"""
+
+WINDOW_FORM_TEMPLATE = """\
+<form class='window' method='get' action=''>
+    From <input type='text' name='from' value='%(from)s' placeholder='YYYY-MM-DD HH:MM:SS' />
+    to <input type='text' name='to' value='%(to)s' placeholder='YYYY-MM-DD HH:MM:SS' />
+    rows per page <input type='text' name='per_page' value='%(per_page)d' size='4' />
+    <input type='submit' value='Show' />
+</form>"""
+
+
+CHART_TEMPLATE = """\
+<div class='chart' data-url='%(json_url)s' data-live='%(live)s'>
+    <noscript><img src="%(png_url)s" alt="The Plot" /></noscript>
+</div>
+<script type='text/javascript' src='js/jquery-1.7.min.js'></script>
+<script type='text/javascript' src='js/raphael-min.js'></script>
+<script type='text/javascript' src='js/chart.js'></script>"""
+
+
+def format_date(d):
+    return d.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _quote_attr(text):
+    return escape(text, {"'": '&#39;', '"': '&quot;'})
+
+
+def parse_query_date(text):
+    """Parse a date from the query string; None if missing or invalid."""
+    text = (text or '').strip().replace('T', ' ')
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.datetime.strptime(text, fmt)
+        except ValueError:
+            pass
+    return None
+
+
+def parse_query_int(text, default, minval=None, maxval=None):
+    """Parse an integer from the query string, clamped to the
+    given range.
+    """
+    try:
+        value = int(text)
+    except (TypeError, ValueError):
+        return default
+    if maxval is not None:
+        value = min(maxval, value)
+    if minval is not None:
+        value = max(minval, value)
+    return value
+
+
+class ReportQuery(object):
+    """Report parameters, from the query string:
+
+     * ``from``, ``to``: time window to display (``to`` excluded)
+     * ``page``, ``per_page``: page of the data table to display
+     * ``chart``: ``png`` to get the chart image instead of the page
+     * ``data``: ``json`` to get the chart data instead of the page
+     * ``points``: number of points of the chart data
+     * ``since``: unix time after which to return chart data
+    """
+
+    def __init__(self, query_string):
+        self.params = parse_qs(query_string or '')
+        self.start = parse_query_date(self.get('from'))
+        self.end = parse_query_date(self.get('to'))
+        self.page = parse_query_int(self.get('page'), 1, minval=1)
+        self.per_page = parse_query_int(
+            self.get('per_page'), 100, minval=1, maxval=1000)
+        self.chart = self.get('chart')
+        self.data = self.get('data')
+        self.points = parse_query_int(
+            self.get('points'), JSON_POINTS, minval=2, maxval=JSON_MAX_POINTS)
+        self.since = parse_query_int(self.get('since'), None)
+
+    def get(self, key, default=None):
+        return self.params.get(key, [default])[0]
+
+    def url(self, **params):
+        """Build a (relative) URL to the report, keeping the
+        current time window.
+        """
+        query = [(key, self.get(key)) for key in ('from', 'to')
+                 if self.get(key)]
+        query.extend(sorted(params.items()))
+        return '?' + urlencode(query)
+
+
+### --- HTML data table
+
+def column_label(data, cid):
+    name, ctype = data.columns[cid]
+    if ctype == COLUMN_DATE:
+        return "Date"
+    elif ctype == COLUMN_DIGITAL:
+        return ("<span title='Digital Sensor %d' "
+                "class='sensor-label-digital'>%s</span>" % (cid, escape(name)))
+    elif ctype == COLUMN_ANALOG:
+        return ("<span title='Analog Sensor %d' "
+                "class='sensor-label-analog'>%s</span>" % (cid, escape(name)))
+    else:
+        return "---"
+
+
+def format_column(ctype, values):
+    """Format a slice of a column of type ``ctype`` into a list of
+    html cell contents. Whole columns are converted at once, instead
+    of one value at a time.
+    """
+    if ctype == COLUMN_DATE:
+        return [d.replace('T', ' ') for d in
+                np.datetime_as_string(values, unit='s').tolist()]
+    elif ctype == COLUMN_DIGITAL:
+        return _digital_cells[values.astype(np.intp)].tolist()
+    elif ctype == COLUMN_ANALOG:
+        return ["<span title='%d' style='background-color: %s;'>"
+                "%.1f%%</span>" % cell
+                for cell in zip(
+                    values.tolist(),
+                    ANALOG_PALETTE.lookup_hex(values).tolist(),
+                    (values * (100.0 / ANALOG_MAX)).tolist())]
+    else:
+        return values.tolist()
+
+
+def format_records(data, start, stop):
+    """Format records ``start`` to ``stop`` as html table rows."""
+    columns = [
+        ["<td class='field-%s-value'>%s</td>" % (ctype, cell)
+         for cell in format_column(ctype, data.column(cid, start, stop))]
+        for cid, (name, ctype) in enumerate(data.columns)]
+    return [
+        "<tr class='%s'><td>%d</td>%s</tr>" % (
+            'odd' if rid % 2 else 'even', rid, "".join(cells))
+        for rid, cells in enumerate(zip(*columns), start)]
+
+
+def iter_table_html(data, start, stop, chunk_rows=TABLE_CHUNK_ROWS):
+    """Generate the html table of records ``start`` to ``stop``, in
+    pieces of (at most) ``chunk_rows`` rows: only one piece is
+    formatted, and kept in memory, at a time.
+    """
+    ## Header
+    yield "<table class='data-table'><thead><tr>%s</tr></thead><tbody>" % \
+        "".join(["<th>ID</th>"] +
+                ["<th>%s</th>" % column_label(data, cid)
+                 for cid in range(len(data.columns))])
+
+    ## Table content
+    for chunk_start in range(start, stop, chunk_rows):
+        yield "".join(format_records(
+            data, chunk_start, min(stop, chunk_start + chunk_rows)))
+    yield "</tbody></table>"
+
+
+def render_table_html(data, start, stop):
+    return "".join(iter_table_html(data, start, stop))
+
+
+### --- Digital sensors
+
+def iter_digital_html(transitions, start, end, max_spans=DIGITAL_MAX_SPANS):
+    """Generate the html bars of the digital sensors over
+    ``start <= time <= end`` (unix times), from their
+    :py:class:`~datalogger.transitions.Transitions`: one bar per
+    sensor, with a box for each span it was high, and its number of
+    changes and duty cycle.
+
+    A sensor with more than ``max_spans`` spans in the time range is
+    drawn as ``max_spans`` boxes instead, as opaque as the sensor
+    was high in each of them.
+    """
+    span = float(max(1, end - start))
+    yield "<div class='digital'>"
+    for sensor, name in enumerate(transitions.names):
+        starts, ends, states = transitions.spans(sensor, start, end)
+        if len(starts) <= max_spans:
+            starts, ends = starts[states], ends[states]
+            titles = ["HIGH %s - %s" % times for times in zip(
+                *[np.datetime_as_string(values.astype('datetime64[s]'),
+                                        unit='s').tolist()
+                  for values in (starts, ends)])]
+            opacity = np.ones(len(starts))
+        else:
+            edges = np.linspace(start, end, max_spans + 1).astype(np.int64)
+            duty = transitions.duty_cycles(sensor, edges)
+            shown = np.flatnonzero(duty > 0)
+            starts, ends, opacity = edges[shown], edges[shown + 1], \
+                duty[shown]
+            titles = ["%.0f%% HIGH" % (value * 100)
+                      for value in opacity.tolist()]
+        widths = (ends - starts) * (100 / span)
+        if end <= start:
+            ## A single time (e.g. a page of one row): its state over
+            ## the whole bar
+            widths = np.full(len(starts), 100.0)
+        boxes = "".join(
+            "<div style='left:%.3f%%;width:%.3f%%;opacity:%.2f' "
+            "title='%s'></div>" % (
+                left, max(width, 0.05), alpha, title.replace('T', ' '))
+            for left, width, alpha, title in zip(
+                ((starts - start) * (100 / span)).tolist(),
+                widths.tolist(), opacity.tolist(), titles))
+        duty = transitions.duty_cycle(sensor, start, end)
+        yield ("<div class='digital-row'>"
+               "<span class='digital-label sensor-label-digital'>%s</span>"
+               "<div class='digital-track'>%s</div>"
+               "<span class='digital-summary'>%d changes, %s high</span>"
+               "</div>") % (
+            escape(name), boxes,
+            transitions.count(sensor, start, end + 1),
+            '%.1f%%' % (duty * 100) if duty is not None else '-')
+    yield "</div>"
+
+
+### --- Chart
+
+def chart_series(data, start, stop, rollup=None):
+    """Extract what is needed to draw the chart of samples ``start``
+    to ``stop``: returns a ``(title, series)`` tuple, where
+    ``series`` is a list of downsampled ``(timestamps, values)``,
+    one per analog sensor.
+
+    If ``rollup`` (a :py:class:`~datalogger.rollup.Rollup` of the
+    whole of ``data``) is given, the minimum and maximum of each of
+    its buckets are plotted instead of the samples.
+    """
+    timestamps = data.timestamps[start:stop]
+    title = "Arduino sensors log data: %s" % (
+        " - ".join(np.datetime_as_string(timestamps[[0, -1]], unit='s'))
+        .replace('T', ' ') if len(timestamps) else "no data")
+    if rollup is None:
+        ## Each analog sensor is a row of data.analog: no copies needed
+        series = [downsample_minmax(timestamps, sensor_values, CHART_BUCKETS)
+                  for sensor_values in data.analog[:, start:stop]]
+        return title, series
+
+    window = rollup_window(data, rollup, start, stop)
+    timestamps = np.repeat(window.starts, 2)
+    series = [
+        downsample_minmax(
+            timestamps, np.column_stack((lows, highs)).ravel(), CHART_BUCKETS)
+        for lows, highs in zip(window.analog_min, window.analog_max)]
+    return "%s (%s buckets)" % (
+        title, dict(RESOLUTIONS)[rollup.resolution]), series
+
+
+def render_chart(title, series):
+    """Render a chart, from the output of :py:func:`chart_series`,
+    as PNG data.
+    """
+    ## matplotlib is only imported when a chart has to be rendered:
+    ## importing it costs more than serving a cached chart.
+    ## The object-oriented API is used instead of pyplot, which keeps
+    ## global state and can't render from several threads.
+    os.environ.setdefault('MPLCONFIGDIR', '/tmp')
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=CHART_SIZE)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    for timestamps, values in series:
+        ax.plot_date(timestamps, values, fmt='-')
+    ax.set_title(title)
+    for label in ax.get_xticklabels():
+        label.set_rotation(30)
+
+    out = io.BytesIO()
+    fig.savefig(out, format='png', dpi=CHART_DPI)
+    return out.getvalue()
+
+
+def render_chart_png(data, start, stop):
+    """Render the chart of samples ``start`` to ``stop``,
+    as PNG data.
+    """
+    return render_chart(*chart_series(data, start, stop))
+
+
+### --- JSON chart data
+
+def json_series(data, start, stop, points, rollup=None):
+    """Return the analog series of samples ``start`` to ``stop`` as
+    a dict, to be sent as JSON to the client side chart:
+
+     * ``columns``: the names of the analog sensors
+     * ``t0``, ``dt``: the times of the points (in seconds since the
+       epoch, log time), delta-encoded: ``t0`` is the first one,
+       ``dt`` the differences between consecutive ones
+     * ``values``: the raw readings (out of ``max``) of each
+       sensor, one list per sensor, one item per point
+     * ``last``: the time of the last sample, for a ``since`` query
+     * ``resolution``: the rollup used (in seconds), 0 for samples
+     * ``downsampled``: whether there are fewer points than samples
+
+    Series longer than ``points`` are downsampled: each bucket gives
+    a point for its minimum and one for its maximum, at the time of
+    its start. If ``rollup`` (a :py:class:`~datalogger.rollup.Rollup`
+    of the whole of ``data``) is given, its buckets are used instead
+    of the samples.
+    """
+    if rollup is None:
+        timestamps = data.timestamps[start:stop]
+        values = data.analog[:, start:stop]
+    else:
+        window = rollup_window(data, rollup, start, stop)
+        timestamps = np.repeat(window.starts, 2)
+        values = np.stack((window.analog_min, window.analog_max), axis=2) \
+            .reshape(len(window.analog_min), 2 * len(window))
+    timestamps, values = downsample_minmax_shared(
+        timestamps, values, points // 2)
+    times = timestamps.astype('datetime64[s]').astype(np.int64)
+    return dict(
+        columns=[name for name, ctype in data.columns
+                 if ctype == COLUMN_ANALOG],
+        t0=int(times[0]) if len(times) else None,
+        dt=np.diff(times).tolist(),
+        values=values.tolist(),
+        max=ANALOG_MAX,
+        last=int(data.timestamps[stop - 1].astype('datetime64[s]')
+                 .astype(np.int64)) if stop > start else None,
+        resolution=rollup.resolution if rollup is not None else 0,
+        downsampled=rollup is not None or len(times) < stop - start)
+
+
+def _not_modified(environ, etag, mtime):
+    """Check the conditional request headers against the
+    current ``etag`` / ``mtime`` of a resource.
+    """
+    if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        ## If-None-Match takes precedence over If-Modified-Since
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        return etag is not None and (etag in tags or '*' in tags)
+    if_modified_since = environ.get('HTTP_IF_MODIFIED_SINCE')
+    if if_modified_since and mtime is not None:
+        since = email.utils.parsedate_tz(if_modified_since)
+        if since is not None:
+            return int(mtime) <= email.utils.mktime_tz(since)
+    return False
+
+
+### --- Application
+
+class ReportApp(object):
+    """WSGI application serving the data logger report.
+
+    ``data_file`` is the log to display, either a CSV log or a
+    binary log (see :py:mod:`datalogger.binlog`, which is read as is);
+    when it is missing, fake data is generated instead (and nothing
+    is cached). The parsed log is kept in memory across requests.
+
+    Charts are drawn by ``chart_renderer``, called with the
+    ``(title, series)`` from :py:func:`chart_series`; it defaults
+    to :py:func:`render_chart`.
+    """
+
+    data_file = None
+    cache_dir = None
+    chart_renderer = None
+
+    def __init__(self, data_file=DEFAULT_DATA_FILE,
+                 cache_dir=DEFAULT_CACHE_DIR, chart_renderer=None):
+        self.data_file = data_file
+        self.cache_dir = cache_dir
+        self.chart_renderer = chart_renderer or render_chart
+        self.chart_cache = RenderCache(os.path.join(cache_dir, 'charts'))
+        if is_binary_log(data_file):
+            self.data_loader = BinaryLogLoader(data_file)
+        else:
+            self.data_loader = DatasetLoader(data_file, cache_dir)
+        self.rollups = RollupCache(data_file, cache_dir)
+        self.transitions = TransitionCache(data_file, cache_dir)
+
+    def load_data(self, query):
+        """Return the ``(dataset, generation, mtime)`` to report on.
+        ``generation`` is None for fake data.
+        """
+        if os.path.exists(self.data_file):
+            ## The whole log is loaded, but only appended records get
+            ## parsed: the rest comes from the cache.
+            data, generation = self.data_loader.load()
+            return data, generation, os.path.getmtime(self.data_file)
+        columns, records = generate_fake_log()
+        records = filter_by_time(records, query.start, query.end)
+        return SensorData.from_records(columns, records), None, None
+
+    def load_transitions(self, data, generation):
+        """Return the :py:class:`~datalogger.transitions.Transitions`
+        of the digital sensors of ``data``, as :py:meth:`load_data`
+        returned it.
+        """
+        if generation is None:
+            return Transitions.compute(data)
+        return self.transitions.get(data, generation)
+
+    def __call__(self, environ, start_response):
+        query = ReportQuery(environ.get('QUERY_STRING'))
+        if query.chart != 'png' and query.data != 'json':
+            return self.serve_page(start_response, query)
+        data, generation, mtime = self.load_data(query)
+
+        ## The timestamps are sorted: the window is found by binary search
+        start, stop = data.window(query.start, query.end)
+
+        if query.chart == 'png':
+            return self.serve_chart(
+                environ, start_response, data, generation, mtime, start, stop)
+        return self.serve_json(environ, start_response, query,
+                               data, generation, mtime, start, stop)
+
+    def serve_chart(self, environ, start_response, data, generation, mtime,
+                    start, stop):
+        if generation is None:
+            ## Fake data changes on every run: nothing to cache
+            start_response('200 OK', [
+                ('Content-Type', 'image/png'),
+                ('Cache-Control', 'no-store')])
+            return [self.chart_renderer(*chart_series(data, start, stop))]
+
+        ## Long windows are drawn from the rollups, computed (or
+        ## updated) only when the chart has to be rendered.
+        resolution = pick_resolution(
+            data, start, stop, CHART_MIN_ROLLUP_BUCKETS)
+
+        def render():
+            rollup = None
+            if resolution is not None:
+                rollup = self.rollups.get(data, generation)[resolution]
+            return self.chart_renderer(
+                *chart_series(data, start, stop, rollup))
+
+        ## Logs are append-only: the same rows of the same generation
+        ## always give the same chart, even if the log has grown since.
+        key = cache_key(os.path.abspath(self.data_file), generation,
+                        start, stop, resolution, CHART_SIZE, CHART_DPI)
+        headers = [
+            ('ETag', '"%s"' % key),
+            ('Last-Modified', email.utils.formatdate(mtime, usegmt=True)),
+            ('Cache-Control', 'no-cache'),
+        ]
+        if _not_modified(environ, headers[0][1], mtime):
+            start_response('304 Not Modified', headers)
+            return []
+
+        png = self.chart_cache.get_or_render(key, render)
+        start_response('200 OK', [
+            ('Content-Type', 'image/png'),
+            ('Content-Length', str(len(png)))] + headers)
+        return [png]
+
+    def serve_json(self, environ, start_response, query, data, generation,
+                   mtime, start, stop):
+        if query.since is not None:
+            ## Only what the client does not have yet
+            start = max(start, int(np.searchsorted(
+                data.timestamps, np.datetime64(query.since, 's'), 'right')))
+            stop = max(start, stop)
+
+        def series():
+            ## Long windows from the rollups, but not the samples after
+            ## ``since``: buckets may start before it, and the client
+            ## appends them to what it has
+            rollup = None
+            if generation is not None and query.since is None:
+                resolution = pick_resolution(
+                    data, start, stop, query.points // 2)
+                if resolution is not None:
+                    rollup = self.rollups.get(data, generation)[resolution]
+            return json.dumps(
+                json_series(data, start, stop, query.points, rollup),
+                separators=(',', ':')).encode('utf-8')
+
+        if generation is None:
+            body = series()
+            start_response('200 OK', [
+                ('Content-Type', 'application/json'),
+                ('Content-Length', str(len(body))),
+                ('Cache-Control', 'no-store')])
+            return [body]
+        ## As for the chart: same rows of the same generation, same data
+        etag = '"%s"' % cache_key(os.path.abspath(self.data_file), generation,
+                                  'json', start, stop, query.points)
+        cache_headers = [
+            ('ETag', etag),
+            ('Last-Modified', email.utils.formatdate(mtime, usegmt=True)),
+            ('Cache-Control', 'no-cache'),
+        ]
+        if _not_modified(environ, etag, mtime):
+            start_response('304 Not Modified', cache_headers)
+            return []
+
+        body = series()
+        start_response('200 OK', [
+            ('Content-Type', 'application/json'),
+            ('Content-Length', str(len(body)))] + cache_headers)
+        return [body]
+
+    def serve_page(self, start_response, query):
+        ## Sent without a Content-Length: the page is streamed, and
+        ## the server ends it by closing the connection, or chunked.
+        start_response('200 OK', [
+            ('Content-Type', 'text/html; charset=utf-8')])
+        return (chunk.encode('utf-8') for chunk in self.iter_page(query))
+
+    def iter_page(self, query):
+        """Generate the html page for ``query``, in pieces. The head
+        comes first, before the log is even loaded.
+        """
+        window_form_html = WINDOW_FORM_TEMPLATE % {
+            'from': format_date(query.start) if query.start else '',
+            'to': format_date(query.end) if query.end else '',
+            'per_page': query.per_page,
+        }
+
+        ## The chart is drawn by the browser, from the JSON data; the
+        ## PNG chart, from its own URL, is cached by the browser too
+        plot_html = CHART_TEMPLATE % dict(
+            json_url=_quote_attr(query.url(data='json')),
+            live='false' if query.end else 'true',
+            png_url=_quote_attr(query.url(chart='png')))
+
+        yield PAGE_HEAD_TEMPLATE % dict(
+            data_plot_html=plot_html,
+            data_window_form_html=window_form_html,
+        )
+
+        data, generation, mtime = self.load_data(query)
+        start, stop = data.window(query.start, query.end)
+
+        ## Locate the requested page: it is just an offset inside the
+        ## window. Only the rows on the page get rendered.
+        count = stop - start
+        pages = max(1, -(-count // query.per_page))
+        page = min(query.page, pages)
+        page_start = start + (page - 1) * query.per_page
+        page_end = min(stop, page_start + query.per_page)
+
+        def page_link(number, label):
+            if number == page or not (1 <= number <= pages):
+                return "<span>%s</span>" % label
+            return "<a href='%s'>%s</a>" % (_quote_attr(query.url(
+                page=number, per_page=query.per_page)), label)
+
+        pager_html = "<div class='pager'>%s</div>" % " ".join([
+            page_link(1, "&laquo; first"),
+            page_link(page - 1, "&lsaquo; prev"),
+            "Page %d of %d (rows %d-%d of %d)" % (
+                page, pages,
+                page_start - start + 1 if count else 0,
+                page_end - start, count),
+            page_link(page + 1, "next &rsaquo;"),
+            page_link(pages, "last &raquo;"),
+        ])
+
+        ## Digital sensors, from their state changes over the rows of
+        ## the page
+        if data.digital_count and page_end > page_start:
+            times = data.timestamps[[page_start, page_end - 1]] \
+                .astype('datetime64[s]').astype(np.int64).tolist()
+            for chunk in iter_digital_html(
+                    self.load_transitions(data, generation), *times):
+                yield chunk
+
+        yield "    %s\n    " % pager_html
+        for chunk in iter_table_html(data, page_start, page_end):
+            yield chunk
+        yield "\n    %s" % pager_html
+        yield PAGE_FOOTER
@@ -0,0 +1,133 @@
+"""
+Rolling statistics of sensor values, over a time window.
+
+:py:class:`RollingStats` keeps the minimum, maximum, mean, standard
+deviation and rate of change of the samples of the last ``window``
+seconds, updated as samples come and go: each sample costs O(1)
+(amortized), however long the window, so that dozens of sensors can
+be followed on every frame without scanning their history.
+"""
+
+from collections import deque
+
+## Default window of the statistics shown by the monitor, in seconds
+DEFAULT_WINDOW = 60
+
+
+class RollingStats(object):
+    """Statistics of the samples of the last ``window`` seconds.
+
+    The minimum and maximum come from monotonic deques: candidates
+    for the minimum are kept in increasing order (a sample hides all
+    earlier larger ones, which can never be the minimum again), so
+    the minimum is always the first one. The mean and standard
+    deviation come from running sums of the samples, relative to the
+    first one for precision, resynchronized from time to time.
+    """
+
+    window = DEFAULT_WINDOW  # seconds
+
+    def __init__(self, window=None):
+        if window is not None:
+            self.window = window
+        self._samples = deque()  # (time, value)
+        self._min = deque()  # (time, value), increasing values
+        self._max = deque()  # (time, value), decreasing values
+        self._ref = None
+        self._sum = 0.0
+        self._sum_sq = 0.0
+        self._removed = 0
+
+    def __len__(self):
+        return len(self._samples)
+
+    def add(self, time, value):
+        """Add a sample; samples older than the window are dropped."""
+        self._append(time, value)
+        self._expire(time)
+
+    def extend(self, times, values):
+        """Add a batch of samples, in time order."""
+        for time, value in zip(times, values):
+            self._append(time, value)
+        if len(times):
+            self._expire(times[-1])
+
+    def _append(self, time, value):
+        value = float(value)
+        self._samples.append((time, value))
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        self._min.append((time, value))
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append((time, value))
+        if self._ref is None:
+            self._ref = value
+        delta = value - self._ref
+        self._sum += delta
+        self._sum_sq += delta * delta
+
+    def _expire(self, now):
+        cutoff = now - self.window
+        samples = self._samples
+        while samples and samples[0][0] <= cutoff:
+            delta = samples.popleft()[1] - self._ref
+            self._sum -= delta
+            self._sum_sq -= delta * delta
+            self._removed += 1
+        while self._min and self._min[0][0] <= cutoff:
+            self._min.popleft()
+        while self._max and self._max[0][0] <= cutoff:
+            self._max.popleft()
+
+        ## Subtracting leaves rounding errors behind: once as many
+        ## samples left as there are now, the sums are computed again
+        ## (amortized O(1) per sample).
+        if self._removed >= max(len(samples), 64):
+            self._resync()
+
+    def _resync(self):
+        self._removed = 0
+        self._ref = self._samples[0][1] if self._samples else None
+        self._sum = self._sum_sq = 0.0
+        for time, value in self._samples:
+            delta = value - self._ref
+            self._sum += delta
+            self._sum_sq += delta * delta
+
+    @property
+    def min(self):
+        return self._min[0][1] if self._min else None
+
+    @property
+    def max(self):
+        return self._max[0][1] if self._max else None
+
+    @property
+    def mean(self):
+        if not self._samples:
+            return None
+        return self._ref + self._sum / len(self._samples)
+
+    @property
+    def stddev(self):
+        """Population standard deviation."""
+        count = len(self._samples)
+        if not count:
+            return None
+        mean = self._sum / count
+        return max(0.0, self._sum_sq / count - mean * mean) ** 0.5
+
+    @property
+    def rate(self):
+        """Rate of change over the window, in units per second,
+        between its first and last samples.
+        """
+        if len(self._samples) < 2:
+            return 0.0
+        (first_time, first), (last_time, last) = \
+            self._samples[0], self._samples[-1]
+        if last_time <= first_time:
+            return 0.0
+        return (last - first) / (last_time - first_time)
@@ -0,0 +1,243 @@
+"""
+Time-bucketed aggregates (rollups) of logged sensor data.
+
+Long time ranges can't be shown sample by sample anyway: a
+:py:class:`Rollup` keeps, for each bucket of ``resolution`` seconds,
+
+ * the number of samples,
+ * the minimum, maximum and sum (hence mean) of each analog sensor,
+ * how many samples each digital sensor was high (hence its duty
+   cycle), and how many times it changed state,
+
+so that a month of data is a few thousand rows instead of millions
+of samples. :py:class:`RollupCache` keeps the rollups of a log file
+at all :py:data:`RESOLUTIONS` on disk, next to the parsed log, and
+updates them as the log grows (see
+:py:class:`datalogger.cache.IncrementalCache`).
+"""
+
+import numpy as np
+
+from datalogger.cache import IncrementalCache
+
+## Available resolutions, as (seconds, name), finest first
+RESOLUTIONS = (
+    (60, '1min'),
+    (3600, '1h'),
+    (86400, '1d'),
+)
+
+_ARRAYS = ('starts', 'count', 'analog_min', 'analog_max', 'analog_sum',
+           'digital_on', 'digital_transitions')
+
+
+class Rollup(object):
+    """Aggregates of a dataset over buckets of ``resolution``
+    seconds, aligned on the epoch. Only buckets holding samples are
+    kept; ``starts`` are their start times. Per-sensor arrays have
+    one row per sensor and one column per bucket.
+
+    A state change of a digital sensor is counted in the bucket of
+    the first sample with the new state.
+    """
+
+    def __init__(self, resolution, starts, count, analog_min, analog_max,
+                 analog_sum, digital_on, digital_transitions):
+        self.resolution = resolution
+        self.starts = starts
+        self.count = count
+        self.analog_min = analog_min
+        self.analog_max = analog_max
+        self.analog_sum = analog_sum
+        self.digital_on = digital_on
+        self.digital_transitions = digital_transitions
+
+    @classmethod
+    def compute(cls, data, resolution, start=0, stop=None):
+        """Compute the rollup of samples ``start`` to ``stop`` of
+        :py:class:`~datalogger.dataset.SensorData` ``data``.
+        """
+        start, stop, _ = slice(start, stop).indices(len(data))
+        stop = max(start, stop)
+        buckets = data.timestamps[start:stop].astype(np.int64) // resolution
+
+        ## Timestamps are sorted: buckets are runs of equal values
+        edges = np.flatnonzero(np.diff(buckets)) + 1
+        edges = np.concatenate(([0], edges)) if len(buckets) else edges
+        count = np.diff(np.append(edges, len(buckets)))
+
+        analog = data.analog[:, start:stop]
+        digital = np.array(
+            [data.digital(i, max(0, start - 1), stop)
+             for i in range(data.digital_count)],
+            dtype=bool).reshape(data.digital_count, stop - max(0, start - 1))
+        ## Changes are counted against the previous sample, if any
+        changes = (digital[:, 1:] != digital[:, :-1]).astype(np.int64)
+        if start == 0:
+            changes = np.concatenate(
+                (np.zeros((data.digital_count, 1), dtype=np.int64),
+                 changes), axis=1)[:, :stop - start]
+        else:
+            digital = digital[:, 1:]
+
+        def reduce(ufunc, values):
+            if not len(edges):
+                return np.zeros((values.shape[0], 0), dtype=values.dtype)
+            return ufunc.reduceat(values, edges, axis=1)
+
+        return cls(
+            resolution,
+            (buckets[edges] * resolution).astype('datetime64[s]'),
+            count,
+            reduce(np.minimum, analog),
+            reduce(np.maximum, analog),
+            reduce(np.add, analog.astype(np.float64)),
+            reduce(np.add, digital.astype(np.int64)),
+            reduce(np.add, changes))
+
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def rows(self):
+        """Number of samples aggregated."""
+        return int(self.count.sum())
+
+    @property
+    def analog_mean(self):
+        return self.analog_sum / np.maximum(self.count, 1)
+
+    @property
+    def digital_duty(self):
+        """Fraction of the samples each digital sensor was high."""
+        return self.digital_on / np.maximum(self.count, 1).astype(float)
+
+    def slice(self, start=0, stop=None):
+        """Return the rollup of buckets ``start`` to ``stop``."""
+        return Rollup(self.resolution, *[
+            values[..., start:stop] for values in self._arrays()])
+
+    def concatenate(self, other):
+        """Return a rollup with the buckets of ``other``, which must
+        all come after those of this one, appended.
+        """
+        return Rollup(self.resolution, *[
+            np.concatenate((mine, theirs), axis=-1)
+            for mine, theirs in zip(self._arrays(), other._arrays())])
+
+    def window(self, start, end):
+        """Return the ``(first, last)`` indexes of the buckets
+        starting in ``start <= time < end``.
+        """
+        return tuple(int(i) for i in np.searchsorted(
+            self.starts, np.array([start, end], dtype='datetime64[s]')))
+
+    def _arrays(self):
+        return [getattr(self, name) for name in _ARRAYS]
+
+    @classmethod
+    def from_arrays(cls, resolution, stored, prefix=''):
+        """Return the rollup stored by :py:meth:`to_arrays`."""
+        return cls(resolution, *[stored[prefix + name] for name in _ARRAYS])
+
+    def to_arrays(self, prefix=''):
+        """Return the arrays of the rollup, as a dict, with their
+        names prefixed with ``prefix``.
+        """
+        return dict((prefix + name, values)
+                    for name, values in zip(_ARRAYS, self._arrays()))
+
+
+def rollup_window(data, rollup, start, stop):
+    """Return the rollup of samples ``start`` to ``stop`` of
+    ``data``, using the precomputed ``rollup`` of the whole of
+    ``data`` for the buckets entirely inside the window: only the
+    partial buckets at both ends are computed from the samples.
+    """
+    resolution = rollup.resolution
+    if stop <= start:
+        return Rollup.compute(data, resolution, start, start)
+
+    def bucket(row):
+        return int(data.timestamps[row].astype(np.int64)) // resolution
+
+    ## Full buckets, from the one of the first sample (or the next
+    ## one, if the previous sample is in it too), to the one of the
+    ## last sample (or the previous one, if the next sample is in it)
+    first = bucket(start)
+    if start > 0 and bucket(start - 1) == first:
+        first += 1
+    last = bucket(stop - 1)
+    if stop < len(data) and bucket(stop) == last:
+        last -= 1
+    if last < first:
+        return Rollup.compute(data, resolution, start, stop)
+
+    first_time = np.datetime64(first * resolution, 's')
+    end_time = np.datetime64((last + 1) * resolution, 's')
+    lo, hi = rollup.window(first_time, end_time)
+    return Rollup.compute(data, resolution, start,
+                          data.window(first_time)[0]) \
+        .concatenate(rollup.slice(lo, hi)) \
+        .concatenate(Rollup.compute(data, resolution,
+                                    data.window(end_time)[0], stop))
+
+
+class RollupCache(IncrementalCache):
+    """Rollups of the log file at ``path``, at all
+    :py:data:`RESOLUTIONS`, kept in memory and in ``cache_dir``, as
+    a dict of ``{resolution: Rollup}``.
+
+    As the log grows, only its last bucket and the appended samples
+    are aggregated again.
+    """
+
+    suffix = '.rollup'
+
+    def compute(self, data):
+        return dict((seconds, Rollup.compute(data, seconds))
+                    for seconds, name in RESOLUTIONS)
+
+    def update(self, rollups, data):
+        return dict((seconds, self._update(rollup, data))
+                    for seconds, rollup in rollups.items())
+
+    def rows(self, rollups):
+        ## All stored together, in the same file: of the same samples
+        return rollups[RESOLUTIONS[0][0]].rows
+
+    def to_arrays(self, rollups):
+        arrays = {}
+        for seconds, name in RESOLUTIONS:
+            arrays.update(rollups[seconds].to_arrays(name + '_'))
+        return arrays
+
+    def from_arrays(self, stored):
+        return dict((seconds, Rollup.from_arrays(seconds, stored, name + '_'))
+                    for seconds, name in RESOLUTIONS)
+
+    @staticmethod
+    def _update(rollup, data):
+        ## The last bucket may have got more samples: aggregate it
+        ## again along with the new ones.
+        if not len(rollup):
+            return Rollup.compute(data, rollup.resolution)
+        start = data.window(rollup.starts[-1])[0]
+        return rollup.slice(0, -1).concatenate(
+            Rollup.compute(data, rollup.resolution, start))
+
+
+def pick_resolution(data, start, stop, min_buckets):
+    """Return the coarsest of :py:data:`RESOLUTIONS` still giving at
+    least ``min_buckets`` buckets over samples ``start`` to ``stop``
+    of ``data`` (and fewer buckets than samples), in seconds; None
+    if the samples themselves should be used.
+    """
+    if stop - start < 2:
+        return None
+    span = int((data.timestamps[stop - 1] - data.timestamps[start])
+               .astype(np.int64))
+    for seconds, name in reversed(RESOLUTIONS):
+        if min_buckets <= span // seconds < stop - start:
+            return seconds
+    return None
@@ -0,0 +1,159 @@
+"""
+Sensor registry for the realtime monitor, loaded from an INI file.
+
+Each ``[sensor <id>]`` section defines a sensor, shown in the order
+of the file::
+
+    [monitor]
+    # Optional: read sensors from the data logger on a serial port
+    serial = /dev/ttyUSB0
+    baudrate = 9600
+    # ... or follow the log file it writes
+    # tail = /var/log/datalogger/data.csv
+    # ... or get it from a collector (see log-collector.py)
+    # collector = unix:/run/datalogger/monitor.sock
+    # logger = boiler
+    # Grid columns (default: as many as fit)
+    columns = 2
+    # Optional: log alerts to this file
+    alert_log = alerts.csv
+
+    [sensor boiler]
+    label = Boiler
+    color = #ff0000
+    # Logger column, read from the serial port (or the log file)
+    channel = A0
+    # Windows of the rolling statistics, in seconds (the first one
+    # is shown; default: 60)
+    stats = 60 600
+    # Alert rules, comma-separated (see datalogger/alerts.py)
+    warning = value > 80, rate 10 > 2
+    critical = mean 600 > 90
+    hysteresis = 2
+
+    [sensor test]
+    # Fake values: slr, const [v1 v2 ...], sin <steps>, randint
+    fake = sin 20
+
+Colors are optional, and cycle through :py:data:`DEFAULT_COLORS`.
+"""
+
+try:
+    from ConfigParser import RawConfigParser
+except ImportError:  # Python 3
+    from configparser import RawConfigParser
+
+from datalogger.alerts import AlertRule, LEVELS
+from datalogger.fakedata import slrgen, loop_const_gen, loop_sin, \
+    loop_randint
+from datalogger.sensors import AnalogSensorBase, SerialSensor
+
+SENSOR_SECTION_PREFIX = 'sensor '
+MONITOR_SECTION = 'monitor'
+
+DEFAULT_COLORS = [
+    [0xff, 0x00, 0x00], [0xff, 0xff, 0x00], [0x00, 0xff, 0x00],
+    [0x88, 0x88, 0xff], [0xff, 0x00, 0xff], [0x00, 0xff, 0xff],
+]
+
+
+def parse_color(text):
+    """Parse a ``#RRGGBB`` color into a ``[r, g, b]`` list."""
+    text = text.strip().lstrip('#')
+    if len(text) != 6:
+        raise ValueError("Invalid color: %r" % text)
+    return [int(text[i:i + 2], 16) for i in (0, 2, 4)]
+
+
+def fake_generator(spec):
+    """Create a fake value generator from its description, e.g.
+    ``sin 20`` (see the module documentation).
+    """
+    words = spec.split()
+    name, args = (words[0] if words else ''), words[1:]
+    if name == 'slr':
+        return slrgen(start=None, maxdelta=5, minval=0, maxval=100)
+    if name == 'const':
+        return loop_const_gen([float(x) for x in args] or None)
+    if name == 'sin':
+        return loop_sin(int(args[0]) if args else 20)
+    if name == 'randint':
+        return loop_randint(0, 100)
+    raise ValueError("Unknown fake sensor: %r" % spec)
+
+
+def read_config(path):
+    """Read a monitor configuration file, returning a
+    :py:class:`RawConfigParser`.
+    """
+    config = RawConfigParser()
+    with open(path) as fileobj:
+        if hasattr(config, 'read_file'):
+            config.read_file(fileobj)
+        else:  # Python 2
+            config.readfp(fileobj)
+    return config
+
+
+def monitor_options(config):
+    """Return the ``[monitor]`` options, as a dict of strings."""
+    if not config.has_section(MONITOR_SECTION):
+        return {}
+    return dict(config.items(MONITOR_SECTION))
+
+
+def load_sensors(config, reader=None):
+    """Create the sensors defined in ``config``, as a list of
+    ``(sensor_id, sensor)`` in display order. Sensors with a
+    ``channel`` are read from ``reader``, a
+    :py:class:`~datalogger.sensors.SerialReader` or
+    :py:class:`~datalogger.sensors.LogTailReader`.
+    """
+    sensors = []
+    for section in config.sections():
+        if not section.startswith(SENSOR_SECTION_PREFIX):
+            continue
+        sensor_id = section[len(SENSOR_SECTION_PREFIX):].strip()
+        options = dict(config.items(section))
+        kwargs = dict(
+            label=options.get('label', sensor_id),
+            color=(parse_color(options['color']) if 'color' in options
+                   else DEFAULT_COLORS[len(sensors) % len(DEFAULT_COLORS)]))
+        if 'history' in options:
+            kwargs['history_size'] = int(options['history'])
+        if 'stats' in options:
+            kwargs['stats_windows'] = [
+                float(window) for window in options['stats'].split()]
+
+        if 'channel' in options:
+            if reader is None:
+                raise ValueError(
+                    "Sensor %r reads channel %s, but no serial port or "
+                    "log file is configured" % (sensor_id, options['channel']))
+            sensor = SerialSensor(reader, options['channel'], **kwargs)
+        else:
+            sensor = AnalogSensorBase(
+                value_generator=fake_generator(options.get('fake', 'slr')),
+                **kwargs)
+        sensors.append((sensor_id, sensor))
+    return sensors
+
+
+def load_alert_rules(config):
+    """Return the alert rules defined in ``config``, as a dict of
+    ``{sensor_id: [AlertRule, ...]}``.
+    """
+    rules = {}
+    for section in config.sections():
+        if not section.startswith(SENSOR_SECTION_PREFIX):
+            continue
+        sensor_id = section[len(SENSOR_SECTION_PREFIX):].strip()
+        options = dict(config.items(section))
+        hysteresis = float(options['hysteresis']) \
+            if 'hysteresis' in options else None
+        for level in LEVELS:
+            for text in options.get(level, '').split(','):
+                if text.strip():
+                    rules.setdefault(sensor_id, []).append(
+                        AlertRule.parse(level, text, hysteresis))
+    return rules
@@ -0,0 +1,398 @@
+"""
+Sensor sources for the realtime monitor.
+
+ * :py:class:`AnalogSensorBase`: sensor reading values synchronously,
+   from a generator (see :py:mod:`datalogger.fakedata`)
+ * :py:class:`SerialReader` / :py:class:`SerialSensor`: sensors fed
+   by the data logger's line protocol on a serial port, read by a
+   background thread
+ * :py:class:`LogTailReader`: the same, following a log file as the
+   logger appends to it
+
+Sensor values are percentages (``0`` .. ``100``). Each sensor keeps
+:py:class:`~datalogger.rollingstats.RollingStats` over one or more
+time windows, updated as values are read.
+"""
+
+import errno
+import os
+from collections import OrderedDict, deque
+import select
+import socket
+import threading
+import time
+
+import numpy as np
+
+from datalogger.csvlog import LogFile, parse_header, record_parser, \
+    is_header_row, COLUMN_ANALOG, COLUMN_DIGITAL, COLUMN_DATE
+from datalogger.fakedata import ANALOG_MAX
+from datalogger.history import RingBuffer, monotonic
+from datalogger.rollingstats import RollingStats, DEFAULT_WINDOW
+
+
+class AnalogSensorBase(object):
+    """Base class for analog sensor objects.
+
+    ``stats_windows`` are the windows (in seconds) of the rolling
+    statistics kept in :py:attr:`stats`; the first one is the one
+    shown by the monitor.
+    """
+
+    label = ""
+    color = None
+    values_history = None
+    value_generator = None
+    stats = None
+
+    def __init__(self, label=None, color=None, history_size=500,
+                 value_generator=None, stats_windows=(DEFAULT_WINDOW,)):
+        self.label = label or ""
+        self.color = color
+        self.values_history = RingBuffer(history_size)
+        self.value_generator = value_generator
+        self.stats = OrderedDict()
+        for window in stats_windows:
+            self.add_stats(window)
+
+    def add_stats(self, window):
+        """Return the rolling statistics over ``window`` seconds,
+        keeping them from now on if not already kept.
+        """
+        if window not in self.stats:
+            self.stats[window] = RollingStats(window)
+        return self.stats[window]
+
+    def read_current_value(self):
+        """To be overwritten by subclasses: read and return
+        the current sensor value.
+        """
+        return next(self.value_generator)
+
+    def read(self):
+        """Read value from the sensor"""
+        value = self.read_current_value()
+        now = monotonic()
+        self.values_history.append(now, value)
+        for stats in self.stats.values():
+            stats.add(now, value)
+        return value
+
+    def next(self):
+        """Used to support iteration"""
+        return self.read()
+
+    __next__ = next
+
+    def get_history(self, size=0):
+        """Get the last ``size`` history items (all of them if
+        ``size`` is 0), as a ``(times, values)`` tuple of read-only
+        arrays. Times are in seconds, from a monotonic clock.
+        """
+        return self.values_history.get(size)
+
+
+def open_device(path, baudrate=9600):
+    """Open a serial port (configured to ``baudrate``, raw mode), or
+    anything else that can be read, such as a pty or a FIFO, for
+    non-blocking reads. Returns the file descriptor.
+    """
+    fd = os.open(path, os.O_RDONLY | os.O_NOCTTY | os.O_NONBLOCK)
+    if os.isatty(fd):
+        import termios
+        import tty
+        tty.setraw(fd)
+        attrs = termios.tcgetattr(fd)
+        attrs[4] = attrs[5] = getattr(termios, 'B%d' % baudrate)
+        attrs[2] |= termios.CLOCAL | termios.CREAD
+        termios.tcsetattr(fd, termios.TCSANOW, attrs)
+    return fd
+
+
+def parse_address(text):
+    """Parse a socket address, ``tcp:HOST:PORT`` or ``unix:PATH``,
+    into a ``(family, address)`` tuple for :py:mod:`socket`; None if
+    ``text`` is not one (e.g. a device path).
+    """
+    if text.startswith('unix:'):
+        return socket.AF_UNIX, text[len('unix:'):]
+    if text.startswith('tcp:'):
+        host, _, port = text[len('tcp:'):].rpartition(':')
+        return socket.AF_INET, (host or 'localhost', int(port))
+    return None
+
+
+def _percent(ctype, value):
+    if ctype == COLUMN_DIGITAL:
+        return 100.0 if value else 0.0
+    return value * 100.0 / ANALOG_MAX
+
+
+class _BatchReader(threading.Thread):
+    """Background thread collecting samples per column, handed off
+    in batches through :py:meth:`drain`.
+
+    Only the samples of the columns passed to :py:meth:`subscribe`
+    are kept, at most ``max_pending`` of them between two drains.
+    """
+
+    def __init__(self, name):
+        threading.Thread.__init__(self, name=name)
+        self.daemon = True
+        self._lock = threading.Lock()
+        self._pending = {}  # column name: deque of (time, value)
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def subscribe(self, name, max_pending=None):
+        """Keep the samples of column ``name`` for :py:meth:`drain`;
+        only the latest ``max_pending`` if it is not drained in time.
+        """
+        with self._lock:
+            if name not in self._pending:
+                self._pending[name] = deque(maxlen=max_pending)
+
+    def drain(self, name):
+        """Return the samples for column ``name`` received since the
+        last call, as a ``(times, values)`` tuple of arrays.
+        """
+        with self._lock:
+            samples = self._pending.get(name)
+            if samples:
+                self._pending[name] = deque(maxlen=samples.maxlen)
+        if not samples:
+            return np.zeros(0), np.zeros(0)
+        times, values = zip(*samples)
+        return np.array(times), np.array(values)
+
+    def _add_samples(self, samples):
+        ## ``samples`` is a list of (column name, time, value); those
+        ## of columns nobody subscribed to are dropped
+        with self._lock:
+            for name, when, value in samples:
+                pending = self._pending.get(name)
+                if pending is not None:
+                    pending.append((when, value))
+
+
+class SerialReader(_BatchReader):
+    """Background thread reading the data logger's line protocol.
+
+    The logger writes the same CSV lines it stores on the SD card
+    (see :py:mod:`datalogger.csvlog`), starting with the header.
+    If the reader may start mid-stream, pass the header ``columns``
+    (a list of names) explicitly.
+
+    ``path`` may be a serial port (configured to ``baudrate``, raw
+    mode), or anything else that can be opened and read, such as a
+    pty or a FIFO. It may also be the monitor socket of a collector
+    (see :py:mod:`datalogger.collector`), as ``unix:PATH`` or
+    ``tcp:HOST:PORT``, to read the lines of its ``logger``. If the
+    device goes away or reaches EOF it is reopened.
+
+    Samples are collected per column, timestamped on reception, and
+    handed off in batches through :py:meth:`drain`.
+    """
+
+    reopen_delay = 1.0  # seconds
+
+    def __init__(self, path, baudrate=9600, columns=None, logger=None):
+        _BatchReader.__init__(self, 'SerialReader(%s)' % path)
+        self.path = path
+        self.baudrate = baudrate
+        self.logger = logger
+        self.columns = parse_header(columns) if columns else None
+        self._parse = None
+
+    def _open(self):
+        address = parse_address(self.path)
+        if address is None:
+            return open_device(self.path, self.baudrate)
+        ## A collector: subscribe to the logger, and read the socket
+        ## as any other file descriptor.
+        family, address = address
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            sock.connect(address)
+            sock.sendall(('%s\n' % (self.logger or '')).encode('ascii'))
+            return os.dup(sock.fileno())
+        except socket.error as e:
+            raise OSError(e.errno, str(e))
+        finally:
+            sock.close()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                fd = self._open()
+            except OSError:
+                self._stop_event.wait(self.reopen_delay)
+                continue
+            try:
+                self._read_lines(fd)
+            finally:
+                os.close(fd)
+            self._stop_event.wait(self.reopen_delay)
+
+    def _read_lines(self, fd):
+        buf = b''
+        while not self._stop_event.is_set():
+            ## Wait with a timeout, so that stop() is noticed
+            if not select.select([fd], [], [], 0.2)[0]:
+                continue
+            try:
+                data = os.read(fd, 4096)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EINTR):
+                    continue
+                return
+            if not data:
+                return  # EOF
+            lines = (buf + data).split(b'\n')
+            buf = lines.pop()
+            self.feed_lines(lines)
+
+    def feed_lines(self, lines):
+        """Parse protocol lines, adding their samples to the
+        pending batches.
+        """
+        now = monotonic()
+        samples = []
+        for line in lines:
+            row = line.strip().decode('ascii', 'replace').split(',')
+            if row == ['']:
+                continue
+            if is_header_row(row):
+                ## A header: the first one, or a new one if the
+                ## logger restarted with a different setup.
+                self.columns = parse_header(row)
+                self._parse = None
+                continue
+            if self.columns is None or len(row) != len(self.columns):
+                continue
+            if self._parse is None:
+                self._parse = record_parser(self.columns)
+            try:
+                record = self._parse(row)
+            except ValueError:
+                continue
+            samples.extend(
+                (name, now, _percent(ctype, value))
+                for (name, ctype), value in zip(self.columns, record)
+                if ctype in (COLUMN_ANALOG, COLUMN_DIGITAL))
+        if samples:
+            self._add_samples(samples)
+
+
+class LogTailReader(_BatchReader):
+    """Background thread following the log file at ``path`` as the
+    logger appends to it, like ``tail -f``.
+
+    On start, only the last ``backlog`` records are read (the file
+    is scanned backwards from its end, see
+    :py:meth:`datalogger.csvlog.LogFile.seek_last`), to fill the
+    sensors history. Then the file size is polled every
+    ``poll_interval`` seconds, and only the appended bytes are read
+    and parsed. If the file is truncated or replaced (e.g. rotated),
+    the new one is followed from its start.
+
+    Samples are timestamped from the log dates, moved to the
+    monotonic clock; they are handed off in batches through
+    :py:meth:`drain`, as with :py:class:`SerialReader`.
+    """
+
+    poll_interval = 0.2  # seconds
+    backlog = 500  # records
+
+    def __init__(self, path, backlog=None, poll_interval=None):
+        _BatchReader.__init__(self, 'LogTailReader(%s)' % path)
+        self.path = path
+        if backlog is not None:
+            self.backlog = backlog
+        if poll_interval is not None:
+            self.poll_interval = poll_interval
+        self._log = None
+        self._stat = None
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.poll()
+            except (IOError, OSError):
+                ## Missing, or being replaced: try again later
+                self._log = None
+            self._stop_event.wait(self.poll_interval)
+
+    def poll(self):
+        """Read the records appended since the last call."""
+        stat = os.stat(self.path)
+        if self._log is not None and (
+                (stat.st_dev, stat.st_ino) != self._stat[:2] or
+                stat.st_size < self._log.offset):
+            self._log = None  # Replaced or truncated: start over
+        if self._log is None:
+            log = LogFile(self.path)
+            if log.read_header() is None:
+                return
+            if self._stat is None:
+                log.seek_last(self.backlog)
+            self._log = log
+        elif (stat.st_size, stat.st_mtime) == self._stat[2:]:
+            return
+        self._stat = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime)
+        self.feed_records(self._log.columns, list(self._log.read_new()))
+
+    def feed_records(self, columns, records):
+        """Add the samples of parsed log ``records`` to the pending
+        batches.
+        """
+        if not records:
+            return
+        ## Wall clock dates to the monotonic clock, taking the last
+        ## record as being read now.
+        now = monotonic()
+        dates = [i for i, (name, ctype) in enumerate(columns)
+                 if ctype == COLUMN_DATE]
+        if dates:
+            times = [time.mktime(record[dates[0]].timetuple())
+                     for record in records]
+            times = [now - (times[-1] - when) for when in times]
+        else:
+            times = [now] * len(records)
+        self._add_samples([
+            (name, when, _percent(ctype, value))
+            for when, record in zip(times, records)
+            for (name, ctype), value in zip(columns, record)
+            if ctype in (COLUMN_ANALOG, COLUMN_DIGITAL)])
+
+
+class SerialSensor(AnalogSensorBase):
+    """Sensor reading column ``channel`` (e.g. ``A0``) from a
+    :py:class:`SerialReader` (or a :py:class:`LogTailReader`).
+
+    Every :py:meth:`read` moves all the samples received since the
+    previous one into the history in one batch, and returns the
+    latest value: nothing received between two frames is lost.
+    """
+
+    reader = None
+    channel = None
+    value = 0.0
+
+    def __init__(self, reader, channel, **kwargs):
+        AnalogSensorBase.__init__(self, **kwargs)
+        self.reader = reader
+        self.channel = channel
+        ## More samples than the history holds would be lost anyway
+        reader.subscribe(channel, self.values_history.capacity)
+
+    def read(self):
+        times, values = self.reader.drain(self.channel)
+        if len(values):
+            self.values_history.extend(times, values)
+            for stats in self.stats.values():
+                stats.extend(times, values)
+            self.value = float(values[-1])
+        return self.value
@@ -0,0 +1,125 @@
+"""
+Long-running HTTP server for the report.
+
+Unlike the CGI script, the server keeps the parsed log, matplotlib
+and its fonts loaded between requests. Requests are handled in
+threads, and charts are rendered by a pool of worker processes, so
+concurrent requests don't queue behind a single render.
+"""
+
+import mimetypes
+import multiprocessing
+import os
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler
+
+try:
+    from SocketServer import ThreadingMixIn
+except ImportError:  # Python 3
+    from socketserver import ThreadingMixIn
+
+import numpy as np
+
+from datalogger.cache import DEFAULT_CACHE_DIR
+from datalogger.report import ReportApp, render_chart, DEFAULT_DATA_FILE
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+## Directories of static files linked from the report
+STATIC_DIRS = ('img', 'js')
+
+
+def warm_up():
+    """Import matplotlib and render a throwaway chart, so that
+    modules, fonts and caches are loaded before the first request.
+    """
+    render_chart("", [(
+        np.array(['2011-11-01', '2011-11-02'], dtype='datetime64[s]'),
+        np.array([0, 1023], dtype=np.uint16))])
+
+
+class PoolChartRenderer(object):
+    """Chart renderer for :py:class:`~datalogger.report.ReportApp`,
+    rendering in a pool of ``processes`` worker processes.
+
+    Only the downsampled series are sent to the workers, so the
+    cost of passing data around is bounded by the chart width.
+    """
+
+    def __init__(self, processes=None):
+        self.pool = multiprocessing.Pool(processes, initializer=warm_up)
+
+    def __call__(self, title, series):
+        return self.pool.apply(render_chart, (title, series))
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+
+class StaticFiles(object):
+    """WSGI middleware serving the static files linked from the
+    report (from :py:data:`STATIC_DIRS`); other requests are passed
+    on to ``app``.
+    """
+
+    def __init__(self, app, root=ROOT_DIR, dirs=STATIC_DIRS):
+        self.app = app
+        self.root = os.path.abspath(root)
+        self.dirs = dirs
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '').lstrip('/')
+        static_dir = path.split('/', 1)[0]
+        if static_dir not in self.dirs:
+            return self.app(environ, start_response)
+
+        filename = os.path.abspath(os.path.join(self.root, path))
+        if not filename.startswith(
+                os.path.join(self.root, static_dir) + os.sep) \
+                or not os.path.isfile(filename):
+            start_response('404 Not Found', [('Content-Type', 'text/plain')])
+            return [b'Not found']
+
+        with open(filename, 'rb') as fileobj:
+            data = fileobj.read()
+        start_response('200 OK', [
+            ('Content-Type', mimetypes.guess_type(filename)[0]
+             or 'application/octet-stream'),
+            ('Content-Length', str(len(data))),
+            ('Cache-Control', 'max-age=3600')])
+        return [data]
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+def make_app(data_file=DEFAULT_DATA_FILE, cache_dir=DEFAULT_CACHE_DIR,
+             processes=None):
+    """Create the report application, with its chart rendering
+    pool and static files. Returns ``(app, renderer)``; the renderer
+    has to be closed when done.
+    """
+    renderer = PoolChartRenderer(processes)
+    report = ReportApp(data_file=data_file, cache_dir=cache_dir,
+                       chart_renderer=renderer)
+    if os.path.exists(data_file):
+        ## Parse the log, and aggregate it, before the first request
+        report.rollups.get(*report.data_loader.load())
+    return StaticFiles(report), renderer
+
+
+def serve(host='localhost', port=8000, data_file=DEFAULT_DATA_FILE,
+          cache_dir=DEFAULT_CACHE_DIR, processes=None):
+    """Serve the report over HTTP, until interrupted."""
+    app, renderer = make_app(data_file, cache_dir, processes)
+    warm_up()
+    server = ThreadingWSGIServer((host, port), WSGIRequestHandler)
+    server.set_app(app)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        renderer.close()
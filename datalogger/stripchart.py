@@ -0,0 +1,92 @@
+"""
+Scrolling strip charts for the realtime monitor.
+"""
+
+import pygame
+
+BACKGROUND = (0x00, 0x00, 0x00)
+FOREGROUND = (0xff, 0xff, 0xff)
+
+
+class StripChart(object):
+    """Chart of the latest values of a sensor, drawn on its own
+    offscreen surface.
+
+    Every :py:meth:`push` scrolls the chart left by ``unit`` pixels,
+    by blitting the surface onto itself, and only draws the newest
+    segment. Values are percentages (``0`` .. ``100``); the newest
+    one is on the right edge.
+    """
+
+    unit = 10  # Horizontal pixels per value
+    hpadding = 2
+    vpadding = 5
+    line_width = 3
+
+    def __init__(self, size, unit=None):
+        if unit is not None:
+            self.unit = unit
+        self.resize(size)
+
+    def resize(self, size):
+        """Set the chart size, clearing it."""
+        self.surface = pygame.Surface(size)
+        if pygame.display.get_surface() is not None:
+            ## Same pixel format as the display, for faster blits
+            self.surface = self.surface.convert()
+        self.surface.fill(BACKGROUND)
+        self._last_y = None
+
+    @property
+    def capacity(self):
+        """Number of values visible at once."""
+        return (self.surface.get_width() - 2 * self.hpadding) \
+            // self.unit + 1
+
+    def _y(self, value):
+        height = self.surface.get_height() - 1 - 2 * self.vpadding
+        value = min(100.0, max(0.0, value))
+        return int(round(
+            self.surface.get_height() - 1 - self.vpadding
+            - height * value / 100.0))
+
+    def push(self, value):
+        """Scroll the chart and draw a new value."""
+        x = self.surface.get_width() - 1 - self.hpadding
+        y = self._y(value)
+        prev_x = x - self.unit
+        if self._last_y is not None:
+            self.surface.scroll(-self.unit, 0)
+        ## Clear the area uncovered by the scroll (and the old end of
+        ## the line): the join is covered by the new segment.
+        self.surface.fill(BACKGROUND, (
+            prev_x, 0, self.surface.get_width() - prev_x,
+            self.surface.get_height()))
+        if self._last_y is not None:
+            pygame.draw.line(self.surface, FOREGROUND,
+                             (prev_x, self._last_y), (x, y), self.line_width)
+            pygame.draw.circle(self.surface, FOREGROUND,
+                               (prev_x, self._last_y), self.line_width // 2)
+        pygame.draw.circle(self.surface, FOREGROUND, (x, y), 2)
+        self._last_y = y
+
+    def render(self, values):
+        """Redraw the whole chart from a sequence of values, oldest
+        first (e.g. the sensor history), one every ``unit`` pixels.
+        """
+        self.surface.fill(BACKGROUND)
+        self._last_y = None
+        values = values[-self.capacity:]
+        if not len(values):
+            return
+        right = self.surface.get_width() - 1 - self.hpadding
+        points = [(right - (len(values) - 1 - i) * self.unit, self._y(v))
+                  for i, v in enumerate(values)]
+        if len(points) > 1:
+            pygame.draw.lines(self.surface, FOREGROUND, False, points,
+                              self.line_width)
+            for point in points[:-1]:
+                pygame.draw.circle(self.surface, FOREGROUND, point,
+                                   self.line_width // 2)
+        pygame.draw.circle(self.surface, FOREGROUND, points[-1], 2)
+        self._last_y = points[-1][1]
@@ -0,0 +1,74 @@
+"""
+Cache of rendered text, for the realtime monitor.
+
+Rendering TrueType text is one of the most expensive things done
+on every refresh, while the monitor only ever shows a few labels and
+numbers: rendered surfaces are kept and reused.
+"""
+
+from collections import OrderedDict
+
+import pygame
+
+
+class TextCache(object):
+    """Text surfaces rendered with ``font`` (antialiased), keyed on
+    ``(text, color)``, with at most ``max_entries`` kept: the least
+    recently used ones are dropped first.
+
+    Use :py:meth:`render` for fixed strings (labels), and
+    :py:meth:`blit_glyphs` for frequently changing ones such as
+    numbers, which are assembled from the surfaces of each character.
+    """
+
+    def __init__(self, font, max_entries=256):
+        self.font = font
+        self.max_entries = max_entries
+        self._surfaces = OrderedDict()
+        self._glyph_sizes = {}
+
+    def __len__(self):
+        return len(self._surfaces)
+
+    def render(self, text, color):
+        """Return the surface of ``text``, as ``font.render()`` would
+        (the surface is shared: don't draw on it).
+        """
+        key = (text, tuple(color))
+        try:
+            surface = self._surfaces.pop(key)
+        except KeyError:
+            surface = self.font.render(text, True, color)
+            if len(self._surfaces) >= self.max_entries:
+                self._surfaces.popitem(last=False)
+        self._surfaces[key] = surface  # Most recently used go last
+        return surface
+
+    def size(self, text):
+        """Size of ``text`` drawn by :py:meth:`blit_glyphs`."""
+        width = height = 0
+        for char in text:
+            try:
+                glyph_width, glyph_height = self._glyph_sizes[char]
+            except KeyError:
+                glyph_width, glyph_height = self._glyph_sizes[char] = \
+                    self.font.size(char)
+            width += glyph_width
+            height = max(height, glyph_height)
+        return width, height
+
+    def blit_glyphs(self, dest, text, color, **position):
+        """Draw ``text`` on ``dest`` one character at a time, from
+        cached glyphs, and return the rect drawn to. The position is
+        given as :py:class:`pygame.Rect` attributes, e.g.
+        ``right=100, bottom=50``.
+        """
+        rect = pygame.Rect((0, 0), self.size(text))
+        for name, value in position.items():
+            setattr(rect, name, value)
+        left = rect.left
+        for char in text:
+            glyph = self.render(char, color)
+            dest.blit(glyph, (left, rect.top))
+            left += glyph.get_width()
+        return rect
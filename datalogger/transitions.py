@@ -0,0 +1,236 @@
+"""
+Transition encoding of digital sensors.
+
+Digital sensors (relays, door contacts...) keep the same state for
+long stretches: instead of one bit per sample, :py:class:`Transitions`
+keeps, for each sensor, just the times at which its state changed.
+The state at a given time, the duty cycle or the number of changes
+over a time range are then found by binary search among the changes,
+however many samples there are, and a time range is drawn as a few
+state spans instead of one cell per sample.
+
+:py:class:`TransitionCache` keeps the transitions of a log file in
+the cache directory, next to its rollups (see
+:py:mod:`datalogger.rollup`), and updates them as the log grows
+(see :py:class:`datalogger.cache.IncrementalCache`).
+"""
+
+import numpy as np
+
+from datalogger.cache import IncrementalCache
+from datalogger.csvlog import COLUMN_DIGITAL
+
+
+def _seconds(when):
+    ## Unix time of a datetime, datetime64 or unix time
+    return np.datetime64(when, 's').astype(np.int64)
+
+
+class Transitions(object):
+    """State changes of the digital sensors of a dataset.
+
+    ``bounds[sensor]`` holds the start times of the state spans of a
+    sensor (unix times, ``int64``): the time of the first sample,
+    then that of each sample whose state differs from the previous
+    one. States alternate from ``initial[sensor]``, so they are not
+    stored. The last span ends at ``end``, the time of the last
+    sample; ``rows`` is the number of samples encoded.
+
+    A state holds from one change to the next: durations, hence duty
+    cycles, are in time, not in samples as in
+    :py:class:`~datalogger.rollup.Rollup`.
+    """
+
+    def __init__(self, names, initial, bounds, end, rows):
+        self.names = list(names)
+        self.initial = initial
+        self.bounds = bounds
+        self.end = end
+        self.rows = rows
+        self._high = [None] * len(bounds)
+
+    @classmethod
+    def compute(cls, data, start=0, stop=None):
+        """Encode the digital sensors of samples ``start`` to ``stop``
+        of :py:class:`~datalogger.dataset.SensorData` ``data``.
+        """
+        start, stop, _ = slice(start, stop).indices(len(data))
+        stop = max(start, stop)
+        names = [name for name, ctype in data.columns
+                 if ctype == COLUMN_DIGITAL]
+        times = data.timestamps[start:stop].astype('datetime64[s]') \
+            .astype(np.int64)
+        initial = np.zeros(data.digital_count, dtype=bool)
+        bounds = []
+        for sensor in range(data.digital_count):
+            values = data.digital(sensor, start, stop)
+            if not len(values):
+                bounds.append(np.zeros(0, dtype=np.int64))
+                continue
+            initial[sensor] = values[0]
+            changes = np.flatnonzero(values[1:] != values[:-1]) + 1
+            bounds.append(times[np.concatenate(([0], changes))])
+        return cls(names, initial, bounds,
+                   int(times[-1]) if len(times) else None, stop - start)
+
+    def concatenate(self, other):
+        """Return the transitions with those of ``other``, encoding
+        the samples that follow, appended.
+        """
+        if not self.rows:
+            return other
+        if not other.rows:
+            return self
+        bounds = []
+        for sensor, (mine, theirs) in enumerate(zip(self.bounds,
+                                                    other.bounds)):
+            if other.initial[sensor] == self.last_state(sensor):
+                theirs = theirs[1:]  # Not a change
+            bounds.append(np.concatenate((mine, theirs)))
+        return Transitions(self.names, self.initial, bounds, other.end,
+                           self.rows + other.rows)
+
+    def _states(self, sensor, spans):
+        return (np.asarray(spans) % 2 == 1) ^ self.initial[sensor]
+
+    def last_state(self, sensor):
+        return bool(self._states(sensor, len(self.bounds[sensor]) - 1))
+
+    def _clip(self, sensor, start, end):
+        ## Time range, within the encoded one
+        bounds = self.bounds[sensor]
+        lo = bounds[0] if start is None else max(bounds[0], _seconds(start))
+        hi = self.end if end is None else min(self.end, _seconds(end))
+        return int(lo), int(hi)
+
+    ### --- Queries
+
+    def state_at(self, sensor, when):
+        """State of ``sensor`` at time ``when``, as a bool; the last
+        state holds after the last sample. None before the first one.
+        """
+        span = int(np.searchsorted(
+            self.bounds[sensor], _seconds(when), 'right')) - 1
+        if span < 0:
+            return None
+        return bool(self._states(sensor, span))
+
+    def count(self, sensor, start=None, end=None):
+        """Number of state changes of ``sensor`` in
+        ``start <= time < end``.
+        """
+        changes = self.bounds[sensor][1:]
+        lo = 0 if start is None else int(
+            np.searchsorted(changes, _seconds(start), 'left'))
+        hi = len(changes) if end is None else int(
+            np.searchsorted(changes, _seconds(end), 'left'))
+        return max(0, hi - lo)
+
+    def high_time(self, sensor, times):
+        """Seconds spent high by ``sensor``, from the first sample up
+        to each of ``times`` (an array of unix times).
+        """
+        bounds = self.bounds[sensor]
+        if self._high[sensor] is None:
+            ## Time spent high before each span
+            lengths = np.diff(np.append(bounds, self.end))
+            self._high[sensor] = np.concatenate(([0], np.cumsum(
+                lengths * self._states(sensor, np.arange(len(bounds))))))
+        times = np.clip(np.asarray(times, dtype=np.int64),
+                        bounds[0], self.end)
+        spans = np.searchsorted(bounds, times, 'right') - 1
+        return self._high[sensor][spans] + \
+            (times - bounds[spans]) * self._states(sensor, spans)
+
+    def duty_cycles(self, sensor, edges):
+        """Fraction of the time ``sensor`` was high, between each two
+        consecutive ``edges`` (an array of unix times).
+        """
+        edges = np.asarray(edges, dtype=np.int64)
+        lengths = np.diff(edges)
+        return np.diff(self.high_time(sensor, edges)) / \
+            np.maximum(lengths, 1).astype(float)
+
+    def duty_cycle(self, sensor, start=None, end=None):
+        """Fraction of the time ``sensor`` was high in
+        ``start <= time <= end``; None if there were no samples.
+        """
+        if not len(self.bounds[sensor]):
+            return None
+        lo, hi = self._clip(sensor, start, end)
+        if hi < lo:
+            return None
+        if hi == lo:
+            return float(self.state_at(sensor, lo))
+        return float(self.duty_cycles(sensor, [lo, hi])[0])
+
+    def spans(self, sensor, start=None, end=None):
+        """Return the state spans of ``sensor`` over
+        ``start <= time <= end``, as ``(starts, ends, states)``
+        arrays, clipped to the time range. A time range of a single
+        time gives a single empty span, with the state at that time.
+        """
+        bounds = self.bounds[sensor]
+        empty = np.zeros(0, dtype=np.int64)
+        if not len(bounds):
+            return empty, empty, np.zeros(0, dtype=bool)
+        lo, hi = self._clip(sensor, start, end)
+        if hi < lo:
+            return empty, empty, np.zeros(0, dtype=bool)
+        if hi == lo:
+            times = np.array([lo], dtype=np.int64)
+            return times, times, np.array([self.state_at(sensor, lo)])
+        first = max(0, int(np.searchsorted(bounds, lo, 'right')) - 1)
+        last = max(first, int(np.searchsorted(bounds, hi, 'left')))
+        starts = np.maximum(bounds[first:last], lo)
+        ends = np.append(bounds[first + 1:last], hi)[:len(starts)]
+        return starts, ends, self._states(sensor, np.arange(first, last))
+
+    ### --- Storage
+
+    @classmethod
+    def from_arrays(cls, stored):
+        """Return the transitions stored by :py:meth:`to_arrays`."""
+        counts, end = stored['counts'], stored['end']
+        bounds = np.split(stored['bounds'], np.cumsum(counts)[:-1]) \
+            if len(counts) else []
+        return cls(stored['names'].tolist(), stored['initial'], bounds,
+                   int(end[0]) if len(end) else None, int(stored['rows']))
+
+    def to_arrays(self):
+        """Return the transitions as a dict of arrays."""
+        return dict(
+            names=np.array(self.names, dtype='U'),
+            initial=self.initial,
+            counts=np.array([len(b) for b in self.bounds], dtype=np.int64),
+            bounds=np.concatenate(self.bounds) if self.bounds
+            else np.zeros(0, dtype=np.int64),
+            end=np.array([] if self.end is None else [self.end],
+                         dtype=np.int64),
+            rows=self.rows)
+
+
+class TransitionCache(IncrementalCache):
+    """Transitions of the log file at ``path``, kept in memory and
+    in ``cache_dir``.
+
+    As the log grows, only the appended samples are encoded.
+    """
+
+    suffix = '.transitions'
+
+    def compute(self, data):
+        return Transitions.compute(data)
+
+    def update(self, transitions, data):
+        return transitions.concatenate(
+            Transitions.compute(data, transitions.rows))
+
+    def rows(self, transitions):
+        return transitions.rows
+
+    def to_arrays(self, transitions):
+        return transitions.to_arrays()
+
+    def from_arrays(self, stored):
+        return Transitions.from_arrays(stored)
@@ -0,0 +1,316 @@
+/*
+ * Client side chart for the Arduino Data Logger report.
+ *
+ * Draws the analog series of the report time window with Raphael,
+ * from the JSON data served by the report (?data=json, see
+ * datalogger/report.py). Once loaded, the chart is panned (drag)
+ * and zoomed (mouse wheel, double click to reset) locally; only when
+ * the view settles is a finer series for it asked to the server.
+ * Without an end date, new samples are polled with ?since=; points
+ * older than the time span first loaded are then dropped, so that
+ * memory use stays bounded.
+ */
+
+(function ($) {
+    var COLORS = ['#0055ff', '#ff3300', '#00aa00', '#aa00ff', '#ff9900',
+                  '#00aaaa', '#888800', '#ff0099'];
+    var MARGIN = {top: 10, right: 10, bottom: 30, left: 50};
+    var SETTLE_DELAY = 300;  // ms without pan/zoom before refetching
+    var POLL_INTERVAL = 10000;  // ms between live updates
+    var ZOOM_STEP = 1.25;
+
+    function pad(n) {
+        return (n < 10 ? '0' : '') + n;
+    }
+
+    /* Log times are local to the logger: shown as they are */
+    function formatTime(t, withDate) {
+        var d = new Date(t * 1000);
+        var time = pad(d.getUTCHours()) + ':' + pad(d.getUTCMinutes()) +
+            ':' + pad(d.getUTCSeconds());
+        if (!withDate) {
+            return time;
+        }
+        return d.getUTCFullYear() + '-' + pad(d.getUTCMonth() + 1) + '-' +
+            pad(d.getUTCDate()) + ' ' + time;
+    }
+
+    /* Decode the delta-encoded times of a JSON series */
+    function decodeTimes(data) {
+        var times = [], t = data.t0, i;
+        if (t === null) {
+            return times;
+        }
+        times.push(t);
+        for (i = 0; i < data.dt.length; i++) {
+            t += data.dt[i];
+            times.push(t);
+        }
+        return times;
+    }
+
+    /* First index of sorted ``times`` not before ``t`` */
+    function bisect(times, t) {
+        var lo = 0, hi = times.length, mid;
+        while (lo < hi) {
+            mid = (lo + hi) >> 1;
+            if (times[mid] < t) {
+                lo = mid + 1;
+            } else {
+                hi = mid;
+            }
+        }
+        return lo;
+    }
+
+    function Chart(element) {
+        var self = this;
+        this.element = $(element);
+        this.url = this.element.attr('data-url');
+        this.live = this.element.attr('data-live') === 'true';
+        this.width = this.element.width();
+        this.height = this.element.height();
+        this.plot = {
+            x: MARGIN.left, y: MARGIN.top,
+            width: this.width - MARGIN.left - MARGIN.right,
+            height: this.height - MARGIN.top - MARGIN.bottom
+        };
+        this.paper = Raphael(element, this.width, this.height);
+        this.paper.rect(this.plot.x, this.plot.y, this.plot.width,
+                        this.plot.height).attr({stroke: '#888'});
+        this.axis = this.paper.set();
+        this.paths = [];
+        this.data = null;
+        this.times = [];
+        this.view = null;
+        this.span = null;
+        this.settleTimer = null;
+        this.request = 0;
+
+        this.load(this.url, function () {
+            var times = self.times;
+            if (times.length) {
+                self.span = times[times.length - 1] - times[0];
+            }
+            self.resetView();
+            self.bindEvents();
+            if (self.live) {
+                setInterval(function () { self.poll(); }, POLL_INTERVAL);
+            }
+        });
+    }
+
+    Chart.prototype.pointsUrl = function (url) {
+        return url + '&points=' + 2 * this.plot.width;
+    };
+
+    /* Replace the series with the ones at ``url`` */
+    Chart.prototype.load = function (url, done) {
+        var self = this, request = ++this.request;
+        $.getJSON(this.pointsUrl(url), function (data) {
+            if (request !== self.request) {
+                return;  // Superseded by a more recent view
+            }
+            self.data = data;
+            self.times = decodeTimes(data);
+            self.createPaths();
+            if (done) {
+                done();
+            } else {
+                self.draw();
+            }
+        });
+    };
+
+    /* Append the samples logged since the last ones */
+    Chart.prototype.poll = function () {
+        var self = this, data = this.data, times;
+        if (!data || data.last === null) {
+            return;
+        }
+        $.getJSON(this.pointsUrl(this.url + '&since=' + data.last),
+                  function (update) {
+            var following, i;
+            if (update.t0 === null || data !== self.data) {
+                return;
+            }
+            following = self.view.end >= self.times[self.times.length - 1];
+            times = decodeTimes(update);
+            self.times = self.times.concat(times);
+            for (i = 0; i < data.values.length; i++) {
+                data.values[i] = data.values[i].concat(update.values[i]);
+            }
+            data.last = update.last;
+            if (following) {
+                /* Keep the latest samples in view */
+                self.setView(self.view.start + times[times.length - 1] -
+                             self.view.end, times[times.length - 1]);
+            }
+            self.trim();
+            self.draw();
+        });
+    };
+
+    /* Drop the points older than the span first loaded, except those
+     * in view, and one before them for the line to it */
+    Chart.prototype.trim = function () {
+        var times = this.times, values = this.data.values, first, i;
+        if (this.span === null || !times.length) {
+            return;
+        }
+        first = bisect(times, Math.min(
+            this.view.start, times[times.length - 1] - this.span)) - 1;
+        if (first <= 0) {
+            return;
+        }
+        this.times = times.slice(first);
+        for (i = 0; i < values.length; i++) {
+            values[i] = values[i].slice(first);
+        }
+    };
+
+    Chart.prototype.createPaths = function () {
+        var i, columns = this.data.columns, legend = this.plot.x + 10;
+        for (i = 0; i < this.paths.length; i++) {
+            this.paths[i].remove();
+        }
+        this.paths = [];
+        for (i = 0; i < columns.length; i++) {
+            this.paths.push(this.paper.path('M0,0').attr({
+                stroke: COLORS[i % COLORS.length],
+                'stroke-width': 1,
+                'clip-rect': [this.plot.x, this.plot.y, this.plot.width,
+                              this.plot.height].join(',')
+            }));
+            if (!this.legendDone) {
+                this.paper.text(legend, this.plot.y + 10, columns[i]).attr({
+                    fill: COLORS[i % COLORS.length], 'text-anchor': 'start',
+                    'font-weight': 'bold'
+                });
+                legend += 40;
+            }
+        }
+        this.legendDone = true;
+    };
+
+    Chart.prototype.resetView = function () {
+        var times = this.times;
+        if (!times.length) {
+            return;
+        }
+        this.setView(times[0], Math.max(times[times.length - 1], times[0] + 1));
+        this.draw();
+    };
+
+    Chart.prototype.setView = function (start, end) {
+        this.view = {start: start, end: end};
+    };
+
+    Chart.prototype.xScale = function () {
+        return this.plot.width / (this.view.end - this.view.start);
+    };
+
+    /* Redraw the series in the current view, from the loaded points */
+    Chart.prototype.draw = function () {
+        var times = this.times, values = this.data.values, plot = this.plot;
+        var xScale = this.xScale(), yScale = plot.height / this.data.max;
+        var bottom = plot.y + plot.height, i, j, path;
+        /* One point out of view on each side, to draw the lines to it */
+        var lo = Math.max(0, bisect(times, this.view.start) - 1);
+        var hi = Math.min(times.length, bisect(times, this.view.end) + 1);
+        var xs = [];
+        for (j = lo; j < hi; j++) {
+            xs.push(Math.round(
+                (plot.x + (times[j] - this.view.start) * xScale) * 10) / 10);
+        }
+        for (i = 0; i < values.length; i++) {
+            path = [];
+            for (j = lo; j < hi; j++) {
+                path.push(xs[j - lo] + ',' +
+                          Math.round((bottom - values[i][j] * yScale) * 10) / 10);
+            }
+            this.paths[i].attr({path: path.length ?
+                                'M' + path.join('L') : 'M0,0'});
+        }
+        this.drawAxis();
+    };
+
+    Chart.prototype.drawAxis = function () {
+        var plot = this.plot, view = this.view, paper = this.paper;
+        var span = view.end - view.start, ticks = 6, i, t, x, y;
+        var withDate = span > 86400;
+        this.axis.remove();
+        this.axis = paper.set();
+        for (i = 0; i <= ticks; i++) {
+            t = view.start + span * i / ticks;
+            x = plot.x + plot.width * i / ticks;
+            this.axis.push(paper.text(x, plot.y + plot.height + 12,
+                                      formatTime(Math.round(t), withDate)));
+        }
+        for (i = 0; i <= 4; i++) {
+            y = plot.y + plot.height * (1 - i / 4);
+            this.axis.push(paper.text(plot.x - 5, y, (i * 25) + '%')
+                           .attr({'text-anchor': 'end'}));
+        }
+        this.axis.attr({fill: '#444'});
+    };
+
+    /* Once the view stopped moving, get its own series from the
+     * server, if the loaded one is too coarse for it */
+    Chart.prototype.viewChanged = function () {
+        var self = this;
+        this.draw();
+        clearTimeout(this.settleTimer);
+        this.settleTimer = setTimeout(function () {
+            var view = self.view, times = self.times, url;
+            if (!self.data.downsampled && view.start >= times[0] &&
+                    view.end <= times[times.length - 1]) {
+                return;  // Already every sample
+            }
+            url = '?data=json&from=' +
+                encodeURIComponent(formatTime(Math.floor(view.start), true)) +
+                '&to=' + encodeURIComponent(
+                    formatTime(Math.ceil(view.end) + 1, true));
+            self.load(url);
+        }, SETTLE_DELAY);
+    };
+
+    Chart.prototype.bindEvents = function () {
+        var self = this, drag = null;
+        this.element.bind('mousedown', function (e) {
+            drag = {x: e.pageX, start: self.view.start, end: self.view.end};
+            e.preventDefault();
+        });
+        $(document).bind('mousemove', function (e) {
+            var dt;
+            if (!drag) {
+                return;
+            }
+            dt = (drag.x - e.pageX) / self.xScale();
+            self.setView(drag.start + dt, drag.end + dt);
+            self.viewChanged();
+        }).bind('mouseup', function () {
+            drag = null;
+        });
+        this.element.bind('mousewheel DOMMouseScroll', function (e) {
+            var event = e.originalEvent;
+            var delta = event.wheelDelta ? event.wheelDelta : -event.detail;
+            var factor = delta > 0 ? 1 / ZOOM_STEP : ZOOM_STEP;
+            var x = e.pageX - self.element.offset().left - self.plot.x;
+            var t = self.view.start + x / self.xScale();
+            self.setView(t - (t - self.view.start) * factor,
+                         t + (self.view.end - t) * factor);
+            self.viewChanged();
+            e.preventDefault();
+        });
+        this.element.bind('dblclick', function () {
+            self.load(self.url, function () { self.resetView(); });
+        });
+    };
+
+    $(function () {
+        $('div.chart[data-url]').each(function () {
+            new Chart(this);
+        });
+    });
+}(jQuery));
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+'''
+Collector daemon for many Arduino Data Loggers.
+
+Receives the line protocol of any number of loggers, over TCP or
+UNIX sockets and serial ports, stores it in one binary log per
+logger (see datalogger/collector.py), and passes it on live to
+realtime monitors (``realtime-monitor.py --collector ADDRESS
+--logger NAME``).
+'''
+
+import argparse
+import signal
+
+from datalogger.collector import Collector
+
+parser = argparse.ArgumentParser(
+    description=__doc__.strip().splitlines()[0])
+parser.add_argument(
+    '--input', action='append', default=[], metavar='ADDRESS',
+    help="Accept loggers on this socket, tcp:HOST:PORT or unix:PATH "
+         "(may be repeated)")
+parser.add_argument(
+    '--serial', action='append', default=[], metavar='NAME=DEVICE',
+    help="Read logger NAME from this serial port, pty or FIFO "
+         "(may be repeated)")
+parser.add_argument(
+    '--baudrate', type=int, default=9600,
+    help="Serial ports speed (default: %(default)s)")
+parser.add_argument(
+    '--monitor', action='append', default=[], metavar='ADDRESS',
+    help="Accept monitors on this socket, tcp:HOST:PORT or unix:PATH "
+         "(may be repeated)")
+parser.add_argument(
+    '--storage', default='loggers', metavar='DIR',
+    help="Directory of the logs, one per logger (default: %(default)s)")
+parser.add_argument(
+    '--flush-interval', type=float, default=Collector.flush_interval,
+    help="Seconds between writes to the logs (default: %(default)s)")
+args = parser.parse_args()
+if not (args.input or args.serial):
+    parser.error("No loggers to collect: use --input and/or --serial")
+
+collector = Collector(args.storage, args.flush_interval)
+try:
+    for address in args.input:
+        collector.listen(address)
+    for address in args.monitor:
+        collector.listen(address, monitors=True)
+    for spec in args.serial:
+        name, _, device = spec.partition('=')
+        if not device:
+            parser.error("Invalid --serial %r: use NAME=DEVICE" % spec)
+        collector.add_device(name, device, args.baudrate)
+except ValueError as e:
+    parser.error(str(e))
+
+
+def terminate(signum, frame):
+    raise SystemExit(0)
+
+
+## Stop cleanly (flushing what is pending) on SIGTERM too
+signal.signal(signal.SIGTERM, terminate)
+try:
+    collector.run()
+except KeyboardInterrupt:
+    pass
+finally:
+    collector.close()
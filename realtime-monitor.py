@@ -3,419 +3,162 @@
 '''
 Realtime monitor for Arduino Data Logger.
 
-todo: avoid overflows: draw on a separate surface that gets
-      blit exactly in place
-todo: support resizing
+Shows the sensors in a window, or with ``--headless``, renders the
+same dashboard offscreen (no display needed) and writes the frames
+to PNG files, a Motion JPEG file, or a live MJPEG stream over HTTP.
+
+Sensors are read from the data logger on a serial port (``--serial``),
+from the log file it writes (``--tail``), or from a collector
+(``--collector``, see log-collector.py); without any, fake data is
+shown.
 '''
 
-import os
-import datetime
-from random import choice, randint
-import pygame
-
-
-class LimitedSizeList(list):
-    max_size = 10
-
-    def append(self, object):
-        list.append(self, object)
-        if self.max_size and (len(self) > self.max_size):
-            self.pop(0)
-
-
-class AnalogSensorBase:
-    """Base class for analog sensor objects.
-    """
-
-    label = ""
-    color = None
-    values_history = None
-    value_generator = None
-
-    def __init__(self, label=None, color=None, history_size=500,
-                 value_generator=None):
-        self.label = label or ""
-        self.color = color
-        self.values_history = LimitedSizeList()
-        self.values_history.max_size = history_size
-        self.value_generator = value_generator
-
-    def read_current_value(self):
-        """To be overwritten by subclasses: read and return
-        the current sensor value.
-        """
-        return self.value_generator.next()
-
-    def read(self):
-        """Read value from the sensor"""
-        value = self.read_current_value()
-        self.values_history.append((datetime.datetime.now(), value))
-        return value
-
-    def next(self):
-        """Used to support iteration"""
-        return self.read()
-
-    def get_history(self, size=0):
-        """Get the last ``size`` history items.
-        Each history item is a ``(datetime, value)`` tuple.
-        """
-        return self.values_history[-size:]  # Returns a copy of the history
-
-
-def slrgen(start=None, mindelta=0, maxdelta=5, minval=0, maxval=1000):
-    """Generator of slightly random numbers.
-    Distance between numbers is +- a random number between
-    `mindelta` and `maxdelta`.
-    """
-    s = int(start) if start is not None else randint(minval, maxval)
-    while True:
-        yield s
-        s += choice([1, -1]) * randint(mindelta, maxdelta)
-        if maxval is not None:
-            s = min(maxval, s)
-        if minval is not None:
-            s = max(minval, s)
-
-
-def analog_sensor_color(val):
-    import colorsys
-
-    _hue_cold = 300 / 360.0  # For low values
-    _hue_hot = 0 / 360.0  # For high values
-    _delta = _hue_hot - _hue_cold
-    _d2 = _delta * val
-    hue = _hue_cold + _d2
-
-    h, s, v = hue, 1.0, 1.0
-    rgb = colorsys.hsv_to_rgb(h, s, v)
-    h, l, s = colorsys.rgb_to_hls(*rgb)
-    # greyscale_rgb = colorsys.hls_to_rgb(h, l, 0)
-    # return '#%02X%02X%02X' % tuple(c*255 for c in rgb)
-    return tuple(c * 255 for c in colorsys.hls_to_rgb(h, l*1.5, 1))
-
-
-def loop_const_gen(vals=None):
-    if vals is None:
-        vals = [randint(0, 100) for i in range(15)]
-    while True:
-        for v in vals:
-            yield v
-
-
-def loop_sin(steps):
-    import math
-    while True:
-        for s in xrange(steps):
-            yield 50 + (math.sin(math.pi * 2 * (s*1.0/steps)) * 50)
-
-
-def loop_randint(min, max):
-    while True:
-        yield randint(min, max)
-
-
-pygame.init()
-pygame.display.set_caption("Arduino Sensor Monitor")
-size = width, height = 1024, 800
-screen = pygame.display.set_mode(size, pygame.RESIZABLE | pygame.DOUBLEBUF)
-clock = pygame.time.Clock()
-max_fps = 50
-show_fps_label = True
-FONTS_DIR = os.path.join(os.path.dirname(__file__), 'fonts')
-
-
-def font(name, size):
-    return pygame.font.Font(
-        os.path.join(FONTS_DIR, name), size)
-
-
-font_sensor_value_large = font('orbitron-bold.ttf', 40)
-font_sensor_label = font('orbitron-light.ttf', 14)
-font_small = font('orbitron-light.ttf', 12)
-
-
-ANALOG_SENSORS = {
-    's1': AnalogSensorBase(
-        label='Sensor ONE',
-        color=[0xff, 0x00, 0x00],
-        value_generator=slrgen(start=None, maxdelta=5, minval=0, maxval=100)),
-    's2': AnalogSensorBase(
-        label='Sensor TWO',
-        color=[0xff, 0xff, 0x00],
-        value_generator=loop_const_gen()),
-    's3': AnalogSensorBase(
-        label='Sensor THREE',
-        color=[0x00, 0xff, 0x00],
-        value_generator=loop_sin(20)),
-    's4': AnalogSensorBase(
-        label='Sensor FOUR',
-        color=[0x88, 0x88, 0xff],
-        value_generator=loop_const_gen(
-            [5, 10, 12, 20, 50, 80, 70, 30, 20, 15, 10, 9, 8, 4])),
-    's5': AnalogSensorBase(
-        label='Sensor FIVE',
-        color=[0xff, 0x00, 0xff],
-        value_generator=loop_randint(0, 100)),
-}
-
-#SENSORS = {
-#    's1': slrgen(start=None, maxdelta=3, minval=0, maxval=100),
-#    's2': slrgen(start=None, maxdelta=5, minval=0, maxval=100),
-#    's3': loop_sin(20),
-#    's4': loop_const_gen([5,10,12,20,50,80,70,30,20,15,10,9,8,4]),
-#    's5': slrgen(start=None, maxdelta=5, minval=0, maxval=100),
-#}
-#SENSOR_COLORS = {
-#    's1' : [0xff,0x00,0x00],
-#    's2' : [0xff,0xff,0x00],
-#    's3' : [0x00,0xff,0x00],
-#    's4' : [0x88,0x88,0xff],
-#    's5' : [0xff,0x00,0xff],
-#}
-PREV_VAL = {}
-
-_last_refresh = 0
-_refresh_time = 100  # milliseconds
-
-_chart_row_height = 120
-_sensor_value_box_width = 180
-_padding = 15
-
-screen.fill((0, 0, 0))
-
-_force_refresh = False
-_refresh_count = 0
-_horizontal_unit_length = 10
-
-keep_running = True
-
-while keep_running:
-    ## Process events
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            #sys.exit()
-            keep_running = False
-        elif event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_ESCAPE:
-                #sys.exit()
-                keep_running = False
-            elif event.key == pygame.K_F5:
-                ## Should flash
-                _force_refresh = True
-                screen.fill([0xff, 0xff, 0xff])
-                pygame.time.delay(10)
-
-    ## Draw/update charts
-    #screen.fill((0,0,0))
-
-    screen_width, screen_height = screen.get_width(), screen.get_height()
-    _chart_row_height = int(
-        (screen_height - _padding) * 1.0 /
-        len(ANALOG_SENSORS) - _padding)
-    _now = pygame.time.get_ticks()
-
-    if _force_refresh or (not _last_refresh) or (
-            _last_refresh + _refresh_time < _now):
-        if _force_refresh:
-            _refresh_count = 0  # Restart drawing
-            screen.fill([0x00, 0x00, 0x00])
-            _force_refresh = False  # Set off
-
-        for sensor_count, (sensor_id, sensor) in \
-                enumerate(sorted(ANALOG_SENSORS.items())):
-            #_sensor_value = SENSORS[sensor_id].next()
-            _sensor_value = sensor.read()
-
-            ## Rectangle containing the numeric sensor value
-            _sensor_rectangle = [
-                screen_width - _sensor_value_box_width - (2*_padding),
-                _padding + (sensor_count * (_chart_row_height + _padding)),
-                _sensor_value_box_width + _padding,
-                _chart_row_height,
-            ]
-            textContainer = pygame.draw.rect(
-                screen, [0x00, 0x00, 0x00], _sensor_rectangle, 0)
-            textContainer = pygame.draw.rect(
-                screen, sensor.color, _sensor_rectangle, 1)
-
-            ## Text color may change if some limit reached, ..
-            _text_color = [0xff, 0xff, 0xff]
-
-            text = font_sensor_value_large.render(
-                "%.1f%%" % _sensor_value, True, _text_color)
-            textRect = text.get_rect()
-            textRect.bottom = textContainer.bottom
-            textRect.right = textContainer.right - 10
-            screen.blit(text, textRect)
-
-            labelText = font_sensor_label.render(
-                sensor.label, True, sensor.color)
-            labelTextRect = labelText.get_rect()
-            labelTextRect.top = textContainer.top + 10
-            labelTextRect.centerx = textContainer.centerx
-            screen.blit(labelText, labelTextRect)
-
-            ## Chart rectangle
-            _chart_rectangle = [
-                _padding,
-                _padding + (sensor_count * (_chart_row_height+_padding)),
-                screen_width - _sensor_value_box_width - (4 * _padding),
-                _chart_row_height,
-                ]
-
-            # chartContainer = pygame.draw.rect(
-            # screen, [0x00,0x00,0x00], _chart_rectangle, 0)
-
-            chartContainer = pygame.draw.rect(
-                screen, sensor.color, _chart_rectangle, 1)
-
-            _hpadding = 2
-            _vpadding = 5
-
-            _chart_width = chartContainer.width - 2*_hpadding
-            _chart_height = chartContainer.height - 2*_vpadding
-
-            if _refresh_count > 0:
-                ## This is not the first refresh
-                _prev_dot_deltax = (
-                    ((_refresh_count - 1) * _horizontal_unit_length)
-                    % _chart_width)
-            else:
-                ## This is the first refresh
-                _prev_dot_deltax = 0
-
-            _prev_dot_deltay = \
-                _chart_height * PREV_VAL.get(sensor_id, 0) / 100.0
-            _dot_deltax = \
-                (_refresh_count * _horizontal_unit_length) % _chart_width
-            _dot_deltay = _chart_height * _sensor_value / 100.0
-
-            if _prev_dot_deltax > _dot_deltax:
-                _prev_dot_deltax = 0
-
-            _prev_dot_pos = [
-                chartContainer.left + _prev_dot_deltax + _hpadding,
-                chartContainer.bottom - _prev_dot_deltay - _vpadding]
-            _dot_pos = [
-                chartContainer.left + _dot_deltax + _hpadding,
-                chartContainer.bottom - _dot_deltay - _vpadding]
-
-            if PREV_VAL.get(sensor_id, None) is None:
-                _prev_dot_pos = _dot_pos
-            elif _prev_dot_pos[0] > _dot_pos[0]:
-                _prev_dot_pos[0] = 0
-
-            ## Clean the surface to draw..
-            pygame.draw.rect(
-                screen,
-                [0x00, 0x00, 0x00],
-                [_dot_pos[0],
-                 chartContainer.top,
-                 _horizontal_unit_length,
-                 chartContainer.height],
-                0)
-
-            # pygame.draw.rect(
-            #     screen,
-            #     [0x00,0x00,0x00],
-            #     [_dot_pos[0] + _horizontal_unit_length,
-            #      chartContainer.top,
-            #      _horizontal_unit_length*2,
-            #      chartContainer.height],
-            #     0)
-
-            ## Draw cursor
-            pygame.draw.rect(
-                screen,
-                [0xff, 0xff, 0xff],
-                [_dot_pos[0] + _horizontal_unit_length,
-                 chartContainer.top,
-                 2,
-                 chartContainer.height],
-                0)
-
-            ## Draw line (trick to antialias)
-            for _dd in [-2, -1, 0, 1, 2]:
-                pygame.draw.aaline(
-                    screen,
-                    [0xff, 0xff, 0xff],
-                    [_prev_dot_pos[0] + _dd, _prev_dot_pos[1]],
-                    [_dot_pos[0] + _dd, _dot_pos[1]])
-                pygame.draw.aaline(
-                    screen,
-                    [0xff, 0xff, 0xff],
-                    [_prev_dot_pos[0], _prev_dot_pos[1] + _dd],
-                    [_dot_pos[0], _dot_pos[1] + _dd])
-
-            pygame.draw.circle(screen, [0xff, 0xff, 0xff], _dot_pos, 2)
-
-            # pygame.draw.circle(screen, [0xff,0xff,0xff], _dot_pos, 4)
-            # pygame.draw.circle(screen, [0,0,0], _dot_pos, 2)
-            # pygame.draw.circle(screen, [0xff,0xff,0xff], _prev_dot_pos, 4)
-            # pygame.draw.circle(screen, [0,0,0], _prev_dot_pos, 2)
-
-            # pygame.draw.aaline(
-            #     screen,
-            #     [0xff,0xff,0xff],
-            #     [_prev_dot_pos[0], _prev_dot_pos[1]-1.5],
-            #     [_dot_pos[0], _dot_pos[1]-1.5])
-
-            # pygame.draw.aaline(
-            #     screen,
-            #     [0xff,0xff,0xff],
-            #     [_prev_dot_pos[0], _prev_dot_pos[1]-.5],
-            #     [_dot_pos[0], _dot_pos[1]-.5])
-
-            # pygame.draw.aaline(
-            #     screen,
-            #     [0xff,0xff,0xff],
-            #     [_prev_dot_pos[0], _prev_dot_pos[1]+1.5],
-            #     [_dot_pos[0], _dot_pos[1]+1.5])
-
-            # pygame.draw.aaline(
-            #     screen,
-            #     [0xff,0xff,0xff],
-            #     [_prev_dot_pos[0], _prev_dot_pos[1]+.5],
-            #     [_dot_pos[0], _dot_pos[1]+.5])
-
-            ## Redraw frame
-            chartContainer = pygame.draw.rect(
-                screen, sensor.color, _chart_rectangle, 1)
-
-            ## Update previous sensor value
-            PREV_VAL[sensor_id] = _sensor_value
-
-        _refresh_count += 1
-
-        ## Set last refresh time
-        _last_refresh = _now
-
-    # textRect.width = textRect.width+20
-    # textRect.height = textRect.height+20
-    # textRect.top -= 10
-    # textRect.left -= 10
-
-    ## FPS LABEL
-    if show_fps_label:
-        _fps = clock.get_fps()
-        if _fps >= 40:
-            _col = [0x00, 0xff, 0x00]
-        elif _fps >= 25:
-            _col = [0xff, 0xff, 0x00]
-        else:
-            _col = [0xff, 0x00, 0x00]
-
-        text = font_small.render("%d FPS" % clock.get_fps(), True, _col)
-        textRect = text.get_rect()
-        textRect.bottomleft = 0, screen.get_height()
-        textRect.width = max(40, textRect.width)
-        screen.fill([0, 0, 0], textRect)
-        screen.blit(text, textRect)
-
-    pygame.display.flip()
-
-    ## Wait a bit..
-    clock.tick(max_fps)
-
-pygame.quit()
+import argparse
+
+from datalogger import monitor
+from datalogger.alerts import AlertEngine, AlertLog
+from datalogger.sensorconfig import read_config, monitor_options, \
+    load_sensors, load_alert_rules, DEFAULT_COLORS
+from datalogger.sensors import SerialReader, SerialSensor, LogTailReader
+
+parser = argparse.ArgumentParser(description="Arduino Data Logger monitor")
+parser.add_argument(
+    '--config', metavar='FILE',
+    help="Sensors configuration file (see datalogger/sensorconfig.py)")
+parser.add_argument(
+    '--columns', type=int, default=None,
+    help="Number of sensor columns (default: as many as fit)")
+parser.add_argument(
+    '--serial', metavar='DEVICE',
+    help="Read sensors from the data logger on this serial port "
+         "(or pty / FIFO), instead of showing fake data")
+parser.add_argument(
+    '--tail', metavar='FILE',
+    help="Read sensors from this log file, following it as the logger "
+         "appends to it")
+parser.add_argument(
+    '--collector', metavar='ADDRESS',
+    help="Read sensors of --logger from the monitor socket of a "
+         "collector, tcp:HOST:PORT or unix:PATH")
+parser.add_argument(
+    '--logger', metavar='NAME',
+    help="Logger to show, with --collector")
+parser.add_argument(
+    '--baudrate', type=int, default=9600,
+    help="Serial port speed (default: %(default)s)")
+parser.add_argument(
+    '--channels', default='A0,A1,A2,A3,A4',
+    help="Comma-separated logger columns to show, when reading from "
+         "a serial port or log file (default: %(default)s)")
+parser.add_argument(
+    '--headless', action='store_true',
+    help="Render offscreen, and write frames to --output and/or "
+         "--mjpeg-port")
+parser.add_argument(
+    '--output', metavar='FILE',
+    help="Headless: write frames to numbered PNG files (a pattern such "
+         "as frames/%%06d.png), or to a Motion JPEG file (*.mjpeg)")
+parser.add_argument(
+    '--mjpeg-port', type=int, default=None,
+    help="Headless: serve a live MJPEG stream over HTTP on this port")
+parser.add_argument(
+    '--mjpeg-host', default='localhost',
+    help="Headless: address the MJPEG stream listens on "
+         "(default: %(default)s)")
+parser.add_argument(
+    '--fps', type=float, default=10,
+    help="Headless: frames per second (default: %(default)s)")
+parser.add_argument(
+    '--frames', type=int, default=None,
+    help="Headless: stop after this many frames (default: never)")
+parser.add_argument(
+    '--profile-dump', metavar='FILE',
+    help="Write frame timings to this file on exit (and on F4, in a "
+         "window; F3 shows them)")
+parser.add_argument(
+    '--alert-log', metavar='FILE',
+    help="Append alerts (see the configuration file) to this file")
+parser.add_argument(
+    '--size', default='1024x800',
+    help="Window or frame size (default: %(default)s)")
+parser.add_argument(
+    '--header', default=None,
+    help="Comma-separated column names sent by the logger, if it "
+         "won't send its header line (e.g. already running)")
+args = parser.parse_args()
+size = tuple(int(x) for x in args.size.lower().split('x'))
+
+SENSORS = monitor.demo_sensors()
+
+_config = read_config(args.config) if args.config else None
+_options = monitor_options(_config) if _config else {}
+_serial = args.serial or args.collector or _options.get('serial') or \
+    _options.get('collector')
+_tail = args.tail or _options.get('tail')
+_columns = args.columns or (
+    int(_options['columns']) if 'columns' in _options else None)
+if len([x for x in (args.serial, args.tail, args.collector) if x]) > 1:
+    parser.error("--serial, --tail and --collector are mutually exclusive")
+if args.collector and not args.logger:
+    parser.error("--collector needs --logger")
+
+## Samples are read by a background thread, and handed off to the
+## sensors in batches on every refresh.
+_reader = None
+if args.tail or (_tail and not (args.serial or args.collector)):
+    _reader = LogTailReader(_tail)
+elif _serial:
+    _header = args.header or _options.get('header')
+    _reader = SerialReader(
+        _serial, args.baudrate if args.serial else
+        int(_options.get('baudrate', args.baudrate)),
+        columns=_header.split(',') if _header else None,
+        logger=args.logger or _options.get('logger'))
+
+if _config:
+    SENSORS = load_sensors(_config, _reader)
+elif _reader:
+    SENSORS = [
+        ('s%02d' % i, SerialSensor(
+            _reader, channel,
+            label=channel, color=DEFAULT_COLORS[i % len(DEFAULT_COLORS)]))
+        for i, channel in enumerate(args.channels.split(','))]
+
+if isinstance(_reader, LogTailReader):
+    ## Read back the end of the log (only what fits in the sensors
+    ## history) before the first frame, which draws the charts from it
+    _reader.backlog = max([sensor.values_history.capacity
+                           for sensor_id, sensor in SENSORS] + [1])
+    try:
+        _reader.poll()
+    except (IOError, OSError):
+        pass  # Not there yet
+    for sensor_id, sensor in SENSORS:
+        sensor.read()
+if _reader:
+    _reader.start()
+
+_alert_log = args.alert_log or _options.get('alert_log')
+ALERTS = AlertEngine(
+    SENSORS, load_alert_rules(_config) if _config else {},
+    AlertLog(_alert_log) if _alert_log else None)
+
+
+def headless_writer():
+    from datalogger.frames import PngWriter, MjpegWriter, MjpegServer
+    if (args.output is None) == (args.mjpeg_port is None):
+        parser.error("--headless needs one of --output, --mjpeg-port")
+    if args.mjpeg_port is not None:
+        return MjpegServer(args.mjpeg_host, args.mjpeg_port)
+    if args.output.lower().endswith(('.mjpeg', '.mjpg')):
+        return MjpegWriter(args.output)
+    return PngWriter(args.output)
+
+
+if args.headless:
+    monitor.run_headless(SENSORS, headless_writer(), columns=_columns,
+                         size=size, fps=args.fps, frames=args.frames,
+                         profile_dump=args.profile_dump, alerts=ALERTS)
+else:
+    monitor.run_window(SENSORS, columns=_columns, size=size,
+                       profile_dump=args.profile_dump, alerts=ALERTS)
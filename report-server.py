@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+
+'''
+Standalone HTTP server for the Arduino Data Logger report.
+
+Serves the same report as the ``view-data.py`` CGI script, but keeps
+the parsed data and matplotlib loaded between requests.
+'''
+
+import argparse
+import os
+
+from datalogger.cache import DEFAULT_CACHE_DIR
+from datalogger.report import DEFAULT_DATA_FILE
+from datalogger.server import serve
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument(
+        '--host', default='localhost',
+        help="Address to listen on (default: %(default)s)")
+    parser.add_argument(
+        '--port', type=int, default=8000,
+        help="Port to listen on (default: %(default)s)")
+    parser.add_argument(
+        '--data', default=os.environ.get('DATALOGGER_CSV', DEFAULT_DATA_FILE),
+        help="Log file to display, CSV or binary (.dlb) "
+             "(default: $DATALOGGER_CSV or data.csv)")
+    parser.add_argument(
+        '--cache', default=os.environ.get('DATALOGGER_CACHE',
+                                          DEFAULT_CACHE_DIR),
+        help="Cache directory (default: $DATALOGGER_CACHE or %(default)s)")
+    parser.add_argument(
+        '--processes', type=int, default=None,
+        help="Chart rendering processes (default: one per CPU)")
+    args = parser.parse_args()
+
+    serve(args.host, args.port, data_file=args.data, cache_dir=args.cache,
+          processes=args.processes)
+
+
+if __name__ == '__main__':
+    main()
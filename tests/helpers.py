@@ -0,0 +1,32 @@
+"""
+Random logs for the tests.
+"""
+
+import datetime
+
+import numpy as np
+
+from datalogger.csvlog import COLUMN_ANALOG, COLUMN_DATE, COLUMN_DIGITAL
+
+
+def random_log(count, digital=2, analog=2, steps=(0, 1, 1, 5), toggle=0.1,
+               seed=1):
+    """Return the ``(columns, records)`` of a log of ``count`` random
+    records, as :py:func:`datalogger.csvlog.read_log` does. Records
+    are ``steps`` seconds apart (picked at random, so some share their
+    time); each digital sensor changes state with probability
+    ``toggle``.
+    """
+    rng = np.random.RandomState(seed)
+    columns = [('date', COLUMN_DATE)] \
+        + [('D%d' % i, COLUMN_DIGITAL) for i in range(digital)] \
+        + [('A%d' % i, COLUMN_ANALOG) for i in range(analog)]
+    when = datetime.datetime(2020, 1, 1, 23, 59)
+    states = [bool(i % 2) for i in range(digital)]
+    records = []
+    for row in range(count):
+        when += datetime.timedelta(seconds=int(rng.choice(steps)))
+        states = [state ^ bool(rng.rand() < toggle) for state in states]
+        records.append(tuple([when] + states + [
+            int(value) for value in rng.randint(0, 1024, analog)]))
+    return columns, records
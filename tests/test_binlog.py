@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from datalogger.binlog import INDEX_INTERVAL, BinaryLog, BinaryLogLoader
+from datalogger.dataset import SensorData
+
+from tests.helpers import random_log
+
+
+class BinaryLogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'log.dlb')
+        ## More than 8 digital sensors: two bytes per record
+        self.data = SensorData.from_records(*random_log(
+            3 * INDEX_INTERVAL + 100, digital=10, analog=3, toggle=0.5))
+
+    def append(self, log, start, stop):
+        log.append(SensorData(
+            self.data.columns, self.data.timestamps[start:stop],
+            np.array([np.packbits(self.data.digital(i, start, stop))
+                      for i in range(self.data.digital_count)]),
+            self.data.analog[:, start:stop]))
+
+    def check_data(self, data, stop):
+        self.assertEqual(len(data), stop)
+        self.assertTrue((data.timestamps ==
+                         self.data.timestamps[:stop]).all())
+        self.assertTrue((data.analog == self.data.analog[:, :stop]).all())
+        for sensor in range(self.data.digital_count):
+            self.assertTrue((data.digital(sensor) ==
+                             self.data.digital(sensor, 0, stop)).all())
+
+    def check_find(self, log):
+        times = self.data.timestamps.astype('datetime64[s]') \
+            .astype(np.int64)
+        for when in range(int(times[0]) - 2, int(times[-1]) + 3, 7):
+            for side in ('left', 'right'):
+                self.assertEqual(
+                    log.find(np.datetime64(when, 's'), side),
+                    int(np.searchsorted(times, when, side)))
+
+    def test_append_and_read(self):
+        log = BinaryLog.create(self.path, self.data.columns)
+        self.assertEqual(len(log), 0)
+        stop = 0
+        for size in (1, 7, INDEX_INTERVAL - 8, 1, 2 * INDEX_INTERVAL, 99):
+            self.append(log, stop, stop + size)
+            stop += size
+            self.check_data(BinaryLog(self.path).dataset(), stop)
+        self.check_find(log)
+        part = log.dataset(5, 500)
+        self.assertTrue((part.analog == self.data.analog[:, 5:500]).all())
+        self.assertTrue((part.digital(3) ==
+                         self.data.digital(3, 5, 500)).all())
+
+    def test_index_rebuilt(self):
+        log = BinaryLog.create(self.path, self.data.columns)
+        self.append(log, 0, len(self.data))
+        with open(log.index_path, 'r+b') as fileobj:
+            fileobj.truncate(16)
+        self.check_find(BinaryLog(self.path))
+        self.assertEqual(os.path.getsize(log.index_path),
+                         16 * -(-len(self.data) // INDEX_INTERVAL))
+
+    def test_loader(self):
+        log = BinaryLog.create(self.path, self.data.columns)
+        loader = BinaryLogLoader(self.path)
+        stop = 0
+        for size in (3, 13, 1000, 1, 2000):
+            self.append(log, stop, stop + size)
+            stop += size
+            data, generation = loader.load()
+            self.check_data(data, stop)
+        self.assertEqual(loader.load()[1], generation)
+        ## Another log at the same path
+        os.rename(self.path, self.path + '.old')
+        log = BinaryLog.create(self.path, self.data.columns)
+        self.append(log, 0, 10)
+        data, new_generation = loader.load()
+        self.check_data(data, 10)
+        self.assertNotEqual(new_generation, generation)
+
+
+if __name__ == '__main__':
+    unittest.main()
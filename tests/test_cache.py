@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from datalogger.cache import DatasetLoader, load_dataset
+from datalogger.dataset import SensorData
+from datalogger.rollup import RollupCache
+from datalogger.transitions import TransitionCache
+
+from tests.helpers import random_log
+
+
+class EmptyLogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.cache_dir = os.path.join(self.directory, 'cache')
+        self.path = os.path.join(self.directory, 'log.csv')
+        open(self.path, 'wb').close()
+
+    def write(self, data):
+        with open(self.path, 'ab') as fileobj:
+            fileobj.write(data)
+        ## As if written later: the size alone may not change the mtime
+        stat = os.stat(self.path)
+        os.utime(self.path, (stat.st_atime, stat.st_mtime + 1))
+
+    def test_load_dataset(self):
+        data, generation = load_dataset(self.path, self.cache_dir)
+        self.assertEqual(len(data), 0)
+        self.write(b'date,D0,A')  # Header still being written
+        self.assertEqual(len(load_dataset(self.path, self.cache_dir)[0]), 0)
+        self.write(b'0\n2020-01-01 00:00:00,1,512\n')
+        data, generation = load_dataset(self.path, self.cache_dir)
+        self.assertEqual(data.columns, [('date', 'date'), ('D0', 'digital'),
+                                        ('A0', 'analog')])
+        self.assertEqual(len(data), 1)
+
+    def test_loader(self):
+        loader = DatasetLoader(self.path, self.cache_dir)
+        data, first = loader.load()
+        self.assertEqual(len(data), 0)
+        self.write(b'date,D0,A0\n')
+        self.assertEqual(len(loader.load()[0]), 0)
+        self.write(b'2020-01-01 00:00:00,1,512\n2020-01-01 00:00:01,0,5\n')
+        data, generation = loader.load()
+        self.assertEqual(len(data), 2)
+        self.assertEqual(list(data.digital(0)), [True, False])
+        self.assertNotEqual(generation, first)
+        self.write(b'2020-01-01 00:00:02,1,7\n')
+        data, later = loader.load()
+        self.assertEqual(len(data), 3)
+        self.assertEqual(later, generation)
+
+
+class IncrementalCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        columns, records = random_log(3000, steps=(0, 1, 7, 40))
+        self.data = SensorData.from_records(columns, records)
+        self.head = SensorData.from_records(columns, records[:1234])
+
+    def assertSameArrays(self, cache, value, data):
+        ## As if computed from scratch
+        arrays = cache.to_arrays(value)
+        expected = cache.to_arrays(cache.compute(data))
+        self.assertEqual(sorted(arrays), sorted(expected))
+        for name in arrays:
+            self.assertEqual(np.asarray(arrays[name]).tolist(),
+                             np.asarray(expected[name]).tolist())
+
+    def test_caches(self):
+        for cls in (RollupCache, TransitionCache):
+            cls('log.csv', self.cache_dir).get(self.head, 'a')
+            ## Read back from disk, then updated with the appended
+            ## samples
+            cache = cls('log.csv', self.cache_dir)
+            value = cache.get(self.data, 'a')
+            self.assertEqual(cache.rows(value), len(self.data))
+            self.assertSameArrays(cache, value, self.data)
+            self.assertIs(cache.get(self.data, 'a'), value)
+            ## Computed again for another generation, even if shorter
+            cache = cls('log.csv', self.cache_dir)
+            self.assertSameArrays(cache, cache.get(self.head, 'b'),
+                                  self.head)
+
+
+if __name__ == '__main__':
+    unittest.main()
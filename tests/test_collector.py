@@ -0,0 +1,106 @@
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+
+from datalogger.binlog import BinaryLog
+from datalogger.collector import Collector
+
+
+class CollectorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.storage = os.path.join(self.directory, 'storage')
+        ## Flushed only when asked to
+        self.collector = Collector(self.storage, flush_interval=3600)
+        self.addCleanup(self.collector.close)
+        self.loggers = os.path.join(self.directory, 'loggers.sock')
+        self.monitors = os.path.join(self.directory, 'monitors.sock')
+        self.collector.listen('unix:' + self.loggers)
+        self.collector.listen('unix:' + self.monitors, monitors=True)
+
+    def connect(self, path):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(path)
+        self.addCleanup(sock.close)
+        self.pump()
+        return sock
+
+    def pump(self, steps=5):
+        for _ in range(steps):
+            self.collector.step(0.01)
+
+    def send(self, sock, *lines):
+        sock.sendall(b''.join(line + b'\n' for line in lines))
+        self.pump()
+
+    def stored(self, logger):
+        path = os.path.join(self.storage, logger + '.dlb')
+        if not os.path.exists(path):
+            return None
+        data = BinaryLog(path).dataset()
+        return [tuple(int(v) for v in data.analog[:, row])
+                for row in range(len(data))]
+
+    def test_tagging_and_batches(self):
+        kitchen = self.connect(self.loggers)
+        other = self.connect(self.loggers)
+        self.send(kitchen, b'#logger kitchen', b'date,D0,A0',
+                  b'2020-01-01 00:00:00,1,10', b'2020-01-01 00:00:01,0,11')
+        self.send(other, b'date,A0,A1', b'2020-01-01 00:00:00,20,21')
+
+        ## Nothing written until flushed, then one batch per logger
+        self.assertEqual(self.stored('kitchen'), None)
+        self.assertEqual(self.collector.flush(), 3)
+        self.assertEqual(self.stored('kitchen'), [(10,), (11,)])
+        self.assertEqual(self.stored('unix-2'), [(20, 21)])
+
+        self.send(kitchen, b'2020-01-01 00:00:02,1,12')
+        self.send(other, b'2020-01-01 00:00:01,22,23')
+        self.assertEqual(self.stored('kitchen'), [(10,), (11,)])
+        self.assertEqual(self.collector.flush(), 2)
+        self.assertEqual(self.stored('kitchen'), [(10,), (11,), (12,)])
+        self.assertEqual(self.stored('unix-2'), [(20, 21), (22, 23)])
+        self.assertEqual(self.collector.flush(), 0)
+
+    def test_last_line_without_newline(self):
+        logger = self.connect(self.loggers)
+        logger.sendall(b'date,A0\n2020-01-01 00:00:00,1\n'
+                       b'2020-01-01 00:00:01,2')
+        logger.close()
+        self.pump()
+        self.collector.flush()
+        self.assertEqual(self.stored('unix-1'), [(1,), (2,)])
+
+    def test_monitor(self):
+        kitchen = self.connect(self.loggers)
+        other = self.connect(self.loggers)
+        self.send(kitchen, b'#logger kitchen', b'date,A0',
+                  b'2020-01-01 00:00:00,1')
+        self.send(other, b'#logger garage', b'date,A0',
+                  b'2020-01-01 00:00:00,99')
+
+        monitor = self.connect(self.monitors)
+        monitor.settimeout(1.0)
+        self.send(monitor, b'kitchen')
+        self.send(kitchen, b'2020-01-01 00:00:01,2')
+        self.send(other, b'2020-01-01 00:00:01,98')
+        self.send(kitchen, b'2020-01-01 00:00:02,3')
+
+        ## The last header, then the lines of that logger only
+        expected = b'date,A0\n2020-01-01 00:00:01,2\n2020-01-01 00:00:02,3\n'
+        received = b''
+        while len(received) < len(expected):
+            self.pump()
+            data = monitor.recv(4096)
+            if not data:
+                break
+            received += data
+        self.assertEqual(received, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
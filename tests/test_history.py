@@ -0,0 +1,50 @@
+import unittest
+
+import numpy as np
+
+from datalogger.history import RingBuffer
+
+
+class RingBufferTest(unittest.TestCase):
+
+    def test_against_list(self):
+        rng = np.random.RandomState(1)
+        for capacity in (1, 2, 7, 64):
+            ring = RingBuffer(capacity, dtype=np.int64)
+            samples = []
+            for step in range(500):
+                if rng.rand() < 0.3:
+                    count = rng.randint(0, 3 * capacity)
+                    times = step + np.arange(count) / 10.0
+                    values = rng.randint(0, 1024, count)
+                    ring.extend(times, values)
+                    samples.extend(zip(times, values))
+                else:
+                    value = rng.randint(0, 1024)
+                    ring.append(step, value)
+                    samples.append((step, value))
+                expected = samples[-capacity:]
+                self.assertEqual(len(ring), len(expected))
+                for size in (0, 1, capacity // 2, capacity, capacity + 1):
+                    times, values = ring.get(size)
+                    wanted = expected[-size:] if 0 < size else expected
+                    self.assertEqual(list(times), [t for t, v in wanted])
+                    self.assertEqual(list(values), [v for t, v in wanted])
+                if expected:
+                    self.assertEqual(tuple(ring.last()), expected[-1])
+
+    def test_empty(self):
+        ring = RingBuffer(4)
+        self.assertIsNone(ring.last())
+        self.assertEqual(len(ring.get()[0]), 0)
+        self.assertRaises(ValueError, RingBuffer, 0)
+
+    def test_views_read_only(self):
+        ring = RingBuffer(4)
+        ring.extend([1, 2], [10, 20])
+        times, values = ring.get()
+        self.assertRaises(ValueError, values.__setitem__, 0, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+
+import numpy as np
+
+from datalogger.rollingstats import RollingStats
+
+
+class RollingStatsTest(unittest.TestCase):
+
+    def check(self, stats, times, values, now):
+        ## Statistics of the samples of the window, computed again
+        times, values = np.array(times), np.array(values)
+        inside = times > now - stats.window
+        window = values[inside]
+        self.assertEqual(len(stats), len(window))
+        self.assertEqual(stats.min, window.min())
+        self.assertEqual(stats.max, window.max())
+        self.assertAlmostEqual(stats.mean, window.mean(), places=9)
+        self.assertAlmostEqual(stats.stddev, window.std(), places=6)
+        rate = 0.0
+        if len(window) > 1:
+            first, last = times[inside][[0, -1]]
+            rate = (window[-1] - window[0]) / (last - first)
+        self.assertAlmostEqual(stats.rate, rate, places=9)
+
+    def test_against_brute_force(self):
+        rng = np.random.RandomState(1)
+        for window in (0.5, 5, 50):
+            stats = RollingStats(window)
+            now, times, values = 0.0, [], []
+            for step in range(5000):
+                if rng.rand() < 0.1:
+                    count = rng.randint(1, 20)
+                    batch = now + np.cumsum(rng.rand(count) * 0.1)
+                    batch_values = 1000 + rng.rand(count) * 100
+                    stats.extend(batch, batch_values)
+                    times.extend(batch)
+                    values.extend(batch_values)
+                    now = batch[-1]
+                else:
+                    now += rng.rand() * 0.2
+                    value = 1000 + rng.rand() * 100
+                    stats.add(now, value)
+                    times.append(now)
+                    values.append(value)
+                if step % 97 == 0:
+                    self.check(stats, times, values, now)
+
+    def test_empty(self):
+        stats = RollingStats()
+        for value in (stats.min, stats.max, stats.mean, stats.stddev):
+            self.assertIsNone(value)
+        self.assertEqual(stats.rate, 0.0)
+        stats.extend([], [])
+        self.assertEqual(len(stats), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
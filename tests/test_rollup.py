@@ -0,0 +1,72 @@
+import datetime
+import unittest
+
+import numpy as np
+
+from datalogger.dataset import SensorData
+from datalogger.rollup import RESOLUTIONS, Rollup, rollup_window
+
+from tests.helpers import random_log
+
+
+class RollupTest(unittest.TestCase):
+
+    def setUp(self):
+        columns, self.records = random_log(3000, steps=(0, 1, 7, 40))
+        self.data = SensorData.from_records(columns, self.records)
+
+    def expected(self, resolution, start, stop):
+        ## One bucket after the other, from the records themselves
+        buckets = []
+        for row in range(start, stop):
+            record = self.records[row]
+            bucket = int((record[0] - datetime.datetime(1970, 1, 1))
+                         .total_seconds()) // resolution
+            if not buckets or buckets[-1][0] != bucket:
+                buckets.append((bucket, []))
+            buckets[-1][1].append(row)
+        for bucket, rows in buckets:
+            analog = np.array([self.records[row][3:] for row in rows])
+            digital = [[self.records[row][1 + sensor] for row in rows]
+                       for sensor in range(2)]
+            changes = [sum(1 for row in rows if row > 0 and
+                           self.records[row][1 + sensor] !=
+                           self.records[row - 1][1 + sensor])
+                       for sensor in range(2)]
+            yield (bucket * resolution, len(rows), analog.min(axis=0),
+                   analog.max(axis=0), analog.sum(axis=0),
+                   [sum(states) for states in digital], changes)
+
+    def check(self, rollup, resolution, start, stop):
+        expected = list(self.expected(resolution, start, stop))
+        self.assertEqual(len(rollup), len(expected))
+        self.assertEqual(rollup.rows, stop - start)
+        for i, (when, count, lo, hi, total, on, changes) \
+                in enumerate(expected):
+            self.assertEqual(int(rollup.starts[i].astype(np.int64)), when)
+            self.assertEqual(rollup.count[i], count)
+            self.assertEqual(list(rollup.analog_min[:, i]), list(lo))
+            self.assertEqual(list(rollup.analog_max[:, i]), list(hi))
+            self.assertEqual(list(rollup.analog_sum[:, i]), list(total))
+            self.assertEqual(list(rollup.digital_on[:, i]), on)
+            self.assertEqual(list(rollup.digital_transitions[:, i]),
+                             changes)
+
+    def test_compute(self):
+        for resolution, name in RESOLUTIONS:
+            for start, stop in ((0, 3000), (0, 1), (123, 2345), (5, 5)):
+                self.check(Rollup.compute(self.data, resolution, start, stop),
+                           resolution, start, stop)
+
+    def test_window(self):
+        rng = np.random.RandomState(2)
+        for resolution, name in RESOLUTIONS:
+            rollup = Rollup.compute(self.data, resolution)
+            for _ in range(20):
+                start, stop = sorted(rng.randint(0, 3001, 2))
+                self.check(rollup_window(self.data, rollup, start, stop),
+                           resolution, start, stop)
+
+
+if __name__ == '__main__':
+    unittest.main()
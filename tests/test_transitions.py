@@ -0,0 +1,98 @@
+import unittest
+
+import numpy as np
+
+from datalogger.dataset import SensorData
+from datalogger.transitions import Transitions
+
+from tests.helpers import random_log
+
+
+def when(seconds):
+    return np.datetime64(int(seconds), 's')
+
+
+class TransitionsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data = SensorData.from_records(*random_log(
+            3000, analog=1, steps=(0, 1, 1, 2, 5), toggle=0.05))
+        self.times = self.data.timestamps.astype('datetime64[s]') \
+            .astype(np.int64)
+
+    def assertSame(self, transitions, other):
+        self.assertEqual(transitions.names, other.names)
+        self.assertEqual(list(transitions.initial), list(other.initial))
+        for mine, theirs in zip(transitions.bounds, other.bounds):
+            self.assertEqual(list(mine), list(theirs))
+        self.assertEqual(transitions.end, other.end)
+        self.assertEqual(transitions.rows, other.rows)
+
+    def test_queries(self):
+        transitions = Transitions.compute(self.data)
+        times = self.times
+        rng = np.random.RandomState(2)
+        for sensor in range(2):
+            values = self.data.digital(sensor)
+            changes = times[np.flatnonzero(values[1:] != values[:-1]) + 1]
+            for _ in range(300):
+                start, end = sorted(rng.randint(times[0] - 5,
+                                                times[-1] + 5, 2))
+                ## State of the last sample at or before the time
+                row = int(np.searchsorted(times, start, 'right')) - 1
+                self.assertEqual(
+                    transitions.state_at(sensor, when(start)),
+                    None if row < 0 else bool(values[row]))
+                self.assertEqual(
+                    transitions.count(sensor, when(start), when(end)),
+                    int(((changes >= start) & (changes < end)).sum()))
+
+                ## Duty cycle, second by second
+                lo, hi = max(start, times[0]), min(end, times[-1])
+                if hi <= lo:
+                    continue
+                seconds = np.arange(lo, hi)
+                states = values[np.searchsorted(times, seconds, 'right') - 1]
+                duty = transitions.duty_cycle(sensor, when(start), when(end))
+                self.assertAlmostEqual(duty, states.mean(), places=9)
+                starts, ends, span_states = transitions.spans(
+                    sensor, when(start), when(end))
+                self.assertEqual((starts[0], ends[-1]), (lo, hi))
+                self.assertEqual(list(starts[1:]), list(ends[:-1]))
+                self.assertAlmostEqual(
+                    ((ends - starts) * span_states).sum() / float(hi - lo),
+                    duty, places=9)
+
+    def test_single_time(self):
+        ## E.g. a page of one row: the state at that time, as one span
+        transitions = Transitions.compute(self.data)
+        for sensor in range(2):
+            values = self.data.digital(sensor)
+            for row in (0, 1, 1500, 2999):
+                time = self.times[row]
+                starts, ends, states = transitions.spans(
+                    sensor, when(time), when(time))
+                self.assertEqual((list(starts), list(ends)),
+                                 ([time], [time]))
+                last = int(np.searchsorted(self.times, time, 'right')) - 1
+                self.assertEqual(list(states), [values[last]])
+            self.assertEqual(len(transitions.spans(
+                sensor, when(self.times[-1] + 1),
+                when(self.times[-1] + 9))[0]), 0)
+
+    def test_concatenate(self):
+        whole = Transitions.compute(self.data)
+        for split in (0, 1, 1234, 2999, 3000):
+            self.assertSame(Transitions.compute(self.data, 0, split)
+                            .concatenate(Transitions.compute(self.data,
+                                                             split)),
+                            whole)
+
+    def test_arrays(self):
+        transitions = Transitions.compute(self.data)
+        self.assertSame(
+            Transitions.from_arrays(transitions.to_arrays()), transitions)
+
+
+if __name__ == '__main__':
+    unittest.main()